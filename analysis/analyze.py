@@ -1,35 +1,30 @@
+import argparse
+import collections
+import contextlib
+import heapq
+import itertools
+import multiprocessing
 import os
-import sys
+import queue
+import tarfile
 
-import numpy as np
-import pandas as pd
 from tqdm import tqdm
 
 from tddft_data_parser import TddftDataParser
 from nto_data_parser import NtoDataParser
+from nto_data import NtoData
+from nto_analysis import get_metal_ligand_ratios, get_nto_decompositions, shell_types
+from discovery import get_output_file_key, iter_file_pairs, write_orphan_report
+from file_utils import get_file_id, iter_tar_output_files
+from quarantine import QuarantineError, isolate_stage, write_quarantine_report
+from result_cache import ResultCache
+from result_writer import export_csv, get_result_writer, n_excited_states
+from sharding import get_shard_info_path, get_shard_output_path, is_in_shard, read_manifest, select_shard, write_shard_info
+from profiling import Profiler, get_source_size, null_profiler
 
 
-transition_metal_identifiers = [
-    'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe', 'Co', 'Ni', 'Cu', 'Zn',
-    'Y', 'Zr', 'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd', 'Ag', 'Cd',
-    'La', 'Hf', 'Ta', 'W', 'Re', 'Os', 'Ir', 'Pt', 'Au', 'Hg'
-]
-
-def is_metal(atom):
-
-    """Checks if a given atom is a metal.
-
-    Arguments:
-        atom (dict): The atom.
-
-    Returns:
-        bool: The flag indicating whether the atom is metal.
-    """
-
-    if atom['atom_element'] in transition_metal_identifiers:
-        return True
-
-    return False
+# number of NTOs with highest eigenvalues used for the metal and ligand contributions
+n_top_ntos = 1
 
 def build_transition_nature_string(occupied_origin: str, virtual_origin: str):
 
@@ -57,31 +52,28 @@ def build_transition_nature_string(occupied_origin: str, virtual_origin: str):
 
     return
 
-def get_nto_origin_metal_ligand_ratios(nto_data: list[dict[dict]]):
+def get_nto_origin_metal_ligand_ratios(nto_data: NtoData):
 
     """Gets the relative NTO metal and ligand orbital contributions.
 
     Arguments:
-        nto_data (list[dict[dict]]): The NTO data.
+        nto_data (NtoData): The NTO data.
 
     Returns:
         float: The relative metal contribution.
         float: The relative ligand contribution.
     """
 
-    metal_occupations, ligand_occupations = get_metal_ligand_occupations(nto_data)
+    metal_ratios, ligand_ratios = get_metal_ligand_ratios([nto_data], n_top_ntos)
 
-    metal_ratio = sum(metal_occupations) / (sum(metal_occupations) + sum(ligand_occupations))
-    ligand_ratio = sum(ligand_occupations) / (sum(metal_occupations) + sum(ligand_occupations))
+    return float(metal_ratios[0]), float(ligand_ratios[0])
 
-    return metal_ratio, ligand_ratio
-
-def get_nto_origin(nto_data: list[dict[dict]], metal_ratio_threshold: float=0.5):
+def get_nto_origin(nto_data: NtoData, metal_ratio_threshold: float=0.5):
 
     """Gets the NTO origin.
 
     Arguments:
-        nto_data (list[dict[dict]]): The NTO data.
+        nto_data (NtoData): The NTO data.
         metal_ratio_threshold (float): The threhold to determine metal origin.
 
     Returns:
@@ -90,134 +82,651 @@ def get_nto_origin(nto_data: list[dict[dict]], metal_ratio_threshold: float=0.5)
 
     metal_ratio, ligand_ratio = get_nto_origin_metal_ligand_ratios(nto_data)
 
+    return get_origin_from_metal_ratio(metal_ratio, metal_ratio_threshold)
+
+def get_origin_from_metal_ratio(metal_ratio: float, metal_ratio_threshold: float=0.5):
+
+    """Gets the NTO origin from the relative metal contribution.
+
+    Arguments:
+        metal_ratio (float): The relative metal contribution.
+        metal_ratio_threshold (float): The threhold to determine metal origin.
+
+    Returns:
+        str: The metal origin.
+    """
+
     if metal_ratio > metal_ratio_threshold:
         return 'M'
 
     return 'L'
 
-def get_metal_ligand_occupations(nto_data: list[dict[dict]], normalize_by_atoms: bool=False):
+def get_exclusion_reason(tddft_result_dict: dict):
 
-    """Gets the absolute NTO metal and ligand orbital occupations.
+    """Gets the reason why a TMC is excluded based on its TD-DFT results.
 
     Arguments:
-        ntos (list[dict[dict]]): The NTO data.
-        normalize_by_atoms (bool): Flag to denote whether to normalize by the number of atoms.
+        tddft_result_dict (dict): The TD-DFT result dict.
 
     Returns:
-        list[float]: The absolute metal occupations.
-        list[float]: The absolute ligand occupations.
+        str: The reason or None if the TMC is not excluded.
     """
 
-    metal_occupations = None
-    ligand_occupations = [0, 0, 0, 0, 0]
+    if tddft_result_dict['has_failed']:
+        return 'tddft_failed'
 
-    for atom in nto_data:
+    for i in range(1, n_excited_states + 1, 1):
+        f = tddft_result_dict.get('f_' + str(i))
+        if f is not None and f < 0:
+            return 'negative_oscillator_strength'
 
-        coefficient_sums = get_sums_of_squared_coefficients(atom['ntos'])
+    return None
 
-        if is_metal(atom):
-            metal_occupations = coefficient_sums
-        else:
-            for i, _ in enumerate(coefficient_sums):
-                ligand_occupations[i] += coefficient_sums[i]
+def is_excluded(tddft_result_dict: dict):
 
-    # normalize by number of ligand atoms
-    if normalize_by_atoms:
-        for i, _ in enumerate(ligand_occupations):
-            ligand_occupations[i] = ligand_occupations[i] / ( len(nto_data) - 1)
+    """Checks if a TMC is excluded based on its TD-DFT results.
 
-    return metal_occupations, ligand_occupations
+    Arguments:
+        tddft_result_dict (dict): The TD-DFT result dict.
+
+    Returns:
+        bool: The flag indicating whether the TMC is excluded.
+    """
 
-def get_sums_of_squared_coefficients(ntos: dict[dict], n: int = 1, weight_by_occupation: bool = False):
+    return get_exclusion_reason(tddft_result_dict) is not None
 
-    """Gets the sums of squared coefficients of the n NTOs with highest occupations of a single atom.
+def get_transition_nature_data(nto_result_dict: dict):
+
+    """Gets the transition nature and metal and ligand contributions from NTO results.
+
+    Besides the metal and ligand contributions, the metal d and s/p shell
+    contributions and the largest contribution of a single ligand atom of the
+    occupied and virtual NTOs are given.
 
     Arguments:
-        ntos (dict[dict]): The NTO data.
-        n (int): The number of NTOs with highest occupations to consider.
-        weight_by_occupation (bool): Flag to denote whether to weight the coefficient sums by the occupation eigenvalue.
+        nto_result_dict (dict): The NTO result dict.
 
     Returns:
-        list[float]: The sum.
+        dict: The transition nature data or None if the NTO job has failed.
     """
 
-    sums = []
-    for _ in sorted(ntos.keys(), reverse=True)[:n]:
+    if nto_result_dict['has_failed']:
+        return None
 
-        if weight_by_occupation:
-            sums.append(_ * get_sum_of_squared_coefficients(ntos[_]))
-        else:
-            sums.append(get_sum_of_squared_coefficients(ntos[_]))
+    # occupied and virtual NTOs in one batch
+    decompositions = get_nto_decompositions([nto_result_dict['occupied_nto'], nto_result_dict['virtual_nto']], n_top_ntos)
+    metal_ratios = decompositions['metal_ratios'].tolist()
+    ligand_ratios = decompositions['ligand_ratios'].tolist()
+
+    occupied_origin = get_origin_from_metal_ratio(metal_ratios[0], 0.5)
+    virtual_origin = get_origin_from_metal_ratio(metal_ratios[1], 0.5)
 
-    return sums
+    transition_nature_data = {
+        'transition_nature_vis': build_transition_nature_string(occupied_origin, virtual_origin),
+        'M_contribution_occupied': metal_ratios[0],
+        'L_contribution_occupied': ligand_ratios[0],
+        'M_contribution_virtual': metal_ratios[1],
+        'L_contribution_virtual': ligand_ratios[1]
+    }
 
-def get_sum_of_squared_coefficients(nto: dict, normalize_by_orbitals: bool=False):
+    metal_shell_ratios = decompositions['metal_shell_ratios']
+    atom_offsets = decompositions['atom_offsets']
+    for i, block in enumerate(['occupied', 'virtual']):
+        atoms = slice(atom_offsets[i], atom_offsets[i + 1])
+        ligand_atom_ratios = decompositions['atom_ratios'][atoms][~decompositions['is_metal_atom'][atoms]]
+        transition_nature_data['M_d_contribution_' + block] = float(metal_shell_ratios[i, shell_types.index('d')])
+        transition_nature_data['M_sp_contribution_' + block] = float(metal_shell_ratios[i, shell_types.index('s')] + metal_shell_ratios[i, shell_types.index('p')])
+        transition_nature_data['L_atom_max_contribution_' + block] = float(ligand_atom_ratios.max()) if len(ligand_atom_ratios) > 0 else 0.0
 
-    """Gets the sum of squared coefficients of an NTO of a single atom.
+    return transition_nature_data
+
+def add_transition_nature_data(tddft_result_dict: dict, transition_nature_data: dict):
+
+    """Adds the transition nature data to a TD-DFT result dict.
 
     Arguments:
-        nto (dict): The NTO data of the atom.
-        normalize_by_orbitals (bool): Flag to denote whether to normalize by the number of orbitals.
+        tddft_result_dict (dict): The TD-DFT result dict.
+        transition_nature_data (dict): The transition nature data or None if
+            the NTO job has failed.
 
     Returns:
-        float: The sum of squared NTO coefficients.
+        dict: The combined result dict or None if the TMC is excluded.
     """
 
-    absolute_sum = 0
-    for _ in nto.keys():
-        absolute_sum += np.power(nto[_], 2)
+    if transition_nature_data is None:
+        return None
 
-    # normalize by number of orbitals
-    if normalize_by_orbitals:
-        return absolute_sum / len(nto.keys())
+    tddft_result_dict.update(transition_nature_data)
 
-    return absolute_sum
+    return tddft_result_dict
 
+def analyze_complex(tddft_file_path: str, nto_file_path: str, profiler: Profiler = null_profiler, file_key: str = None):
 
-# read files from input directory
-data_dir = sys.argv[1].strip()
-out_files = [_ for _ in os.listdir(data_dir) if '.out' in _]
-out_files_tddft = sorted([_ for _ in out_files if not 'vis.out' in _])
+    """Compiles the TD-DFT and NTO data of a single TMC.
 
-result_dicts = []
-for _ in tqdm(out_files_tddft):
+    Arguments:
+        tddft_file_path (str|file): The path to the TD-DFT output file.
+        nto_file_path (str|file): The path to the corresponding NTO output
+            file or None if there is none.
+        profiler (Profiler): The profiler recording the stages.
+        file_key (str): The name of the TMC in the profile, by default the
+            TD-DFT file path.
 
-    tddft_result_dict = TddftDataParser(data_dir + _).parse()
+    Returns:
+        dict: The result dict or None if the TMC is excluded.
 
-    if tddft_result_dict['has_failed']:
-        continue
+    Raises:
+        QuarantineError: If a stage fails for one of the files.
+    """
+
+    if file_key is None:
+        file_key = tddft_file_path
+
+    # file sizes cost stat calls and are only recorded when profiling
+    tddft_size = get_source_size(tddft_file_path) if profiler.enabled else None
+    with profiler.stage('tddft_parse', file_key, tddft_size), isolate_stage('tddft_parse', tddft_file_path):
+        tddft_result_dict = TddftDataParser(tddft_file_path).parse()
+        exclusion_reason = get_exclusion_reason(tddft_result_dict)
+
+    if exclusion_reason is not None:
+        profiler.record_failure(file_key, exclusion_reason)
+        return None
+
+    if tddft_result_dict['lambda_max_vis'] is None:
+        tddft_result_dict['transition_nature_vis'] = None
+        return tddft_result_dict
+
+    if nto_file_path is None:
+        print('No NTO file found for ' + str(tddft_file_path) + '.')
+        profiler.record_failure(file_key, 'nto_missing')
+        return None
+
+    nto_size = get_source_size(nto_file_path) if profiler.enabled else None
+    with profiler.stage('nto_parse', file_key, nto_size), isolate_stage('nto_parse', nto_file_path):
+        nto_result_dict = NtoDataParser(nto_file_path, n_top=n_top_ntos).parse()
 
-    has_negative_f = False
-    for i in range(1, 31, 1):
-        if tddft_result_dict['f_' + str(i)] < 0:
-            has_negative_f = True
-            break
-    if has_negative_f:
-        continue
+    with profiler.stage('nto_analysis', file_key), isolate_stage('nto_analysis', nto_file_path):
+        transition_nature_data = get_transition_nature_data(nto_result_dict)
+
+    if transition_nature_data is None:
+        profiler.record_failure(file_key, 'nto_failed')
+
+    return add_transition_nature_data(tddft_result_dict, transition_nature_data)
+
+def iter_archive_results(archive_path: str, profiler: Profiler = null_profiler, select=None, quarantine: list = None):
+
+    """Analyzes the output files in a (compressed) tar archive without extracting it.
+
+    The archive members are parsed while streaming through the archive. Each
+    TD-DFT output file X.out is paired with its NTO output file X-vis.out
+    regardless of which of the two comes first.
+
+    Arguments:
+        archive_path (str): The path to the tar archive.
+        profiler (Profiler): The profiler recording the stages.
+        select (callable): Function that decides by TMC ID whether its files
+            are analyzed, all files are analyzed if None.
+        quarantine (list): List to which the entries of files that could not
+            be processed are appended, see QuarantineError.get_entry().
+
+    Yields:
+        str: The member name of the TD-DFT output file.
+        dict: The result dict or None if the TMC is excluded.
+    """
 
-    if tddft_result_dict['lambda_max_vis'] is not None:
-        nto_result_dict = NtoDataParser(data_dir + _.replace('.out', '-vis.out')).parse()
+    # TD-DFT results waiting for their NTO file and vice versa
+    pending_tddft = {}
+    pending_nto = {}
+    # TD-DFT results that do not need an NTO file
+    resolved = set()
 
-        if nto_result_dict['has_failed']:
+    for name, fh in iter_tar_output_files(archive_path):
+
+        key, is_nto = get_output_file_key(name)
+
+        if select is not None and not select(get_file_id(key)):
             continue
 
-        occupied_origin = get_nto_origin(nto_result_dict['occupied_nto'], 0.5)
-        virtual_origin = get_nto_origin(nto_result_dict['virtual_nto'], 0.5)
+        if is_nto:
+
+            if key in resolved:
+                continue
+
+            try:
+                with profiler.stage('nto_parse', key), isolate_stage('nto_parse', name):
+                    nto_result_dict = NtoDataParser(fh, get_file_id(name), n_top_ntos).parse()
+                with profiler.stage('nto_analysis', key), isolate_stage('nto_analysis', name):
+                    transition_nature_data = get_transition_nature_data(nto_result_dict)
+            except QuarantineError as e:
+                # the TMC is excluded as in analyze_complex()
+                _add_quarantine_entry(quarantine, e)
+                profiler.record_failure(key, e.reason)
+                transition_nature_data = None
+            else:
+                if transition_nature_data is None:
+                    profiler.record_failure(key, 'nto_failed')
+
+            if key in pending_tddft:
+                tddft_name, tddft_result_dict = pending_tddft.pop(key)
+                yield tddft_name, add_transition_nature_data(tddft_result_dict, transition_nature_data)
+            else:
+                pending_nto[key] = transition_nature_data
+
+        else:
+
+            try:
+                with profiler.stage('tddft_parse', key), isolate_stage('tddft_parse', name):
+                    tddft_result_dict = TddftDataParser(fh, get_file_id(name)).parse()
+                    exclusion_reason = get_exclusion_reason(tddft_result_dict)
+            except QuarantineError as e:
+                _add_quarantine_entry(quarantine, e)
+                exclusion_reason = e.reason
+
+            if exclusion_reason is not None:
+                profiler.record_failure(key, exclusion_reason)
+                resolved.add(key)
+                yield name, None
+            elif tddft_result_dict['lambda_max_vis'] is None:
+                resolved.add(key)
+                tddft_result_dict['transition_nature_vis'] = None
+                yield name, tddft_result_dict
+            elif key in pending_nto:
+                yield name, add_transition_nature_data(tddft_result_dict, pending_nto.pop(key))
+            else:
+                pending_tddft[key] = (name, tddft_result_dict)
+
+    for key, (name, _) in pending_tddft.items():
+        print('No NTO file found for ' + name + '.')
+        profiler.record_failure(key, 'nto_missing')
+        yield name, None
+
+def _iter_archive_result_dicts(named_result_dicts, ids: list):
+
+    """Drops the member names of the results of iter_archive_results().
 
-        occupied_origin_ratio = get_nto_origin_metal_ligand_ratios(nto_result_dict['occupied_nto'])
-        virtual_origin_ratio = get_nto_origin_metal_ligand_ratios(nto_result_dict['virtual_nto'])
+    Arguments:
+        named_result_dicts (Iterable[tuple]): The member names and result dicts.
+        ids (list): List to which the IDs of the analyzed TMCs are appended.
 
-        tddft_result_dict['transition_nature_vis'] = build_transition_nature_string(occupied_origin, virtual_origin)
+    Yields:
+        dict: The result dict or None if the TMC is excluded.
+    """
 
-        tddft_result_dict['M_contribution_occupied'] = occupied_origin_ratio[0]
-        tddft_result_dict['L_contribution_occupied'] = occupied_origin_ratio[1]
-        tddft_result_dict['M_contribution_virtual'] = virtual_origin_ratio[0]
-        tddft_result_dict['L_contribution_virtual'] = virtual_origin_ratio[1]
+    for name, result_dict in named_result_dicts:
+        ids.append(get_file_id(name))
+        yield result_dict
 
-    else:
-        tddft_result_dict['transition_nature_vis'] = None
+def _add_quarantine_entry(quarantine: list, error: QuarantineError):
+
+    if quarantine is not None:
+        quarantine.append(error.get_entry())
+
+def _analyze_complex_task(task: tuple):
+
+    """Worker entry point that keeps track of the position of a file pair.
+
+    Failures of single files are caught here so that a malformed file never
+    stops a run.
+
+    Arguments:
+        task (tuple): The index, TD-DFT file path, NTO file path and whether
+            to profile (None, or whether to trace allocations).
+
+    Returns:
+        int: The index of the file pair.
+        dict: The result dict or None if the TMC is excluded.
+        dict: The profile records or None if profiling is off.
+        tuple: The quarantine entry (see QuarantineError.get_entry()) or None.
+    """
+
+    index, tddft_file_path, nto_file_path, trace_allocations = task
+
+    profiler = null_profiler
+    if trace_allocations is not None:
+        profiler = Profiler(trace_allocations)
+
+    try:
+        result_dict = analyze_complex(tddft_file_path, nto_file_path, profiler)
+    except QuarantineError as e:
+        profiler.record_failure(tddft_file_path, e.reason)
+        return index, None, profiler.get_records(), e.get_entry()
+
+    return index, result_dict, profiler.get_records(), None
+
+def get_file_pair_size(tddft_file_path: str, nto_file_path: str):
+
+    """Gets the combined size of a pair of output files.
+
+    Arguments:
+        tddft_file_path (str): The path to the TD-DFT output file.
+        nto_file_path (str): The path to the corresponding NTO output file or None.
+
+    Returns:
+        int: The combined size in bytes.
+    """
+
+    size = os.path.getsize(tddft_file_path)
+    if nto_file_path is not None and os.path.isfile(nto_file_path):
+        size += os.path.getsize(nto_file_path)
+
+    return size
+
+def _iter_pool_results(pool, tasks: list[tuple], sizes: dict, max_pending: int, max_in_flight: int):
+
+    """Runs the analysis tasks in a process pool and yields the results as they finish.
+
+    Only tasks whose index lies within max_pending of the first unfinished
+    task are admitted, so that at most max_pending results have to be held
+    back by a caller that restores the input order. Of the admitted tasks the
+    largest are submitted first, at most max_in_flight at a time.
+
+    Arguments:
+        pool (multiprocessing.Pool): The process pool.
+        tasks (list[tuple]): The tasks of _analyze_complex_task() in input order.
+        sizes (dict[int, int]): The file pair sizes by task index.
+        max_pending (int): The size of the window of admitted tasks.
+        max_in_flight (int): The maximum number of submitted tasks.
+
+    Returns:
+        Iterator[tuple]: The results of _analyze_complex_task().
+    """
+
+    tasks = collections.deque(tasks)
+    # admitted tasks largest first and indices of the admitted unfinished tasks
+    admitted = []
+    unfinished = []
+    finished = set()
+    # filled by the result handler thread of the pool
+    done = queue.Queue()
+    n_in_flight = 0
+
+    while len(tasks) > 0 or len(admitted) > 0 or n_in_flight > 0:
+
+        # the window starts at the first unfinished task
+        while len(unfinished) > 0 and unfinished[0] in finished:
+            finished.remove(heapq.heappop(unfinished))
+        window_start = unfinished[0] if len(unfinished) > 0 else tasks[0][0]
+
+        while len(tasks) > 0 and tasks[0][0] < window_start + max_pending:
+            task = tasks.popleft()
+            heapq.heappush(admitted, (-sizes[task[0]], task[0], task))
+            heapq.heappush(unfinished, task[0])
+
+        while len(admitted) > 0 and n_in_flight < max_in_flight:
+            task = heapq.heappop(admitted)[2]
+            pool.apply_async(_analyze_complex_task, (task,), callback=done.put, error_callback=done.put)
+            n_in_flight += 1
+
+        result = done.get()
+        n_in_flight -= 1
+        if isinstance(result, BaseException):
+            raise result
+
+        finished.add(result[0])
+        yield result
+
+def iter_results(file_pairs: list[tuple], n_workers: int = 1, cache: ResultCache = None, profiler: Profiler = null_profiler,
+                 quarantine: list = None, max_pending: int = None):
+
+    """Analyzes the given file pairs and yields the results in input order.
+
+    With more than one worker the file pairs are distributed over a process
+    pool. Within a window of max_pending file pairs after the first unfinished
+    one the largest pairs run first, so that a single huge log does not end
+    up as the last task, while the results that finish out of order and are
+    buffered until all preceding results have been yielded stay bounded by
+    the window. If a cache is given, only new or changed file pairs are
+    analyzed and all other results are loaded from it. Quarantined file pairs
+    are not cached so that they are retried.
+
+    Arguments:
+        file_pairs (list[tuple]): The TD-DFT and NTO file path pairs.
+        n_workers (int): The number of worker processes.
+        cache (ResultCache): The result cache.
+        profiler (Profiler): The profiler collecting the stage records.
+        quarantine (list): List to which the entries of files that could not
+            be processed are appended, see QuarantineError.get_entry().
+        max_pending (int): The maximum number of file pairs in flight or
+            buffered, by default 64 per worker.
+
+    Returns:
+        Iterator[dict]: The result dicts, None for excluded TMCs.
+    """
+
+    if max_pending is None:
+        max_pending = 64 * max(n_workers, 1)
+
+    fingerprints = [None] * len(file_pairs)
+    cached = set()
+    if cache is not None:
+        for i, file_pair in enumerate(file_pairs):
+            fingerprints[i] = cache.fingerprint(*file_pair)
+            if cache.contains(file_pair[0], fingerprints[i]):
+                cached.add(i)
+
+    trace_allocations = profiler.trace_allocations if profiler.enabled else None
+    tasks = [(i, *file_pairs[i], trace_allocations) for i in range(len(file_pairs)) if i not in cached]
+
+    with contextlib.ExitStack() as stack:
+
+        if n_workers <= 1:
+            computed = map(_analyze_complex_task, tasks)
+        else:
+            sizes = {task[0]: get_file_pair_size(*file_pairs[task[0]]) for task in tasks}
+            pool = stack.enter_context(multiprocessing.Pool(n_workers))
+            computed = _iter_pool_results(pool, tasks, sizes, max_pending, 2 * n_workers)
+
+        pending = {}
+        next_index = 0
+        for index, result_dict, records, quarantine_entry in itertools.chain(computed, [(None, None, None, None)]):
+
+            if index is not None:
+                if records is not None:
+                    profiler.add_records(records)
+                if quarantine_entry is not None:
+                    if quarantine is not None:
+                        quarantine.append(quarantine_entry)
+                elif cache is not None:
+                    cache.store(file_pairs[index][0], fingerprints[index], result_dict)
+                pending[index] = result_dict
+
+            while next_index < len(file_pairs):
+                if next_index in cached:
+                    yield cache.load(file_pairs[next_index][0])
+                elif next_index in pending:
+                    yield pending.pop(next_index)
+                else:
+                    break
+                next_index += 1
+
+def iter_streamed_results(file_pairs, n_workers: int = 1, cache: ResultCache = None,
+                          profiler: Profiler = null_profiler, max_pending: int = None, quarantine: list = None):
+
+    """Analyzes file pairs while they are discovered and yields the results in input order.
+
+    Unlike iter_results() the file pairs may come from a lazy iterator, e.g.
+    a directory walk that is still in progress, and are handed to the workers
+    right away. At most max_pending file pairs are in flight at any time.
+
+    Arguments:
+        file_pairs (Iterable[tuple]): The TD-DFT and NTO file path pairs.
+        n_workers (int): The number of worker processes.
+        cache (ResultCache): The result cache.
+        profiler (Profiler): The profiler collecting the stage records.
+        max_pending (int): The maximum number of file pairs in flight, by
+            default four per worker.
+        quarantine (list): List to which the entries of files that could not
+            be processed are appended, see QuarantineError.get_entry().
+
+    Returns:
+        Iterator[dict]: The result dicts, None for excluded TMCs.
+    """
+
+    if max_pending is None:
+        max_pending = 4 * max(n_workers, 1)
+
+    trace_allocations = profiler.trace_allocations if profiler.enabled else None
+
+    with contextlib.ExitStack() as stack:
+
+        pool = None
+        if n_workers > 1:
+            pool = stack.enter_context(multiprocessing.Pool(n_workers))
+
+        # file pairs in input order with their fingerprint and their pending
+        # (AsyncResult), computed (tuple) or cached (None) result
+        pending = collections.deque()
+
+        for index, file_pair in enumerate(itertools.chain(file_pairs, [None])):
+
+            if file_pair is not None:
+
+                fingerprint = None
+                result = None
+                if cache is not None:
+                    fingerprint = cache.fingerprint(*file_pair)
+
+                if cache is None or not cache.contains(file_pair[0], fingerprint):
+                    task = (index, *file_pair, trace_allocations)
+                    if pool is None:
+                        result = _analyze_complex_task(task)
+                    else:
+                        result = pool.apply_async(_analyze_complex_task, (task,))
+
+                pending.append((file_pair, fingerprint, result))
+
+            # yield the finished results at the front, wait for them if too
+            # many are in flight or the input is exhausted
+            is_exhausted = file_pair is None
+            while len(pending) > 0:
+
+                front_pair, fingerprint, result = pending[0]
+
+                if result is not None and not isinstance(result, tuple):
+                    if not result.ready() and not is_exhausted and len(pending) <= max_pending:
+                        break
+                    result = result.get()
+
+                pending.popleft()
+
+                if result is None:
+                    yield cache.load(front_pair[0])
+                    continue
+
+                _, result_dict, records, quarantine_entry = result
+                if records is not None:
+                    profiler.add_records(records)
+                if quarantine_entry is not None:
+                    if quarantine is not None:
+                        quarantine.append(quarantine_entry)
+                elif cache is not None:
+                    cache.store(front_pair[0], fingerprint, result_dict)
+                yield result_dict
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Compiles TD-DFT and NTO data from a directory of Gaussian output files.')
+    parser.add_argument('data_dir', help='Directory or tar archive containing the (compressed) Gaussian output files.')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes (0 uses all cores).')
+    parser.add_argument('-o', '--output', default=None, help='Output file (.csv, .parquet, .arrow or .feather), by default a CSV file named after the input.')
+    parser.add_argument('--export-csv', default=None, help='Additionally export the Parquet or Arrow output to this CSV file.')
+    parser.add_argument('--cache', default=None, help='Path to a result cache to reuse results of unchanged files.')
+    parser.add_argument('--hash', action='store_true', help='Include a content hash in the cache fingerprints.')
+    parser.add_argument('--profile', default=None, help='Write a per-stage profile to this file (.json summary or .csv records).')
+    parser.add_argument('--profile-allocations', action='store_true', help='Include memory allocations in the profile (slow).')
+    parser.add_argument('--profile-top', type=int, default=20, help='Number of slowest files listed in the profile.')
+    parser.add_argument('--stream', action='store_true', help='Analyze files while the directory is still being listed, results are written in discovery order.')
+    parser.add_argument('--orphans', default=None, help='Write the output files without partner file to this CSV file.')
+    parser.add_argument('--quarantine', default=None, help='Write the output files that could not be processed to this CSV file.')
+    parser.add_argument('--shard-index', type=int, default=None, help='Analyze only this shard (0 to n_shards - 1) and write a partial result.')
+    parser.add_argument('--n-shards', type=int, default=None, help='Number of shards.')
+    parser.add_argument('--manifest', default=None, help='Shard manifest (see sharding.py), by default TMCs are assigned by a stable hash of their ID.')
+    args = parser.parse_args()
+
+    if (args.shard_index is None) != (args.n_shards is None):
+        parser.error('--shard-index and --n-shards have to be given together.')
+    if args.n_shards is not None and not 0 <= args.shard_index < args.n_shards:
+        parser.error('--shard-index has to be between 0 and n_shards - 1.')
+
+    n_workers = args.workers if args.workers > 0 else os.cpu_count()
+
+    if args.export_csv is not None and (args.output is None or args.output.endswith('.csv')):
+        parser.error('--export-csv requires a Parquet or Arrow --output.')
+
+    data_dir = args.data_dir.strip()
+
+    output_path = args.output
+    if output_path is None:
+        output_path = 'df_' + data_dir.replace('/', '') + '.csv'
+
+    # sharded runs write a partial result that is marked complete at the end
+    select = None
+    shard_ids = []
+    if args.n_shards is not None:
+        output_path = get_shard_output_path(output_path, args.shard_index, args.n_shards)
+        if os.path.isfile(get_shard_info_path(output_path)):
+            os.remove(get_shard_info_path(output_path))
+        manifest = read_manifest(args.manifest) if args.manifest is not None else None
+        select = lambda _: is_in_shard(_, args.shard_index, args.n_shards, manifest)
+
+    profiler = null_profiler
+    if args.profile is not None:
+        profiler = Profiler(args.profile_allocations)
+
+    # output files without partner file and files that could not be processed
+    orphans = []
+    quarantine = []
+
+    with contextlib.ExitStack() as stack:
+
+        writer = stack.enter_context(get_result_writer(output_path))
+
+        if os.path.isfile(data_dir) and tarfile.is_tarfile(data_dir):
+
+            # stream through the archive and write the results in archive order
+            result_dicts = tqdm(_iter_archive_result_dicts(iter_archive_results(data_dir, profiler, select, quarantine), shard_ids))
+
+        else:
+
+            cache = None
+            if args.cache is not None:
+                cache = stack.enter_context(ResultCache(args.cache, use_hash=args.hash))
+
+            # walk the input directory tree and pair the output files
+            file_pairs = iter_file_pairs(data_dir, orphans)
+            if select is not None:
+                file_pairs = select_shard(file_pairs, args.shard_index, args.n_shards, manifest, shard_ids)
+
+            if args.stream:
+                result_dicts = tqdm(iter_streamed_results(file_pairs, n_workers, cache, profiler, quarantine=quarantine))
+            else:
+                file_pairs = sorted(file_pairs)
+                result_dicts = tqdm(iter_results(file_pairs, n_workers, cache, profiler, quarantine), total=len(file_pairs))
+
+        for result_dict in result_dicts:
+            if result_dict is not None:
+                with profiler.stage('write'):
+                    writer.write(result_dict)
+
+    if args.n_shards is not None:
+        write_shard_info(output_path, args.shard_index, args.n_shards, shard_ids, args.manifest)
+
+    if args.export_csv is not None:
+        export_csv(output_path, args.export_csv)
+
+    if len(orphans) > 0:
+        print(str(len(orphans)) + ' output files without partner file found.')
+    if args.orphans is not None:
+        write_orphan_report(orphans, args.orphans)
+
+    if len(quarantine) > 0:
+        print(str(len(quarantine)) + ' output files could not be processed and were quarantined.')
+    if args.quarantine is not None:
+        write_quarantine_report(quarantine, args.quarantine)
+
+    if args.profile is not None:
+        profiler.write_report(args.profile, args.profile_top)
 
-    result_dicts.append(tddft_result_dict)
 
-df = pd.DataFrame(result_dicts)
-df.to_csv('df_' + data_dir.replace('/', '') + '.csv', index=False)
+if __name__ == '__main__':
+    main()
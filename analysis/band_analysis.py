@@ -0,0 +1,213 @@
+import argparse
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from result_writer import n_excited_states, read_results
+from spectra import get_stick_spectra
+from tddft_data_parser import f_max_threshold, uv_vis_boundary, vis_nir_boundary
+
+
+band_regions = ['uv', 'vis', 'nir']
+
+def get_band_metrics(lambdas: np.ndarray, fs: np.ndarray, lower=None, upper=None, f_threshold=f_max_threshold,
+                     include_lower: bool = True, include_upper: bool = True):
+
+    """Determines lambda max, f max and band broadness of a region for all complexes.
+
+    Gives the same values as TddftDataParser._get_lambda_max() applied to the
+    transitions in the region. The boundaries and the threshold may be arrays
+    of a common shape to evaluate several regions at once, the results then
+    have that shape followed by the number of complexes.
+
+    Arguments:
+        lambdas (numpy.ndarray): The wavelengths in nm (n_complexes x n_states), NaN if missing.
+        fs (numpy.ndarray): The oscillator strengths (n_complexes x n_states).
+        lower (float|numpy.ndarray): The lower region boundary, open if None.
+        upper (float|numpy.ndarray): The upper region boundary, open if None.
+        f_threshold (float|numpy.ndarray): The minimum oscillator strength of the band maximum.
+        include_lower (bool): Flag to denote whether the lower boundary belongs to the region.
+        include_upper (bool): Flag to denote whether the upper boundary belongs to the region.
+
+    Returns:
+        numpy.ndarray: The lambda max values, NaN if there is no band.
+        numpy.ndarray: The corresponding oscillator strengths, NaN if there is no band.
+        numpy.ndarray: The band broadness values, NaN if there is no band.
+    """
+
+    lambdas = np.asarray(lambdas, dtype=float)
+    fs = np.asarray(fs, dtype=float)
+
+    lower = np.asarray(-np.inf if lower is None else lower, dtype=float)[..., np.newaxis, np.newaxis]
+    upper = np.asarray(np.inf if upper is None else upper, dtype=float)[..., np.newaxis, np.newaxis]
+    f_threshold = np.asarray(f_threshold, dtype=float)[..., np.newaxis]
+
+    # missing transitions (NaN) compare as False and are never in a region
+    is_in_region = (lambdas >= lower) if include_lower else (lambdas > lower)
+    is_in_region = is_in_region & ((lambdas <= upper) if include_upper else (lambdas < upper))
+    n_transitions = is_in_region.sum(axis=-1)
+
+    # first transition with the highest oscillator strength
+    region_fs = np.where(is_in_region, fs, -np.inf)
+    max_indices = np.argmax(region_fs, axis=-1)[..., np.newaxis]
+    f_max = np.take_along_axis(region_fs, max_indices, axis=-1)[..., 0]
+    lambda_max = np.take_along_axis(np.broadcast_to(lambdas, is_in_region.shape), max_indices, axis=-1)[..., 0]
+
+    lambda_range = np.where(is_in_region, lambdas, -np.inf).max(axis=-1) - np.where(is_in_region, lambdas, np.inf).min(axis=-1)
+    with np.errstate(invalid='ignore'):
+        sigma = lambda_range * n_transitions
+
+    has_band = (n_transitions > 0) & ~(f_max < f_threshold)
+
+    return np.where(has_band, lambda_max, np.nan), np.where(has_band, f_max, np.nan), np.where(has_band, sigma, np.nan)
+
+def get_region_band_metrics(lambdas: np.ndarray, fs: np.ndarray, uv_vis=uv_vis_boundary, vis_nir=vis_nir_boundary,
+                            f_threshold=f_max_threshold):
+
+    """Determines lambda max, f max and band broadness of the UV, Vis and nIR regions.
+
+    The Vis region includes both boundaries as in
+    TddftDataParser._split_spectrum_into_uv_vis_nir(). Boundaries and
+    threshold may be arrays as in get_band_metrics().
+
+    Arguments:
+        lambdas (numpy.ndarray): The wavelengths in nm (n_complexes x n_states), NaN if missing.
+        fs (numpy.ndarray): The oscillator strengths (n_complexes x n_states).
+        uv_vis (float|numpy.ndarray): The boundary between the UV and Vis region.
+        vis_nir (float|numpy.ndarray): The boundary between the Vis and nIR region.
+        f_threshold (float|numpy.ndarray): The minimum oscillator strength of a band maximum.
+
+    Returns:
+        dict[str, numpy.ndarray]: The columns lambda_max_<region>, f_max_<region> and sigma_<region>.
+    """
+
+    region_bounds = {
+        'uv': {'upper': uv_vis, 'include_upper': False},
+        'vis': {'lower': uv_vis, 'upper': vis_nir},
+        'nir': {'lower': vis_nir, 'include_lower': False}
+    }
+
+    band_data = {}
+    for region in band_regions:
+        lambda_max, f_max, sigma = get_band_metrics(lambdas, fs, f_threshold=f_threshold, **region_bounds[region])
+        band_data['lambda_max_' + region] = lambda_max
+        band_data['f_max_' + region] = f_max
+        band_data['sigma_' + region] = sigma
+
+    return band_data
+
+def sweep_band_metrics(lambdas: np.ndarray, fs: np.ndarray, uv_vis_boundaries: list[float],
+                       vis_nir_boundaries: list[float], f_thresholds: list[float]):
+
+    """Determines the band metrics for all combinations of boundaries and thresholds.
+
+    Each region depends on its own boundaries only and the threshold only
+    decides which band maxima are kept. The regions are therefore evaluated
+    once per distinct boundary (pair) and the thresholds are applied to the
+    results afterwards.
+
+    Arguments:
+        lambdas (numpy.ndarray): The wavelengths in nm (n_complexes x n_states), NaN if missing.
+        fs (numpy.ndarray): The oscillator strengths (n_complexes x n_states).
+        uv_vis_boundaries (list[float]): The boundaries between the UV and Vis region.
+        vis_nir_boundaries (list[float]): The boundaries between the Vis and nIR region.
+        f_thresholds (list[float]): The minimum oscillator strengths of a band maximum.
+
+    Returns:
+        pandas.DataFrame: The combinations (uv_vis_boundary, vis_nir_boundary, f_threshold).
+        dict[str, numpy.ndarray]: The band columns as (n_combinations x n_complexes) arrays.
+    """
+
+    combinations = list(itertools.product(
+        range(len(uv_vis_boundaries)), range(len(vis_nir_boundaries)), range(len(f_thresholds))
+    ))
+    configurations = pd.DataFrame(
+        [(uv_vis_boundaries[i], vis_nir_boundaries[j], f_thresholds[k]) for i, j, k in combinations],
+        columns=['uv_vis_boundary', 'vis_nir_boundary', 'f_threshold']
+    )
+
+    # band metrics without threshold
+    uv_metrics = [
+        get_band_metrics(lambdas, fs, upper=uv_vis, f_threshold=-np.inf, include_upper=False)
+        for uv_vis in uv_vis_boundaries
+    ]
+    vis_metrics = {
+        (i, j): get_band_metrics(lambdas, fs, lower=uv_vis, upper=vis_nir, f_threshold=-np.inf)
+        for i, uv_vis in enumerate(uv_vis_boundaries) for j, vis_nir in enumerate(vis_nir_boundaries)
+    }
+    nir_metrics = [
+        get_band_metrics(lambdas, fs, lower=vis_nir, f_threshold=-np.inf, include_lower=False)
+        for vis_nir in vis_nir_boundaries
+    ]
+
+    band_data = {}
+    for region in band_regions:
+        for quantity in ['lambda_max_', 'f_max_', 'sigma_']:
+            band_data[quantity + region] = np.empty((len(combinations), len(lambdas)))
+
+    for row, (i, j, k) in enumerate(combinations):
+        for region, metrics in zip(band_regions, [uv_metrics[i], vis_metrics[(i, j)], nir_metrics[j]]):
+            lambda_max, f_max, sigma = metrics
+            has_band = ~(f_max < f_thresholds[k])
+            band_data['lambda_max_' + region][row] = np.where(has_band, lambda_max, np.nan)
+            band_data['f_max_' + region][row] = np.where(has_band, f_max, np.nan)
+            band_data['sigma_' + region][row] = np.where(has_band, sigma, np.nan)
+
+    return configurations, band_data
+
+def get_sweep_summary(configurations: pd.DataFrame, band_data: dict):
+
+    """Summarizes the band metrics of each combination of a sweep.
+
+    Arguments:
+        configurations (pandas.DataFrame): The combinations of the sweep.
+        band_data (dict[str, numpy.ndarray]): The band columns of the sweep.
+
+    Returns:
+        pandas.DataFrame: The number of complexes with a band and the median
+            lambda max in each region per combination.
+    """
+
+    summary = configurations.copy()
+    for region in band_regions:
+        lambda_max = band_data['lambda_max_' + region]
+        has_band = ~np.isnan(lambda_max)
+        summary['n_' + region] = has_band.sum(axis=1)
+        median = np.full(len(lambda_max), np.nan)
+        rows = has_band.any(axis=1)
+        median[rows] = np.nanmedian(lambda_max[rows], axis=1)
+        summary['median_lambda_max_' + region] = median
+
+    return summary
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Recomputes the UV, Vis and nIR band data from the stick spectra of a result file.')
+    parser.add_argument('results', type=str, help='Result file of analyze.py.')
+    parser.add_argument('-o', '--output', type=str, default='bands.csv', help='Output CSV file.')
+    parser.add_argument('--uv-vis', type=float, nargs='+', default=[uv_vis_boundary], help='Boundaries between the UV and Vis region in nm.')
+    parser.add_argument('--vis-nir', type=float, nargs='+', default=[vis_nir_boundary], help='Boundaries between the Vis and nIR region in nm.')
+    parser.add_argument('--f-threshold', type=float, nargs='+', default=[f_max_threshold], help='Minimum oscillator strengths of a band maximum.')
+    args = parser.parse_args()
+
+    columns = ['id']
+    for i in range(n_excited_states):
+        columns.extend(['lambda_' + str(i+1), 'f_' + str(i+1)])
+    df = read_results(args.results, columns=columns, round_trip=True)
+
+    lambdas, fs = get_stick_spectra(df)
+    configurations, band_data = sweep_band_metrics(lambdas, fs, args.uv_vis, args.vis_nir, args.f_threshold)
+
+    # a single combination gives the band data per complex, several a summary per combination
+    if len(configurations) == 1:
+        band_df = pd.DataFrame({'id': df['id']})
+        for column, values in band_data.items():
+            band_df[column] = values[0]
+    else:
+        band_df = get_sweep_summary(configurations, band_data)
+
+    band_df.to_csv(args.output, index=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from tddft_data_parser import TddftDataParser
+from nto_data_parser import NtoDataParser
+from result_writer import get_result_writer, read_results
+from synthetic_logs import basis_sets, generate_dataset
+import analyze
+import merge
+
+
+def get_peak_rss():
+
+    """Gets the peak resident set size of the current process.
+
+    Returns:
+        float: The peak RSS in MB.
+    """
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is given in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return peak_rss / 1024 ** 2
+
+    return peak_rss / 1024
+
+def get_file_pairs(data_dir: str):
+
+    """Gets the TD-DFT and NTO file pairs of a directory.
+
+    Arguments:
+        data_dir (str): The directory.
+
+    Returns:
+        list[tuple]: The TD-DFT and NTO file path pairs.
+    """
+
+    out_files_tddft = sorted([_ for _ in os.listdir(data_dir) if '.out' in _ and not 'vis.out' in _])
+
+    return [(os.path.join(data_dir, _), os.path.join(data_dir, _.replace('.out', '-vis.out'))) for _ in out_files_tddft]
+
+def benchmark_tddft_parser(data_dir: str, work_dir: str, n_workers: int):
+
+    """Parses all TD-DFT output files.
+
+    Arguments:
+        data_dir (str): The directory of the synthetic dataset.
+        work_dir (str): The directory for intermediate files.
+        n_workers (int): The number of worker processes of the analysis pipeline.
+
+    Returns:
+        int: The number of files.
+        int: The number of bytes.
+    """
+
+    file_pairs = get_file_pairs(data_dir)
+    for tddft_file_path, _ in file_pairs:
+        TddftDataParser(tddft_file_path).parse()
+
+    return len(file_pairs), sum(os.path.getsize(_) for _, _n in file_pairs)
+
+def benchmark_nto_parser(data_dir: str, work_dir: str, n_workers: int):
+
+    """Parses all NTO output files as the analysis pipeline does.
+
+    Arguments:
+        data_dir (str): The directory of the synthetic dataset.
+        work_dir (str): The directory for intermediate files.
+        n_workers (int): The number of worker processes of the analysis pipeline.
+
+    Returns:
+        int: The number of files.
+        int: The number of bytes.
+    """
+
+    nto_file_paths = [_ for _n, _ in get_file_pairs(data_dir) if os.path.isfile(_)]
+    for nto_file_path in nto_file_paths:
+        NtoDataParser(nto_file_path, n_top=analyze.n_top_ntos).parse()
+
+    return len(nto_file_paths), sum(os.path.getsize(_) for _ in nto_file_paths)
+
+def benchmark_analyze(data_dir: str, work_dir: str, n_workers: int):
+
+    """Runs the analysis pipeline including writing the results.
+
+    Arguments:
+        data_dir (str): The directory of the synthetic dataset.
+        work_dir (str): The directory for intermediate files.
+        n_workers (int): The number of worker processes of the analysis pipeline.
+
+    Returns:
+        int: The number of complexes.
+        int: The number of bytes.
+    """
+
+    file_pairs = get_file_pairs(data_dir)
+
+    with get_result_writer(os.path.join(work_dir, 'df_analyze.csv')) as writer:
+        for result_dict in analyze.iter_results(file_pairs, n_workers):
+            if result_dict is not None:
+                writer.write(result_dict)
+
+    return len(file_pairs), sum(analyze.get_file_pair_size(*_) for _ in file_pairs)
+
+def benchmark_merge(data_dir: str, work_dir: str, n_workers: int):
+
+    """Merges two result tables and computes the solvatochromism data.
+
+    Arguments:
+        data_dir (str): The directory of the synthetic dataset.
+        work_dir (str): The directory for intermediate files.
+        n_workers (int): The number of worker processes of the analysis pipeline.
+
+    Returns:
+        int: The number of rows.
+        int: The number of bytes.
+    """
+
+    file_paths = [os.path.join(work_dir, 'df_merge_gasphase.csv'), os.path.join(work_dir, 'df_merge_acetone.csv')]
+
+    df = merge.merge_results(read_results(file_paths[0]), read_results(file_paths[1]))
+    df.to_csv(os.path.join(work_dir, 'df_merged.csv'), index=False)
+
+    return len(df), sum(os.path.getsize(_) for _ in file_paths)
+
+benchmarks = {
+    'tddft_parser': benchmark_tddft_parser,
+    'nto_parser': benchmark_nto_parser,
+    'analyze': benchmark_analyze,
+    'merge': benchmark_merge
+}
+
+def prepare_merge_inputs(data_dir: str, work_dir: str, n_rows: int, seed: int = 0):
+
+    """Writes the gas phase and acetone result tables used by the merge benchmark.
+
+    The rows of the analysis results of the synthetic dataset are repeated
+    with new IDs and perturbed band data until the requested size is reached.
+
+    Arguments:
+        data_dir (str): The directory of the synthetic dataset.
+        work_dir (str): The directory to write the tables to.
+        n_rows (int): The number of rows per table.
+        seed (int): The random seed.
+    """
+
+    result_dicts = [_ for _ in analyze.iter_results(get_file_pairs(data_dir)) if _ is not None]
+    base_df = pd.DataFrame(result_dicts)
+    base_df = base_df.iloc[np.arange(n_rows) % len(base_df)].reset_index(drop=True)
+    base_df['id'] = ['SYN%08d' % _ for _ in range(n_rows)]
+
+    rng = np.random.default_rng(seed)
+    for phase in ['gasphase', 'acetone']:
+        df = base_df.copy()
+        for region in merge.band_regions:
+            df['lambda_max_' + region] += rng.normal(0, 10, n_rows)
+            df['f_max_' + region] *= rng.uniform(0.5, 1.5, n_rows)
+        df.to_csv(os.path.join(work_dir, 'df_merge_' + phase + '.csv'), index=False)
+
+def _run_benchmark(name: str, data_dir: str, work_dir: str, n_workers: int):
+
+    """Runs a single benchmark, meant to be called in a fresh process.
+
+    Arguments:
+        name (str): The name of the benchmark.
+        data_dir (str): The directory of the synthetic dataset.
+        work_dir (str): The directory for intermediate files.
+        n_workers (int): The number of worker processes of the analysis pipeline.
+
+    Returns:
+        dict: The elapsed time, throughput, peak RSS and the growth of the
+            peak RSS during the benchmark.
+    """
+
+    peak_rss_before = get_peak_rss()
+
+    start = time.perf_counter()
+    n_items, n_bytes = benchmarks[name](data_dir, work_dir, n_workers)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'seconds': elapsed,
+        'items_per_second': n_items / elapsed,
+        'mb_per_second': n_bytes / 1024 ** 2 / elapsed,
+        'peak_rss_mb': get_peak_rss(),
+        'peak_rss_growth_mb': get_peak_rss() - peak_rss_before
+    }
+
+def run_benchmarks(names: list[str], data_dir: str, work_dir: str, n_workers: int = 1, n_repeats: int = 3):
+
+    """Runs the given benchmarks, each repetition in a fresh process.
+
+    The fastest repetition is reported together with the largest peak RSS.
+
+    Arguments:
+        names (list[str]): The names of the benchmarks.
+        data_dir (str): The directory of the synthetic dataset.
+        work_dir (str): The directory for intermediate files.
+        n_workers (int): The number of worker processes of the analysis pipeline.
+        n_repeats (int): The number of repetitions.
+
+    Returns:
+        dict[str, dict]: The results by benchmark name.
+    """
+
+    context = multiprocessing.get_context('spawn')
+
+    results = {}
+    for name in names:
+
+        runs = []
+        for _ in range(n_repeats):
+            with context.Pool(1) as pool:
+                runs.append(pool.apply(_run_benchmark, (name, data_dir, work_dir, n_workers)))
+
+        result = max(runs, key=lambda _: _['items_per_second'])
+        result['peak_rss_mb'] = max(_['peak_rss_mb'] for _ in runs)
+        result['peak_rss_growth_mb'] = max(_['peak_rss_growth_mb'] for _ in runs)
+        results[name] = result
+
+    return results
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float = 0.1):
+
+    """Compares benchmark results to a stored baseline.
+
+    Arguments:
+        results (dict[str, dict]): The benchmark results.
+        baseline (dict[str, dict]): The baseline results.
+        tolerance (float): The relative deviation that is still accepted.
+
+    Returns:
+        list[str]: The descriptions of all regressions.
+    """
+
+    regressions = []
+    for name, result in results.items():
+
+        if name not in baseline:
+            continue
+
+        for metric in ['items_per_second', 'mb_per_second']:
+            if result[metric] < baseline[name][metric] * (1 - tolerance):
+                regressions.append('%s: %s dropped from %.2f to %.2f' % (name, metric, baseline[name][metric], result[metric]))
+
+        if result['peak_rss_mb'] > baseline[name]['peak_rss_mb'] * (1 + tolerance):
+            regressions.append('%s: peak_rss_mb rose from %.1f to %.1f' % (name, baseline[name]['peak_rss_mb'], result['peak_rss_mb']))
+
+    return regressions
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmarks the parsers and the analysis pipeline on synthetic Gaussian output files.')
+    parser.add_argument('--data-dir', default=None, help='Directory of an existing dataset, a synthetic one is generated if not given.')
+    parser.add_argument('-n', '--n-complexes', type=int, default=200, help='Number of synthetic complexes.')
+    parser.add_argument('--n-atoms', type=int, default=50, help='Mean number of atoms per synthetic complex.')
+    parser.add_argument('--failure-rate', type=float, default=0.05, help='Fraction of failed synthetic jobs.')
+    parser.add_argument('--basis', default='svp', choices=list(basis_sets.keys()), help='Basis set size of the synthetic complexes.')
+    parser.add_argument('--n-states', type=int, default=30, help='Number of excited states of the synthetic complexes.')
+    parser.add_argument('--merge-rows', type=int, default=100000, help='Number of rows of the merge benchmark tables.')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes of the analysis pipeline.')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of repetitions per benchmark.')
+    parser.add_argument('--benchmarks', nargs='+', default=list(benchmarks.keys()), choices=list(benchmarks.keys()), help='Benchmarks to run.')
+    parser.add_argument('--baseline', default=None, help='Baseline JSON file to compare against.')
+    parser.add_argument('--save-baseline', default=None, help='Write the results as new baseline JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Relative deviation from the baseline that is accepted.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+
+        data_dir = args.data_dir
+        if data_dir is None:
+            data_dir = os.path.join(work_dir, 'data')
+            generate_dataset(data_dir, args.n_complexes, args.n_atoms, failure_rate=args.failure_rate, basis=args.basis,
+                             n_states=args.n_states)
+
+        if 'merge' in args.benchmarks:
+            prepare_merge_inputs(data_dir, work_dir, args.merge_rows)
+
+        results = run_benchmarks(args.benchmarks, data_dir, work_dir, args.workers, args.repeats)
+
+    print('%-14s %10s %12s %10s %12s %14s' % ('benchmark', 'seconds', 'items/s', 'MB/s', 'peak RSS MB', 'RSS growth MB'))
+    for name, result in results.items():
+        print('%-14s %10.3f %12.1f %10.2f %12.1f %14.1f' % (
+            name, result['seconds'], result['items_per_second'], result['mb_per_second'], result['peak_rss_mb'], result['peak_rss_growth_mb']
+        ))
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w') as fh:
+            json.dump(results, fh, indent=4)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as fh:
+            baseline = json.load(fh)
+
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print('Regression: ' + regression)
+
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
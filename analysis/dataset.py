@@ -0,0 +1,371 @@
+import argparse
+import json
+import operator
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from merge import solvatochromism_columns
+from result_writer import _import_pyarrow, read_results
+
+
+# columns holding strings and flags, possibly suffixed by the solvent (pair)
+categorical_columns = ['id', 'transition_nature_vis']
+boolean_columns = ['has_failed'] + [_ for _ in solvatochromism_columns if _ not in ['lambda_delta', 'f_delta']]
+
+filter_operators = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda x, y: x.isin(y),
+    'not in': lambda x, y: ~x.isin(y)
+}
+
+npy_cache_version = 1
+
+def _matches_column(column: str, names: list[str]):
+
+    return any(column == _ or column.startswith(_ + '_') for _ in names)
+
+def get_dataset_dtype(column: str, float_dtype: str = 'float32'):
+
+    """Gets the dtype of a column of a result or merged (tmQMg*) table.
+
+    Arguments:
+        column (str): The column name, e.g. f_max_vis_acetone.
+        float_dtype (str): The dtype of the numeric columns.
+
+    Returns:
+        str: The dtype.
+    """
+
+    if _matches_column(column, categorical_columns):
+        return 'category'
+    if _matches_column(column, boolean_columns):
+        return 'boolean'
+
+    return float_dtype
+
+def apply_dataset_schema(df: pd.DataFrame, float_dtype: str = 'float32'):
+
+    """Converts the columns of a result or merged table to their compact dtypes.
+
+    Arguments:
+        df (pandas.DataFrame): The table.
+        float_dtype (str): The dtype of the numeric columns.
+
+    Returns:
+        pandas.DataFrame: The converted table.
+    """
+
+    return df.astype({column: get_dataset_dtype(column, float_dtype) for column in df.columns})
+
+def _read_source(file_path: str, float_dtype: str, columns: list[str] = None):
+
+    """Reads a result or merged table with the dataset schema.
+
+    CSV files are parsed into the compact dtypes right away so that the
+    float64 and object columns are never materialized. Only the requested
+    columns are parsed, in the order of the file.
+
+    Arguments:
+        file_path (str): The path to the table (.csv, .parquet, .arrow or .feather).
+        float_dtype (str): The dtype of the numeric columns.
+        columns (list[str]): The columns to read, all columns if None.
+
+    Returns:
+        pandas.DataFrame: The table.
+    """
+
+    if os.path.splitext(file_path)[1] != '.csv':
+        return apply_dataset_schema(read_results(file_path, columns), float_dtype)
+
+    if columns is None:
+        columns = pd.read_csv(file_path, nrows=0).columns
+    dtypes = {column: get_dataset_dtype(column, float_dtype) for column in columns}
+
+    return pd.read_csv(file_path, usecols=columns, dtype=dtypes)
+
+def get_filter_mask(df: pd.DataFrame, filters: list[tuple]):
+
+    """Evaluates row filters on a table.
+
+    Arguments:
+        df (pandas.DataFrame): The table.
+        filters (list[tuple]): The filters (column, operator, value), e.g.
+            ('f_max_vis_acetone', '>', 0.01), that all have to hold. The
+            operators are ==, !=, <, <=, >, >=, in and not in.
+
+    Returns:
+        numpy.ndarray: The mask of the rows passing all filters, rows with
+            missing values in a filter column never pass.
+    """
+
+    mask = np.ones(len(df), dtype=bool)
+    for column, operator_name, value in filters:
+        if operator_name not in filter_operators:
+            raise ValueError('Unknown filter operator: ' + operator_name)
+        column_mask = filter_operators[operator_name](df[column], value)
+        mask &= column_mask.to_numpy(dtype=bool, na_value=False) & df[column].notna().to_numpy()
+
+    return mask
+
+def _get_source_fingerprint(file_path: str, float_dtype: str):
+
+    stat = os.stat(file_path)
+
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'float_dtype': float_dtype}
+
+def _get_npy_meta_path(cache_path: str):
+
+    return os.path.join(cache_path, 'columns.json')
+
+def _get_parquet_meta_path(cache_path: str):
+
+    return cache_path + '.json'
+
+def _is_parquet_cache(cache_path: str):
+
+    return cache_path.endswith('.parquet')
+
+def _read_cache_meta(cache_path: str):
+
+    """Reads the metadata of a binary cache.
+
+    Arguments:
+        cache_path (str): The path to the cache.
+
+    Returns:
+        dict: The metadata or None if there is no complete cache.
+    """
+
+    meta_path = _get_parquet_meta_path(cache_path) if _is_parquet_cache(cache_path) else _get_npy_meta_path(cache_path)
+
+    try:
+        with open(meta_path, 'r') as fh:
+            return json.load(fh)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def write_cache(df: pd.DataFrame, cache_path: str, fingerprint: dict = None):
+
+    """Writes a table with dataset schema to a binary cache.
+
+    A path ending with .parquet gives a Parquet file, any other path a
+    directory with one NumPy file per column that is memory-mapped on
+    reading. Categorical columns are stored as codes, nullable boolean
+    columns as values and mask. The cache is written next to its final
+    location and moved there once complete, so that concurrent readers see
+    either the old or the new cache.
+
+    Arguments:
+        df (pandas.DataFrame): The table, see apply_dataset_schema().
+        cache_path (str): The path to the cache.
+        fingerprint (dict): The fingerprint of the source table, stored with
+            the cache to detect when it is outdated.
+    """
+
+    temp_path = cache_path + '.tmp-' + str(os.getpid())
+
+    if _is_parquet_cache(cache_path):
+        pa = _import_pyarrow()
+        pa.parquet.write_table(pa.Table.from_pandas(df, preserve_index=False), temp_path)
+        os.replace(temp_path, cache_path)
+        with open(temp_path, 'w') as fh:
+            json.dump({'fingerprint': fingerprint}, fh)
+        os.replace(temp_path, _get_parquet_meta_path(cache_path))
+        return
+
+    os.makedirs(temp_path)
+    columns = []
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        column_meta = {'name': column, 'dtype': str(values.dtype)}
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            column_meta['categories'] = values.cat.categories.tolist()
+            np.save(os.path.join(temp_path, '%d.npy' % i), values.cat.codes.to_numpy())
+        elif values.dtype == 'boolean':
+            np.save(os.path.join(temp_path, '%d.npy' % i), values.to_numpy(dtype=bool, na_value=False))
+            np.save(os.path.join(temp_path, '%d_mask.npy' % i), values.isna().to_numpy())
+        else:
+            np.save(os.path.join(temp_path, '%d.npy' % i), values.to_numpy())
+        columns.append(column_meta)
+
+    with open(_get_npy_meta_path(temp_path), 'w') as fh:
+        json.dump({'version': npy_cache_version, 'fingerprint': fingerprint, 'n_rows': len(df), 'columns': columns}, fh)
+
+    if os.path.isdir(cache_path):
+        shutil.rmtree(cache_path)
+    os.replace(temp_path, cache_path)
+
+def _map_npy(file_path: str, cache: dict):
+
+    """Memory-maps a NumPy file, reusing earlier maps.
+
+    Arguments:
+        file_path (str): The path to the file.
+        cache (dict): The mapped arrays by path.
+
+    Returns:
+        numpy.ndarray: A plain array view of the mapped file.
+    """
+
+    if file_path not in cache:
+        cache[file_path] = np.asarray(np.load(file_path, mmap_mode='r'))
+
+    return cache[file_path]
+
+def read_cache(cache_path: str, columns: list[str] = None, meta: dict = None, rows: np.ndarray = None,
+               cache: dict = None):
+
+    """Reads a table from a binary cache written by write_cache().
+
+    Only the requested columns are read. The NumPy files are memory-mapped
+    so that columns are paged in from the page cache on access, and only the
+    pages holding the requested rows are touched.
+
+    Arguments:
+        cache_path (str): The path to the cache.
+        columns (list[str]): The columns to read, all columns if None.
+        meta (dict): The metadata of the cache if already read.
+        rows (numpy.ndarray): The positions of the rows to read, all rows if None.
+        cache (dict): The mapped files and categorical dtypes of earlier reads,
+            filled by this call so that repeated reads can reuse them.
+
+    Returns:
+        pandas.DataFrame: The table.
+    """
+
+    if _is_parquet_cache(cache_path):
+        pa = _import_pyarrow()
+        df = pa.parquet.read_table(cache_path, columns=columns).to_pandas()
+        return df if rows is None else df.iloc[rows].reset_index(drop=True)
+
+    if meta is None:
+        meta = _read_cache_meta(cache_path)
+    if cache is None:
+        cache = {}
+    arrays = cache.setdefault('arrays', {})
+    categorical_dtypes = cache.setdefault('categorical_dtypes', {})
+
+    column_metas = {_['name']: (i, _) for i, _ in enumerate(meta['columns'])}
+    if columns is None:
+        columns = [_['name'] for _ in meta['columns']]
+
+    data = {}
+    for column in columns:
+        if column not in column_metas:
+            raise KeyError('Column not in dataset: ' + column)
+        i, column_meta = column_metas[column]
+        values = _map_npy(os.path.join(cache_path, '%d.npy' % i), arrays)
+        if rows is not None:
+            values = values[rows]
+        if column_meta['dtype'] == 'category':
+            if column not in categorical_dtypes:
+                categorical_dtypes[column] = pd.CategoricalDtype(column_meta['categories'])
+            data[column] = pd.Categorical.from_codes(values, dtype=categorical_dtypes[column], validate=False)
+        elif column_meta['dtype'] == 'boolean':
+            mask = _map_npy(os.path.join(cache_path, '%d_mask.npy' % i), arrays)
+            data[column] = pd.arrays.BooleanArray(values, mask if rows is None else mask[rows])
+        else:
+            data[column] = values
+
+    n_rows = meta['n_rows'] if rows is None else len(rows)
+
+    return pd.DataFrame(data, index=pd.RangeIndex(n_rows), copy=False)
+
+def load_dataset(file_path: str, columns: list[str] = None, filters: list[tuple] = None, cache_path: str = None,
+                 float_dtype: str = 'float32'):
+
+    """Loads a result or merged (tmQMg*) table with compact dtypes.
+
+    Numeric columns are stored as float_dtype, flags as nullable booleans and
+    strings (id, transition_nature_vis) as categoricals. If a cache path is
+    given, the complete table is written to the cache on the first load and
+    later loads read from the cache as long as the source is unchanged.
+
+    Arguments:
+        file_path (str): The path to the table (.csv, .parquet, .arrow or .feather).
+        columns (list[str]): The columns to load, all columns if None.
+        filters (list[tuple]): The row filters, see get_filter_mask().
+        cache_path (str): The path to the binary cache (.parquet or a directory of .npy files).
+        float_dtype (str): The dtype of the numeric columns.
+
+    Returns:
+        pandas.DataFrame: The table.
+    """
+
+    filters = [] if filters is None else filters
+
+    read_columns = columns
+    if columns is not None:
+        read_columns = list(columns) + [_[0] for _ in filters if _[0] not in columns]
+
+    if cache_path is None:
+        df = _read_source(file_path, float_dtype, read_columns)
+        if read_columns is not None:
+            df = df[read_columns]
+    else:
+        fingerprint = _get_source_fingerprint(file_path, float_dtype)
+        meta = _read_cache_meta(cache_path)
+        if meta is None or meta['fingerprint'] != fingerprint or meta.get('version', npy_cache_version) != npy_cache_version:
+            write_cache(_read_source(file_path, float_dtype), cache_path, fingerprint)
+            meta = None
+        df = read_cache(cache_path, read_columns, meta)
+
+    if len(filters) > 0:
+        df = df[get_filter_mask(df, filters)].reset_index(drop=True)
+
+    if columns is not None and len(df.columns) != len(columns):
+        df = df[list(columns)]
+
+    return df
+
+def _parse_filter(filter_string: str):
+
+    """Parses a filter given as 'column operator value' on the command line.
+
+    Arguments:
+        filter_string (str): The filter, e.g. 'f_max_vis_acetone > 0.01'.
+
+    Returns:
+        tuple: The filter (column, operator, value).
+    """
+
+    column, operator_name, value = filter_string.split(maxsplit=2)
+
+    if value in ['True', 'False']:
+        return column, operator_name, value == 'True'
+
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+
+    return column, operator_name, value
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Loads a result or merged table with compact dtypes and builds its binary cache.')
+    parser.add_argument('dataset', help='Result or merged table (.csv, .parquet, .arrow or .feather).')
+    parser.add_argument('--cache', default=None, help='Binary cache (.parquet or a directory of .npy files) to build or use.')
+    parser.add_argument('--columns', nargs='+', default=None, help='Columns to load, all columns if not given.')
+    parser.add_argument('--filter', action='append', default=[], type=_parse_filter, help="Row filter such as 'f_max_vis_acetone > 0.01', can be given several times.")
+    parser.add_argument('--float-dtype', default='float32', choices=['float32', 'float64'], help='Dtype of the numeric columns.')
+    parser.add_argument('-o', '--output', default=None, help='Output CSV file for the loaded rows.')
+    args = parser.parse_args()
+
+    df = load_dataset(args.dataset, args.columns, args.filter, args.cache, args.float_dtype)
+
+    print(str(len(df)) + ' rows, ' + str(len(df.columns)) + ' columns, ' + '%.1f MB' % (df.memory_usage(deep=True).sum() / 1e6))
+
+    if args.output is not None:
+        df.to_csv(args.output, index=False)
+
+if __name__ == '__main__':
+    main()
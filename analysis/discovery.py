@@ -0,0 +1,127 @@
+import csv
+import os
+
+from file_utils import strip_compression_suffix
+
+
+tddft_suffix = '.out'
+nto_suffix = '-vis.out'
+
+def get_output_file_key(file_name: str):
+
+    """Gets the key that pairs a TD-DFT output file with its NTO output file.
+
+    Arguments:
+        file_name (str): The (compressed) file name, e.g. X.out or X-vis.out.gz.
+
+    Returns:
+        str: The key (X) or None if the file is no Gaussian output file.
+        bool: The flag indicating whether the file is an NTO output file.
+    """
+
+    base_name = strip_compression_suffix(file_name)
+
+    if base_name.endswith(nto_suffix):
+        return base_name[:-len(nto_suffix)], True
+
+    if base_name.endswith(tddft_suffix):
+        return base_name[:-len(tddft_suffix)], False
+
+    return None, False
+
+def iter_output_files(data_dir: str):
+
+    """Iterates over the Gaussian output files in a directory tree.
+
+    The tree is walked with os.scandir() and files are yielded while the
+    directories are being listed, so that the listing never has to be held
+    in memory. Subdirectories (e.g. of job arrays or shards) are searched
+    recursively, symbolic links to directories are not followed.
+
+    Arguments:
+        data_dir (str): The root directory.
+
+    Yields:
+        str: The path to the file.
+        str: The file name.
+    """
+
+    directories = [data_dir]
+    while len(directories) > 0:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif get_output_file_key(entry.name)[0] is not None and entry.is_file():
+                    yield entry.path, entry.name
+
+def iter_file_pairs(data_dir: str, orphans: list = None):
+
+    """Pairs the TD-DFT output files X.out with their NTO output files X-vis.out.
+
+    Pairs are yielded as soon as both files have been found while the
+    directory tree is still being walked, only files whose partner has not
+    been found yet are kept in memory. The two files of a pair may be
+    located in different subdirectories. TD-DFT output files without NTO
+    output file are yielded once the walk has finished.
+
+    Arguments:
+        data_dir (str): The root directory.
+        orphans (list): List to which the paths of files without partner are
+            appended together with the reason ('nto_missing', 'tddft_missing'
+            or 'duplicate' for a second file with the same key while the
+            first one still waits for its partner).
+
+    Yields:
+        str: The path to the TD-DFT output file.
+        str: The path to the NTO output file or None if there is none.
+    """
+
+    # files waiting for their partner by key
+    pending_tddft = {}
+    pending_nto = {}
+
+    for path, name in iter_output_files(data_dir):
+
+        key, is_nto = get_output_file_key(name)
+
+        if is_nto:
+            if key in pending_tddft:
+                yield pending_tddft.pop(key), path
+            elif key in pending_nto:
+                _add_orphan(orphans, path, 'duplicate')
+            else:
+                pending_nto[key] = path
+        else:
+            if key in pending_nto:
+                yield path, pending_nto.pop(key)
+            elif key in pending_tddft:
+                _add_orphan(orphans, path, 'duplicate')
+            else:
+                pending_tddft[key] = path
+
+    for path in pending_tddft.values():
+        _add_orphan(orphans, path, 'nto_missing')
+        yield path, None
+
+    for path in pending_nto.values():
+        _add_orphan(orphans, path, 'tddft_missing')
+
+def _add_orphan(orphans: list, path: str, reason: str):
+
+    if orphans is not None:
+        orphans.append((path, reason))
+
+def write_orphan_report(orphans: list, file_path: str):
+
+    """Writes the files without partner to a CSV file.
+
+    Arguments:
+        orphans (list[tuple]): The paths and reasons, see iter_file_pairs().
+        file_path (str): The path to the CSV file.
+    """
+
+    with open(file_path, 'w', newline='') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(['path', 'reason'])
+        writer.writerows(sorted(orphans))
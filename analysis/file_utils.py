@@ -0,0 +1,260 @@
+import bz2
+import contextlib
+import gzip
+import io
+import lzma
+import os
+import tarfile
+
+
+compression_openers = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+    '.zst': None
+}
+
+class _StreamReader(io.RawIOBase):
+
+    """Read-only, non-seekable view of a binary file-like object.
+
+    Members of tar archives opened in stream mode fail when asked whether
+    they are seekable, which the io wrappers do on construction.
+    """
+
+    def __init__(self, fileobj):
+
+        self._fileobj = fileobj
+
+    def readable(self):
+
+        return True
+
+    def readinto(self, buffer):
+
+        data = self._fileobj.read(len(buffer))
+        buffer[:len(data)] = data
+
+        return len(data)
+
+def get_compression_suffix(file_name: str):
+
+    """Gets the compression suffix of a file name.
+
+    Arguments:
+        file_name (str): The file name.
+
+    Returns:
+        str: The compression suffix or None if the file is not compressed.
+    """
+
+    for suffix in compression_openers.keys():
+        if file_name.endswith(suffix):
+            return suffix
+
+    return None
+
+def strip_compression_suffix(file_name: str):
+
+    """Removes the compression suffix from a file name.
+
+    Arguments:
+        file_name (str): The file name.
+
+    Returns:
+        str: The file name without compression suffix.
+    """
+
+    suffix = get_compression_suffix(file_name)
+    if suffix is not None:
+        return file_name[:-len(suffix)]
+
+    return file_name
+
+def get_file_id(file_name: str):
+
+    """Gets the ID of a TMC from the name of one of its output files.
+
+    Arguments:
+        file_name (str): The file name or path.
+
+    Returns:
+        str: The ID.
+    """
+
+    return file_name.split('/')[-1].split('.')[0]
+
+def get_source_name(source):
+
+    """Gets the file name of a file path or file-like object.
+
+    Arguments:
+        source (str|file): The file path or file-like object.
+
+    Returns:
+        str: The file name or an empty string if it is unknown.
+    """
+
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+
+    name = getattr(source, 'name', '')
+    if isinstance(name, str):
+        return name
+
+    return ''
+
+def _open_zstd(source, mode: str = 'rb'):
+
+    """Opens a zstandard compressed file or byte stream.
+
+    Arguments:
+        source (str|file): The file path or binary file-like object.
+        mode (str): The mode, either 'rb' or 'rt'.
+
+    Returns:
+        file: The decompressed stream.
+    """
+
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError('Reading .zst files requires the zstandard package.') from e
+
+    return zstandard.open(source, mode)
+
+def open_compressed_stream(fileobj, file_name: str):
+
+    """Wraps a binary stream in a decompressing stream based on a file name.
+
+    Arguments:
+        fileobj (file): The binary file-like object.
+        file_name (str): The file name used to determine the compression.
+
+    Returns:
+        file: The decompressed binary stream.
+    """
+
+    suffix = get_compression_suffix(file_name)
+
+    if suffix is None:
+        return fileobj
+
+    if suffix == '.zst':
+        return _open_zstd(fileobj, 'rb')
+
+    return compression_openers[suffix](fileobj, 'rb')
+
+@contextlib.contextmanager
+def open_text(source):
+
+    """Opens a Gaussian output file for reading text.
+
+    Plain, gzip, bzip2, xz and zstandard compressed files are supported when
+    given by path, compression is determined from the file name. File-like
+    objects are read as they are (see open_compressed_stream()) and are not
+    closed.
+
+    Arguments:
+        source (str|file): The file path or file-like object.
+
+    Yields:
+        file: The text stream.
+    """
+
+    if isinstance(source, (str, os.PathLike)):
+
+        suffix = get_compression_suffix(os.fspath(source))
+
+        if suffix is None:
+            with open(source, 'r') as fh:
+                yield fh
+        elif suffix == '.zst':
+            with _open_zstd(source, 'rt') as fh:
+                yield fh
+        else:
+            with compression_openers[suffix](source, 'rt') as fh:
+                yield fh
+
+    elif isinstance(source, io.TextIOBase):
+        yield source
+
+    else:
+
+        fh = io.TextIOWrapper(source)
+        try:
+            yield fh
+        finally:
+            # do not close the stream of the caller
+            fh.detach()
+
+def read_tail(file_path: str, n_bytes: int = 4096):
+
+    """Reads the last bytes of a file without reading the rest of it.
+
+    Arguments:
+        file_path (str): The path to the file.
+        n_bytes (int): The number of bytes to read from the end of the file.
+
+    Returns:
+        str: The decoded tail of the file.
+    """
+
+    with open(file_path, 'rb') as fh:
+        fh.seek(0, os.SEEK_END)
+        fh.seek(max(0, fh.tell() - n_bytes))
+        tail = fh.read()
+
+    return tail.decode('utf-8', errors='replace')
+
+def has_normal_termination(source, n_bytes: int = 4096):
+
+    """Checks if a Gaussian output file ends with a normal termination message.
+
+    Only the tail of the file is read so that failed jobs can be rejected
+    before they are parsed. This is only possible for uncompressed files given
+    by path, for all other sources the status cannot be determined up front.
+
+    Arguments:
+        source (str|file): The file path or file-like object.
+        n_bytes (int): The size of the tail block to inspect.
+
+    Returns:
+        bool: The flag indicating whether the job terminated normally or None
+            if it cannot be determined without reading the whole file.
+    """
+
+    if not isinstance(source, (str, os.PathLike)) or get_compression_suffix(os.fspath(source)) is not None:
+        return None
+
+    last_line = read_tail(source, n_bytes).strip().split('\n')[-1]
+
+    return 'Normal termination' in last_line
+
+def iter_tar_output_files(archive_path: str):
+
+    """Iterates over the Gaussian output files in a (compressed) tar archive.
+
+    The archive is read as a stream so that it is neither extracted nor
+    seeked in. Compressed members are decompressed on the fly. Each file
+    object is only valid until the next one is yielded.
+
+    Arguments:
+        archive_path (str): The path to the tar archive.
+
+    Yields:
+        str: The name of the member.
+        file: The decompressed binary file-like object of the member.
+    """
+
+    with tarfile.open(archive_path, 'r|*') as tar:
+        for member in tar:
+
+            if not member.isfile():
+                continue
+
+            if not strip_compression_suffix(member.name).endswith('.out'):
+                continue
+
+            fileobj = io.BufferedReader(_StreamReader(tar.extractfile(member)))
+            yield member.name, open_compressed_stream(fileobj, member.name)
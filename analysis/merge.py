@@ -1,217 +1,548 @@
+import argparse
+import itertools
 import math
+import os
+import pickle
+import tempfile
 
+import numpy as np
 import pandas as pd
 
+from result_writer import iter_result_chunks, read_results, result_columns
+
 
 f_threshold = 0.01
 
-base_df = pd.read_csv('df_gaussian-tddft-svp.csv')
-acetone_df = pd.read_csv('df_gaussian-tddft-svp-acetone.csv')
-
-df = base_df.merge(acetone_df, how='inner', on='id').rename(columns=lambda x: x.replace('_x', '_gasphase').replace('_y', '_acetone'))
-
-df = df.drop('has_failed_gasphase', axis=1)
-df = df.drop('has_failed_acetone', axis=1)
-
-new_data = []
+band_regions = ['uv', 'vis', 'nir']
+
+# columns needed to compute the solvatochromism data
+required_columns = ['id', 'has_failed']
+for region in band_regions:
+    required_columns.extend(['lambda_max_' + region, 'f_max_' + region])
+
+solvatochromism_columns = [
+    'lambda_delta', 'f_delta',
+    'vis_to_vis', 'uv_to_vis', 'nir_to_vis', 'vis_to_uv', 'vis_to_nir',
+    'bathochromic', 'hypsochromic', 'hyperchromic', 'hypochromic'
+]
+
+def get_band_data(df: pd.DataFrame, suffix: str = ''):
+
+    """Gets the band maxima and oscillator strengths of a result table as arrays.
+
+    Arguments:
+        df (pandas.DataFrame): The result table.
+        suffix (str): The suffix of the band columns (e.g. '_gasphase').
+
+    Returns:
+        dict[str, numpy.ndarray]: The band columns with missing values as NaN.
+    """
+
+    band_data = {}
+    for region in band_regions:
+        for quantity in ['lambda_max_', 'f_max_']:
+            band_data[quantity + region] = df[quantity + region + suffix].to_numpy(dtype=float, na_value=np.nan)
+
+    return band_data
+
+def compute_solvatochromism_data(reference: dict, solvent: dict, f_threshold: float = f_threshold):
+
+    """Computes the solvatochromism data for whole columns at once.
+
+    The band data may be arrays of any (common) shape, so that several
+    solvent pairs can be computed in a single call by stacking them.
+
+    Arguments:
+        reference (dict[str, numpy.ndarray]): The band data of the reference (e.g. gas phase).
+        solvent (dict[str, numpy.ndarray]): The band data of the solvent.
+        f_threshold (float): The oscillator strength threshold for a band to count.
+
+    Returns:
+        dict[str, numpy.ndarray]: The solvatochromism columns.
+    """
+
+    # NaN compares as False so missing bands count as below the threshold
+    with np.errstate(invalid='ignore'):
+        has_vis_reference = reference['f_max_vis'] > f_threshold
+        has_vis_solvent = solvent['f_max_vis'] > f_threshold
+
+    shift_in_vis = has_vis_reference & has_vis_solvent
+    shift_to_vis = ~has_vis_reference & has_vis_solvent
+    shift_from_vis = has_vis_reference & ~has_vis_solvent
+
+    # closest band of the respective other phase for shifts to or from the visible
+    to_vis_uv, to_vis_nir = _get_closest_bands(solvent['lambda_max_vis'], reference, f_threshold)
+    from_vis_uv, from_vis_nir = _get_closest_bands(reference['lambda_max_vis'], solvent, f_threshold)
+
+    vis_to_vis = shift_in_vis
+    uv_to_vis = shift_to_vis & to_vis_uv
+    nir_to_vis = shift_to_vis & to_vis_nir
+    vis_to_uv = shift_from_vis & from_vis_uv
+    vis_to_nir = shift_from_vis & from_vis_nir
+
+    conditions = [vis_to_vis, uv_to_vis, nir_to_vis, vis_to_uv, vis_to_nir]
+    lambda_delta = np.select(conditions, [
+        solvent['lambda_max_vis'] - reference['lambda_max_vis'],
+        solvent['lambda_max_vis'] - reference['lambda_max_uv'],
+        solvent['lambda_max_vis'] - reference['lambda_max_nir'],
+        solvent['lambda_max_uv'] - reference['lambda_max_vis'],
+        solvent['lambda_max_nir'] - reference['lambda_max_vis']
+    ], default=0.0)
+    f_delta = np.select(conditions, [
+        solvent['f_max_vis'] - reference['f_max_vis'],
+        solvent['f_max_vis'] - reference['f_max_uv'],
+        solvent['f_max_vis'] - reference['f_max_nir'],
+        solvent['f_max_uv'] - reference['f_max_vis'],
+        solvent['f_max_nir'] - reference['f_max_vis']
+    ], default=0.0)
+
+    with np.errstate(invalid='ignore'):
+        return {
+            'lambda_delta': lambda_delta,
+            'f_delta': f_delta,
+            'vis_to_vis': vis_to_vis,
+            'uv_to_vis': uv_to_vis,
+            'nir_to_vis': nir_to_vis,
+            'vis_to_uv': vis_to_uv,
+            'vis_to_nir': vis_to_nir,
+            'bathochromic': lambda_delta > 0,
+            'hypsochromic': lambda_delta < 0,
+            'hyperchromic': f_delta > 0,
+            'hypochromic': f_delta < 0
+        }
+
+def _get_closest_bands(lambda_max_vis: np.ndarray, other: dict, f_threshold: float):
+
+    """Determines whether a visible band is matched to the UV or the nIR band of the other phase.
+
+    Arguments:
+        lambda_max_vis (numpy.ndarray): The visible band maxima.
+        other (dict[str, numpy.ndarray]): The band data of the other phase.
+        f_threshold (float): The oscillator strength threshold for a band to count.
+
+    Returns:
+        numpy.ndarray: The mask of visible bands matched to the UV band.
+        numpy.ndarray: The mask of visible bands matched to the nIR band.
+    """
+
+    with np.errstate(invalid='ignore'):
+        has_uv = other['f_max_uv'] > f_threshold
+        has_nir = other['f_max_nir'] > f_threshold
+
+    # the distance to a valid nIR band is stored as UV distance and the nIR
+    # distance is never set, exactly as in the published row-wise version
+    uv_distance = np.where(has_uv, np.abs(lambda_max_vis - other['lambda_max_uv']), np.nan)
+    uv_distance = np.where(has_nir, np.abs(lambda_max_vis - other['lambda_max_nir']), uv_distance)
+    nir_distance = np.full_like(uv_distance, np.nan)
+
+    has_uv_distance = ~np.isnan(uv_distance)
+    has_nir_distance = ~np.isnan(nir_distance)
+
+    with np.errstate(invalid='ignore'):
+        uv_is_closer = uv_distance < nir_distance
+
+    to_uv = (has_uv_distance & has_nir_distance & uv_is_closer) | (has_uv_distance & ~has_nir_distance)
+    to_nir = (has_uv_distance & has_nir_distance & ~uv_is_closer) | (~has_uv_distance & has_nir_distance)
+
+    return to_uv, to_nir
+
+def merge_results(base_df: pd.DataFrame, acetone_df: pd.DataFrame, f_threshold: float = f_threshold):
+
+    """Merges gas phase and acetone results and computes the solvatochromism data.
+
+    Arguments:
+        base_df (pandas.DataFrame): The gas phase results.
+        acetone_df (pandas.DataFrame): The acetone results.
+        f_threshold (float): The oscillator strength threshold for a band to count.
+
+    Returns:
+        pandas.DataFrame: The merged table.
+    """
+
+    df = base_df.merge(acetone_df, how='inner', on='id').rename(columns=lambda x: x.replace('_x', '_gasphase').replace('_y', '_acetone'))
+
+    df = df.drop('has_failed_gasphase', axis=1)
+    df = df.drop('has_failed_acetone', axis=1)
+
+    solvatochromism_data = compute_solvatochromism_data(
+        get_band_data(df, '_gasphase'),
+        get_band_data(df, '_acetone'),
+        f_threshold
+    )
+
+    return pd.concat([df, pd.DataFrame(solvatochromism_data, index=df.index)], axis=1)
+
+def get_solvent_pairs(solvents: list[str], reference: str = None):
+
+    """Gets the pairs of solvents to compare.
+
+    Arguments:
+        solvents (list[str]): The solvent names.
+        reference (str): The solvent all others are compared to, all pairs of
+            solvents are compared if None.
+
+    Returns:
+        list[tuple]: The (reference, solvent) pairs.
+    """
+
+    if reference is not None:
+        if reference not in solvents:
+            raise ValueError('Unknown reference: ' + reference)
+        return [(reference, _) for _ in solvents if _ != reference]
+
+    return list(itertools.combinations(solvents, 2))
+
+def align_results(dfs: dict):
+
+    """Aligns the result tables of several solvents on the TMC ID.
+
+    Only TMCs contained in all tables are kept, in the order of the first table.
+
+    Arguments:
+        dfs (dict[str, pandas.DataFrame]): The result tables by solvent name.
+
+    Returns:
+        pandas.Series: The IDs of the aligned rows.
+        dict[str, pandas.DataFrame]: The aligned tables by solvent name, without id column.
+    """
+
+    for name, df in dfs.items():
+        if not df['id'].is_unique:
+            raise ValueError('Duplicate IDs in the results of ' + name + '.')
+
+    first_df = next(iter(dfs.values()))
+
+    common_ids = pd.Index(first_df['id'])
+    for df in dfs.values():
+        common_ids = common_ids.intersection(df['id'])
+
+    ids = first_df['id'][first_df['id'].isin(common_ids)].reset_index(drop=True)
+    aligned_dfs = {name: df.set_index('id').reindex(ids).reset_index(drop=True) for name, df in dfs.items()}
+
+    return ids, aligned_dfs
+
+def merge_solvent_results(dfs: dict, reference: str = None, f_threshold: float = f_threshold):
+
+    """Merges the results of any number of solvents and computes the solvatochromism data.
+
+    The tables are aligned once and the band data of all solvent pairs are
+    stacked into (n_pairs x n_complexes) arrays so that the solvatochromism
+    data of all pairs are computed in a single pass.
+
+    Arguments:
+        dfs (dict[str, pandas.DataFrame]): The result tables by solvent name
+            (e.g. 'gasphase', 'acetone').
+        reference (str): The solvent all others are compared to, all pairs of
+            solvents are compared if None.
+        f_threshold (float): The oscillator strength threshold for a band to count.
+
+    Returns:
+        pandas.DataFrame: The merged table with the result columns suffixed by
+            '_<solvent>' and the solvatochromism columns suffixed by
+            '_<reference>_<solvent>' for each pair.
+    """
+
+    ids, aligned_dfs = align_results(dfs)
+    pairs = get_solvent_pairs(list(dfs.keys()), reference)
+
+    band_data = {name: get_band_data(df) for name, df in aligned_dfs.items()}
+
+    columns = [ids.to_frame()]
+    for name, df in aligned_dfs.items():
+        columns.append(df.drop(columns='has_failed', errors='ignore').add_suffix('_' + name))
+
+    if len(pairs) > 0:
+
+        reference_data = {key: np.stack([band_data[_][key] for _, __ in pairs]) for key in band_data[pairs[0][0]]}
+        solvent_data = {key: np.stack([band_data[_][key] for __, _ in pairs]) for key in band_data[pairs[0][0]]}
+        solvatochromism_data = compute_solvatochromism_data(reference_data, solvent_data, f_threshold)
+
+        pair_data = {}
+        for i, (reference_name, solvent_name) in enumerate(pairs):
+            for column in solvatochromism_columns:
+                pair_data[column + '_' + reference_name + '_' + solvent_name] = solvatochromism_data[column][i]
+        columns.append(pd.DataFrame(pair_data, index=ids.index))
+
+    return pd.concat(columns, axis=1)
+
+class _UnsortedInputError(ValueError):
+
+    """Raised when an input of the sorted merge is not sorted by ID."""
+
+
+class _SortedChunkReader():
+
+    """Buffers the chunks of a result table that is sorted by ID."""
+
+    def __init__(self, chunks):
+
+        self._chunks = iter(chunks)
+        self.buffer = None
+        self.last_id = None
+        self.is_exhausted = False
+
+        self.read()
+
+    def read(self):
+
+        """Appends the next non-empty chunk to the buffer.
+
+        Raises:
+            _UnsortedInputError: If the IDs are not in ascending order.
+        """
+
+        for chunk in self._chunks:
+
+            if self.buffer is None:
+                self.buffer = chunk.iloc[:0]
+            if len(chunk) == 0:
+                continue
+
+            ids = chunk['id']
+            if not ids.is_monotonic_increasing or (self.last_id is not None and ids.iloc[0] < self.last_id):
+                raise _UnsortedInputError('Input is not sorted by id.')
+
+            self.last_id = ids.iloc[-1]
+            self.buffer = pd.concat([self.buffer, chunk], ignore_index=True)
+            return
+
+        self.is_exhausted = True
+
+    def split(self, bound=None):
+
+        """Removes the rows with IDs below a bound from the buffer.
+
+        Arguments:
+            bound (str): The bound, all rows are removed if None.
+
+        Returns:
+            pandas.DataFrame: The removed rows.
+        """
+
+        if bound is None:
+            rows = self.buffer
+            self.buffer = self.buffer.iloc[:0]
+            return rows
+
+        is_below = (self.buffer['id'] < bound).to_numpy()
+        rows = self.buffer[is_below]
+        self.buffer = self.buffer[~is_below].reset_index(drop=True)
+
+        return rows
+
+def _iter_sorted_merge(base_chunks, acetone_chunks, f_threshold: float):
+
+    """Merges two result tables sorted by ID with a sort-merge join.
+
+    Rows with IDs below the smallest last ID read from any unfinished input
+    are complete on both sides and are merged, the remaining rows wait for
+    the next chunk of the input that has fallen behind.
+
+    Arguments:
+        base_chunks (Iterable[pandas.DataFrame]): The chunks of the gas phase results.
+        acetone_chunks (Iterable[pandas.DataFrame]): The chunks of the acetone results.
+        f_threshold (float): The oscillator strength threshold for a band to count.
+
+    Yields:
+        pandas.DataFrame: The chunks of the merged table in ID order.
+
+    Raises:
+        _UnsortedInputError: If an input is not sorted by ID.
+    """
+
+    readers = [_SortedChunkReader(base_chunks), _SortedChunkReader(acetone_chunks)]
+    if any(_.buffer is None for _ in readers):
+        return
+
+    while True:
+
+        open_ids = [_.last_id for _ in readers if not _.is_exhausted]
+        bound = min(open_ids) if len(open_ids) > 0 else None
+
+        yield merge_results(readers[0].split(bound), readers[1].split(bound), f_threshold)
+
+        if bound is None:
+            return
+
+        for reader in readers:
+            if not reader.is_exhausted and reader.last_id == bound:
+                reader.read()
+
+def _iter_partitioned_merge(base_path: str, acetone_path: str, columns: list[str], chunk_size: int,
+                            f_threshold: float, temp_dir: str = None):
+
+    """Merges two result tables in any order by partitioning them by ID ranges.
+
+    The partition boundaries are taken from a sample of the IDs so that each
+    partition holds about chunk_size rows of each input. Both inputs are
+    split into partition files in a temporary directory and the partitions
+    are merged one at a time.
+
+    Arguments:
+        base_path (str): The path to the gas phase results.
+        acetone_path (str): The path to the acetone results.
+        columns (list[str]): The columns to read, all columns if None.
+        chunk_size (int): The number of rows read at a time.
+        f_threshold (float): The oscillator strength threshold for a band to count.
+        temp_dir (str): The directory for the partition files.
+
+    Yields:
+        pandas.DataFrame: The chunks of the merged table in ID order.
+    """
+
+    input_paths = [base_path, acetone_path]
+
+    # sample of the IDs to determine the partition boundaries
+    sample_step = max(1, chunk_size // 100)
+    sample = []
+    n_rows = 0
+    for input_path in input_paths:
+        for chunk in iter_result_chunks(input_path, ['id'], chunk_size):
+            sample.extend(chunk['id'].iloc[::sample_step].tolist())
+            n_rows += len(chunk)
+
+    n_partitions = max(1, math.ceil(n_rows / (2 * chunk_size)))
+    sample.sort()
+    boundaries = np.array([sample[len(sample) * (i+1) // n_partitions] for i in range(n_partitions - 1)], dtype=object)
+
+    with tempfile.TemporaryDirectory(dir=temp_dir) as partition_dir:
 
-for _ in df.to_dict(orient='records'):
-
-    lambda_delta = None
-    f_delta = None
+        for side, input_path in enumerate(input_paths):
+            for chunk in iter_result_chunks(input_path, columns, chunk_size):
+                partitions = np.searchsorted(boundaries, chunk['id'].to_numpy(dtype=object), side='right')
+                for partition, rows in chunk.groupby(partitions, sort=False):
+                    with open(os.path.join(partition_dir, '%d_%d.pkl' % (side, partition)), 'ab') as fh:
+                        pickle.dump(rows, fh)
 
-    vis_to_vis = None
-    uv_to_vis = None
-    nir_to_vis = None
-    vis_to_uv = None
-    vis_to_nir = None
+        for partition in range(n_partitions):
 
-    if not math.isnan(_['f_max_vis_gasphase']) and _['f_max_vis_gasphase'] > f_threshold \
-       and not math.isnan(_['f_max_vis_acetone']) and _['f_max_vis_acetone'] > f_threshold:
+            tables = [_load_partition(os.path.join(partition_dir, '%d_%d.pkl' % (side, partition))) for side in range(2)]
+            if any(_ is None for _ in tables):
+                continue
+
+            base_df, acetone_df = [_.sort_values('id', kind='stable', ignore_index=True) for _ in tables]
+            yield merge_results(base_df, acetone_df, f_threshold)
 
-        print('Shift in the visible')
+def _load_partition(file_path: str):
 
-        lambda_delta = _['lambda_max_vis_acetone'] - _['lambda_max_vis_gasphase']
-        f_delta = _['f_max_vis_acetone'] - _['f_max_vis_gasphase']
-        vis_to_vis = True
-        uv_to_vis = False
-        nir_to_vis = False
-        vis_to_uv = False
-        vis_to_nir = False
-
-    elif (math.isnan(_['f_max_vis_gasphase']) or _['f_max_vis_gasphase'] <= f_threshold) \
-       and (math.isnan(_['f_max_vis_acetone']) or _['f_max_vis_acetone'] <= f_threshold):
-
-        print('No shift')
-
-        lambda_delta = 0
-        f_delta = 0
-        vis_to_vis = False
-        uv_to_vis = False
-        nir_to_vis = False
-        vis_to_uv = False
-        vis_to_nir = False
-
-    elif (math.isnan(_['f_max_vis_gasphase']) or _['f_max_vis_gasphase'] <= f_threshold) \
-       and not math.isnan(_['f_max_vis_acetone'] and _['f_max_vis_acetone'] > f_threshold):
-
-        print("Shift to the visible")
-
-        uv_distance = None
-        nir_distance = None
-
-        if not math.isnan(_['f_max_uv_gasphase']) and _['f_max_uv_gasphase'] > f_threshold:
-            uv_distance = abs(_['lambda_max_vis_acetone'] - _['lambda_max_uv_gasphase'])
-        if not math.isnan(_['f_max_nir_gasphase']) and _['f_max_nir_gasphase'] > f_threshold:
-            uv_distance = abs(_['lambda_max_vis_acetone'] - _['lambda_max_nir_gasphase'])
-
-        if uv_distance is not None and nir_distance is not None:
-
-            if uv_distance < nir_distance:
-                lambda_delta = _['lambda_max_vis_acetone'] - _['lambda_max_uv_gasphase']
-                f_delta = _['f_max_vis_acetone'] - _['f_max_uv_gasphase']
-                vis_to_vis = False
-                uv_to_vis = True
-                nir_to_vis = False
-                vis_to_uv = False
-                vis_to_nir = False
-            else:
-                lambda_delta = _['lambda_max_vis_acetone'] - _['lambda_max_nir_gasphase']
-                f_delta = _['f_max_vis_acetone'] - _['f_max_nir_gasphase']
-                vis_to_vis = False
-                uv_to_vis = False
-                nir_to_vis = True
-                vis_to_uv = False
-                vis_to_nir = False
-
-        elif uv_distance is None and nir_distance is None:
-
-            lambda_delta = 0
-            f_delta = 0
-            vis_to_vis = False
-            uv_to_vis = False
-            nir_to_vis = False
-            vis_to_uv = False
-            vis_to_nir = False
-
-        elif uv_distance is not None and nir_distance is None:
-
-            lambda_delta = _['lambda_max_vis_acetone'] - _['lambda_max_uv_gasphase']
-            f_delta = _['f_max_vis_acetone'] - _['f_max_uv_gasphase']
-            vis_to_vis = False
-            uv_to_vis = True
-            nir_to_vis = False
-            vis_to_uv = False
-            vis_to_nir = False
-
-        elif uv_distance is None and nir_distance is not None:
-
-            lambda_delta = _['lambda_max_vis_acetone'] - _['lambda_max_nir_gasphase']
-            f_delta = _['f_max_vis_acetone'] - _['f_max_nir_gasphase']
-            vis_to_vis = False
-            uv_to_vis = False
-            nir_to_vis = True
-            vis_to_uv = False
-            vis_to_nir = False
-
-
-    elif not math.isnan(_['f_max_vis_gasphase']) and _['f_max_vis_gasphase'] > f_threshold \
-       and (math.isnan(_['f_max_vis_acetone']) or _['f_max_vis_acetone'] <= f_threshold):
-
-        print("Shift away from the visible")
-
-        uv_distance = None
-        nir_distance = None
-
-        if not math.isnan(_['f_max_uv_acetone']) and _['f_max_uv_acetone'] > f_threshold:
-            uv_distance = abs(_['lambda_max_vis_gasphase'] - _['lambda_max_uv_acetone'])
-        if not math.isnan(_['f_max_nir_acetone']) and _['f_max_nir_acetone'] > f_threshold:
-            uv_distance = abs(_['lambda_max_vis_gasphase'] - _['lambda_max_nir_acetone'])
-
-        if uv_distance is not None and nir_distance is not None:
-
-            if uv_distance < nir_distance:
-                lambda_delta = _['lambda_max_uv_acetone'] - _['lambda_max_vis_gasphase']
-                f_delta = _['f_max_uv_acetone'] - _['f_max_vis_gasphase']
-                vis_to_vis = False
-                uv_to_vis = False
-                nir_to_vis = False
-                vis_to_uv = True
-                vis_to_nir = False
-            else:
-                lambda_delta = _['lambda_max_nir_acetone'] - _['lambda_max_vis_gasphase']
-                f_delta = _['f_max_nir_acetone'] - _['f_max_vis_gasphase']
-                vis_to_vis = False
-                uv_to_vis = False
-                nir_to_vis = False
-                vis_to_uv = False
-                vis_to_nir = True
-
-        elif uv_distance is None and nir_distance is None:
-
-            lambda_delta = 0
-            f_delta = 0
-            vis_to_vis = False
-            uv_to_vis = False
-            nir_to_vis = False
-            vis_to_uv = False
-            vis_to_nir = False
-
-        elif uv_distance is not None and nir_distance is None:
-
-            lambda_delta = _['lambda_max_uv_acetone'] - _['lambda_max_vis_gasphase']
-            f_delta = _['f_max_uv_acetone'] - _['f_max_vis_gasphase']
-            vis_to_vis = False
-            uv_to_vis = False
-            nir_to_vis = False
-            vis_to_uv = True
-            vis_to_nir = False
-
-        elif uv_distance is None and nir_distance is not None:
-
-            lambda_delta = _['lambda_max_nir_acetone'] - _['lambda_max_vis_gasphase']
-            f_delta = _['f_max_nir_acetone'] - _['f_max_vis_gasphase']
-            vis_to_vis = False
-            uv_to_vis = False
-            nir_to_vis = False
-            vis_to_uv = False
-            vis_to_nir = True
-
-    else:
-        exit()
-
-    _['lambda_delta'] = lambda_delta
-    _['f_delta'] = f_delta
-    _['vis_to_vis'] = vis_to_vis
-    _['uv_to_vis'] = uv_to_vis
-    _['nir_to_vis'] = nir_to_vis
-    _['vis_to_uv'] = vis_to_uv
-    _['vis_to_nir'] = vis_to_nir
-
-
-    if lambda_delta > 0:
-        _['bathochromic'] = True
-    else:
-        _['bathochromic'] = False
-
-    if lambda_delta < 0:
-        _['hypsochromic'] = True
-    else:
-        _['hypsochromic'] = False
-
-    if f_delta > 0:
-        _['hyperchromic'] = True
-    else:
-        _['hyperchromic'] = False
-
-    if f_delta < 0:
-        _['hypochromic'] = True
-    else:
-        _['hypochromic'] = False
-
-    new_data.append(_)
-
-
-df = pd.DataFrame(new_data)
-df.to_csv('../tmQMg*.csv', index=False)
+    """Loads the rows of a partition file.
 
+    Arguments:
+        file_path (str): The path to the partition file.
+
+    Returns:
+        pandas.DataFrame: The rows or None if the partition is empty.
+    """
+
+    if not os.path.isfile(file_path):
+        return None
+
+    parts = []
+    with open(file_path, 'rb') as fh:
+        while True:
+            try:
+                parts.append(pickle.load(fh))
+            except EOFError:
+                break
+
+    return pd.concat(parts, ignore_index=True)
+
+def stream_merge(base_path: str, acetone_path: str, output_path: str, columns: list[str] = None,
+                 chunk_size: int = 100000, f_threshold: float = f_threshold, temp_dir: str = None):
+
+    """Merges gas phase and acetone results chunk by chunk into a CSV file.
+
+    Only a few chunks are held in memory at any time. Inputs sorted by ID,
+    like the results of analyze.py, are merged in a single pass. If an input
+    turns out not to be sorted, the merge is restarted with both inputs
+    partitioned by ID ranges on disk. The rows of the merged table are in ID
+    order, which equals the order of merge_results() for sorted inputs.
+
+    Arguments:
+        base_path (str): The path to the gas phase results.
+        acetone_path (str): The path to the acetone results.
+        output_path (str): The path to the merged CSV file.
+        columns (list[str]): The columns to read, all columns if None.
+        chunk_size (int): The number of rows read at a time.
+        f_threshold (float): The oscillator strength threshold for a band to count.
+        temp_dir (str): The directory for temporary partition files.
+
+    Returns:
+        int: The number of rows written.
+    """
+
+    try:
+        return _write_chunks(_iter_sorted_merge(
+            iter_result_chunks(base_path, columns, chunk_size),
+            iter_result_chunks(acetone_path, columns, chunk_size),
+            f_threshold
+        ), output_path)
+    except _UnsortedInputError:
+        return _write_chunks(_iter_partitioned_merge(
+            base_path, acetone_path, columns, chunk_size, f_threshold, temp_dir
+        ), output_path)
+
+def _write_chunks(chunks, output_path: str):
+
+    """Writes the chunks of a table to a CSV file.
+
+    Arguments:
+        chunks (Iterable[pandas.DataFrame]): The chunks.
+        output_path (str): The path to the CSV file.
+
+    Returns:
+        int: The number of rows written.
+    """
+
+    n_rows = 0
+    is_first = True
+    for chunk in chunks:
+        chunk.to_csv(output_path, mode='w' if is_first else 'a', header=is_first, index=False)
+        n_rows += len(chunk)
+        is_first = False
+
+    # empty input
+    if is_first:
+        open(output_path, 'w').close()
+
+    return n_rows
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Merges gas phase and acetone results and computes solvatochromism data.')
+    parser.add_argument('gasphase', nargs='?', default='df_gaussian-tddft-svp.csv', help='Gas phase results (.csv, .parquet, .arrow or .feather).')
+    parser.add_argument('acetone', nargs='?', default='df_gaussian-tddft-svp-acetone.csv', help='Acetone results (.csv, .parquet, .arrow or .feather).')
+    parser.add_argument('--columns', nargs='+', default=None, help='Additional result columns to include, all columns if not given.')
+    parser.add_argument('-o', '--output', default='../tmQMg*.csv', help='Output CSV file.')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='Number of rows read at a time.')
+    parser.add_argument('--temp-dir', default=None, help='Directory for temporary files if the inputs are not sorted by id.')
+    parser.add_argument('--in-memory', action='store_true', help='Load both inputs at once and keep the row order of the gas phase results.')
+    parser.add_argument('--solvents', nargs='+', default=None, metavar='NAME=FILE', help='Results of any number of solvents to merge instead of gas phase and acetone.')
+    parser.add_argument('--reference', default=None, help='Solvent the others are compared to with --solvents, all pairs are compared if not given.')
+    args = parser.parse_args()
+
+    columns = None
+    if args.columns is not None:
+        columns = [_ for _ in result_columns if _ in required_columns or _ in args.columns]
+
+    if args.solvents is not None:
+        dfs = {}
+        for solvent in args.solvents:
+            name, file_path = solvent.split('=', 1)
+            dfs[name] = read_results(file_path, columns)
+        merge_solvent_results(dfs, args.reference).to_csv(args.output, index=False)
+        return
+
+    if not args.in_memory:
+        stream_merge(args.gasphase, args.acetone, args.output, columns, args.chunk_size, temp_dir=args.temp_dir)
+        return
+
+    base_df = read_results(args.gasphase, columns)
+    acetone_df = read_results(args.acetone, columns)
+
+    df = merge_results(base_df, acetone_df)
+    df.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
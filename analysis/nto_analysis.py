@@ -0,0 +1,198 @@
+import numpy as np
+
+from nto_data import NtoData, get_top_nto_indices
+from tddft_data_parser import transition_metal_identifiers
+
+
+# angular momentum shell types in order of angular momentum
+shell_types = ['s', 'p', 'd', 'f', 'g']
+
+# shell type position of orbital labels that denote no known shell type
+other_shell = len(shell_types)
+
+# shell type by orbital label, filled by get_orbital_shells()
+_orbital_shells = {}
+
+def get_metal_atom_mask(nto_data: NtoData):
+
+    """Gets the mask of metal atoms.
+
+    Arguments:
+        nto_data (NtoData): The NTO data.
+
+    Returns:
+        numpy.ndarray: The flags indicating whether an atom is a metal.
+    """
+
+    return np.isin(nto_data.element_labels, transition_metal_identifiers)[nto_data.element_codes]
+
+def get_shell_type(orbital_label: str):
+
+    """Gets the shell type of an orbital label as printed by Gaussian.
+
+    Spherical labels start with the shell letter after the principal quantum
+    number (e.g. '1S', '2PX', '4D 0', '5F+1'), Cartesian d, f and g labels
+    consist of two to four coordinates (e.g. '3XX', '4XYZ').
+
+    Arguments:
+        orbital_label (str): The orbital label.
+
+    Returns:
+        int: The position of the shell type in shell_types or other_shell if
+            the label denotes no known shell type.
+    """
+
+    label = orbital_label.lstrip('0123456789').strip().lower()
+
+    if label[:1] in shell_types:
+        return shell_types.index(label[:1])
+    if 1 < len(label) < len(shell_types) and set(label) <= set('xyz'):
+        return len(label)
+
+    return other_shell
+
+def get_orbital_shells(orbital_labels: np.ndarray):
+
+    """Gets the shell types of a table of orbital labels.
+
+    Labels are classified once per process and looked up afterwards, so that
+    the shell type of every basis function is a single take from the label
+    table by orbital code, see NtoData.orbital_codes.
+
+    Arguments:
+        orbital_labels (numpy.ndarray): The unique orbital labels.
+
+    Returns:
+        numpy.ndarray: The position of the shell type of each label in
+            shell_types or other_shell.
+    """
+
+    for orbital_label in orbital_labels:
+        if orbital_label not in _orbital_shells:
+            _orbital_shells[orbital_label] = get_shell_type(orbital_label)
+
+    return np.array([_orbital_shells[_] for _ in orbital_labels], dtype=np.intp)
+
+def get_nto_decompositions(nto_datas: list[NtoData], n: int = 1):
+
+    """Decomposes the NTO character of many NTO blocks at once.
+
+    The squared coefficients of the n NTOs with highest eigenvalues of all
+    blocks are reduced in segmented sums: per atom, per block and metal or
+    ligand group, per block, group and shell type and per block and element.
+    All contributions are relative to the total of the block. The metal and
+    ligand contributions do not depend on the orbital labels, basis functions
+    with labels of unknown shell type are only left out of the shell types.
+
+    Arguments:
+        nto_datas (list[NtoData]): The NTO data of each block.
+        n (int): The number of NTOs with highest eigenvalues to consider.
+
+    Returns:
+        dict: The decomposition with the arrays
+            - metal_ratios, ligand_ratios: The metal and ligand contributions (n_blocks).
+            - metal_shell_ratios, ligand_shell_ratios: The metal and ligand
+              contributions per shell type (n_blocks x n_shell_types).
+            - atom_ratios: The contributions of the atoms of all blocks back
+              to back, the atoms of block i are atom_offsets[i]:atom_offsets[i + 1].
+            - atom_offsets: The start of the atoms of each block followed by
+              the total number of atoms (n_blocks + 1).
+            - is_metal_atom: The flags indicating whether an atom is a metal.
+            - element_labels: The element symbols of all blocks.
+            - element_ratios: The contributions per element (n_blocks x n_elements).
+    """
+
+    n_blocks = len(nto_datas)
+    n_shells = len(shell_types)
+
+    n_atoms = np.array([_.n_atoms for _ in nto_datas], dtype=np.intp)
+    atom_offsets = np.concatenate([[0], np.cumsum(n_atoms)]).astype(np.intp)
+    n_basis = np.array([len(_.basis_atoms) for _ in nto_datas], dtype=np.intp)
+
+    element_labels = np.unique(np.concatenate([np.zeros(0, dtype=str)] + [_.element_labels for _ in nto_datas]))
+    n_elements = len(element_labels)
+
+    if n_blocks == 0:
+        return {
+            'metal_ratios': np.zeros(0),
+            'ligand_ratios': np.zeros(0),
+            'metal_shell_ratios': np.zeros((0, n_shells)),
+            'ligand_shell_ratios': np.zeros((0, n_shells)),
+            'atom_ratios': np.zeros(0),
+            'atom_offsets': atom_offsets,
+            'is_metal_atom': np.zeros(0, dtype=bool),
+            'element_labels': element_labels,
+            'element_ratios': np.zeros((0, n_elements))
+        }
+
+    # global atom index of every basis function and group index of every atom
+    basis_atoms = np.concatenate([_.basis_atoms + offset for _, offset in zip(nto_datas, atom_offsets[:-1])])
+    is_metal_atom = np.concatenate([get_metal_atom_mask(_) for _ in nto_datas])
+    atom_blocks = np.repeat(np.arange(n_blocks), n_atoms)
+    atom_groups = 2 * atom_blocks + (~is_metal_atom).astype(np.intp)
+
+    # group and shell type of every basis function
+    basis_shells = np.concatenate([get_orbital_shells(_.orbital_labels)[_.orbital_codes] for _ in nto_datas])
+    basis_shell_groups = atom_groups[basis_atoms] * (n_shells + 1) + basis_shells
+
+    # block and global element code of every atom
+    atom_elements = np.concatenate([np.searchsorted(element_labels, _.element_labels)[_.element_codes] for _ in nto_datas])
+    atom_element_groups = atom_blocks * n_elements + atom_elements
+
+    top_nto_indices = [get_top_nto_indices(_.eigenvalues, n) for _ in nto_datas]
+
+    atom_occupations = np.zeros(atom_offsets[-1])
+    occupations = np.zeros(2 * n_blocks)
+    shell_occupations = np.zeros(2 * n_blocks * (n_shells + 1))
+    for k in range(n):
+
+        # squared coefficients of the k-th NTO of each block (zero if a block has fewer NTOs)
+        squared_coefficients = []
+        for nto_data, nto_indices, basis_length in zip(nto_datas, top_nto_indices, n_basis):
+            if k < len(nto_indices):
+                squared_coefficients.append(np.square(nto_data.get_coefficients(nto_indices[k:k + 1])[0]))
+            else:
+                squared_coefficients.append(np.zeros(basis_length))
+        squared_coefficients = np.concatenate(squared_coefficients)
+
+        atom_sums = np.bincount(basis_atoms, weights=squared_coefficients, minlength=atom_offsets[-1])
+        occupations += np.bincount(atom_groups, weights=atom_sums, minlength=2 * n_blocks)
+        shell_occupations += np.bincount(basis_shell_groups, weights=squared_coefficients, minlength=2 * n_blocks * (n_shells + 1))
+        atom_occupations += atom_sums
+
+    metal_occupations = occupations[0::2]
+    ligand_occupations = occupations[1::2]
+    total_occupations = metal_occupations + ligand_occupations
+
+    # the other shell is dropped
+    shell_occupations = shell_occupations.reshape(n_blocks, 2, n_shells + 1)[:, :, :n_shells]
+    element_occupations = np.bincount(atom_element_groups, weights=atom_occupations, minlength=n_blocks * n_elements)
+
+    return {
+        'metal_ratios': metal_occupations / total_occupations,
+        'ligand_ratios': ligand_occupations / total_occupations,
+        'metal_shell_ratios': shell_occupations[:, 0] / total_occupations[:, np.newaxis],
+        'ligand_shell_ratios': shell_occupations[:, 1] / total_occupations[:, np.newaxis],
+        'atom_ratios': atom_occupations / total_occupations[atom_blocks],
+        'atom_offsets': atom_offsets,
+        'is_metal_atom': is_metal_atom,
+        'element_labels': element_labels,
+        'element_ratios': element_occupations.reshape(n_blocks, n_elements) / total_occupations[:, np.newaxis]
+    }
+
+def get_metal_ligand_ratios(nto_datas: list[NtoData], n: int = 1):
+
+    """Gets the relative metal and ligand contributions of many NTO blocks at once.
+
+    Arguments:
+        nto_datas (list[NtoData]): The NTO data of each block.
+        n (int): The number of NTOs with highest eigenvalues to consider.
+
+    Returns:
+        numpy.ndarray: The relative metal contributions of each block.
+        numpy.ndarray: The relative ligand contributions of each block.
+    """
+
+    decompositions = get_nto_decompositions(nto_datas, n)
+
+    return decompositions['metal_ratios'], decompositions['ligand_ratios']
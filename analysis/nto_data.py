@@ -0,0 +1,210 @@
+import numpy as np
+
+
+def get_top_nto_indices(eigenvalues, n: int = 1):
+
+    """Gets the positions of the n NTOs with the highest eigenvalues.
+
+    Equal eigenvalues count once and refer to their last occurrence, which is
+    the NTO that was kept in the former dict-based format.
+
+    Arguments:
+        eigenvalues (list[float]|numpy.ndarray): The NTO eigenvalues.
+        n (int): The number of NTOs with highest eigenvalues to consider.
+
+    Returns:
+        numpy.ndarray: The positions of the NTOs, highest eigenvalue first.
+    """
+
+    eigenvalues = np.asarray(eigenvalues)
+    top_eigenvalues = sorted(set(eigenvalues.tolist()), reverse=True)[:n]
+
+    return np.array([np.flatnonzero(eigenvalues == _)[-1] for _ in top_eigenvalues], dtype=np.intp)
+
+
+class NtoData():
+
+    """Array-backed NTO coefficients of one block of NTOs.
+
+    The coefficients are stored as a dense (n_eigenvalues x n_basis_functions)
+    array. Each basis function refers to its atom by position and to its
+    orbital label through an index into a table of unique labels. Element
+    symbols of the atoms are interned the same way.
+
+    Coefficient rows (NTOs) may be loaded lazily. Rows that have not been
+    parsed yet are converted by the loader when they are first accessed
+    through coefficients or get_coefficients().
+
+    For compatibility the object also behaves like the former list of atom
+    dicts of the form {'atom_index': int, 'atom_element': str, 'ntos':
+    {eigenvalue: {orbital_label: coefficient}}}, see to_dicts().
+    """
+
+    def __init__(self, eigenvalues: np.ndarray, coefficients: np.ndarray,
+                 atom_indices: np.ndarray, element_labels: np.ndarray, element_codes: np.ndarray,
+                 basis_atoms: np.ndarray, orbital_labels: np.ndarray, orbital_codes: np.ndarray,
+                 is_loaded: np.ndarray = None, loader=None):
+
+        self.eigenvalues = eigenvalues
+        self._coefficients = coefficients
+        self._is_loaded = is_loaded if is_loaded is not None else np.ones(len(eigenvalues), dtype=bool)
+        self._loader = loader
+        self.atom_indices = atom_indices
+        self.element_labels = element_labels
+        self.element_codes = element_codes
+        self.basis_atoms = basis_atoms
+        self.orbital_labels = orbital_labels
+        self.orbital_codes = orbital_codes
+
+    @classmethod
+    def from_lists(cls, eigenvalues: list[float], atom_indices: list[int], atom_elements: list[str],
+                   basis_atoms: list[int], basis_orbitals: list[str], coefficients: list[str],
+                   columns: list[int] = None, loader=None):
+
+        """Builds the NTO data from the lists collected while parsing.
+
+        Arguments:
+            eigenvalues (list[float]): The NTO eigenvalues.
+            atom_indices (list[int]): The atom indices as given in the output file.
+            atom_elements (list[str]): The element symbols of the atoms.
+            basis_atoms (list[int]): The position of the atom of each basis function.
+            basis_orbitals (list[str]): The orbital label of each basis function.
+            coefficients (list[str]): The coefficients in row-major order
+                (basis functions x columns), as strings or floats.
+            columns (list[int]): The positions of the NTOs the coefficients
+                belong to, all NTOs if None.
+            loader (callable): Function that returns the coefficients of the
+                given NTO positions in the same layout, needed if not all
+                NTOs are given.
+
+        Returns:
+            NtoData: The NTO data.
+        """
+
+        n_eigenvalues = len(eigenvalues)
+        if columns is None:
+            columns = list(range(n_eigenvalues))
+
+        # rows of NTOs that have not been parsed yet stay NaN until loaded
+        loaded_coefficients = np.array(coefficients, dtype=np.float64).reshape(-1, len(columns)).T
+        full_coefficients = np.full((n_eigenvalues, len(basis_atoms)), np.nan)
+        full_coefficients[columns] = loaded_coefficients
+
+        is_loaded = np.zeros(n_eigenvalues, dtype=bool)
+        is_loaded[columns] = True
+
+        element_labels, element_codes = np.unique(np.array(atom_elements, dtype=str), return_inverse=True)
+        orbital_labels, orbital_codes = np.unique(np.array(basis_orbitals, dtype=str), return_inverse=True)
+
+        return cls(
+            eigenvalues=np.array(eigenvalues, dtype=np.float64),
+            coefficients=full_coefficients,
+            atom_indices=np.array(atom_indices, dtype=np.int32),
+            element_labels=element_labels,
+            element_codes=element_codes.astype(np.int16),
+            basis_atoms=np.array(basis_atoms, dtype=np.int32),
+            orbital_labels=orbital_labels,
+            orbital_codes=orbital_codes.astype(np.int16),
+            is_loaded=is_loaded,
+            loader=loader
+        )
+
+    @property
+    def n_atoms(self):
+
+        """int: The number of atoms."""
+
+        return len(self.atom_indices)
+
+    @property
+    def coefficients(self):
+
+        """numpy.ndarray: The coefficients of shape (n_eigenvalues, n_basis_functions)."""
+
+        return self.get_coefficients(np.arange(len(self.eigenvalues)))
+
+    def get_coefficients(self, nto_indices):
+
+        """Gets the coefficients of the given NTOs, parsing them if needed.
+
+        Arguments:
+            nto_indices (numpy.ndarray): The positions of the NTOs.
+
+        Returns:
+            numpy.ndarray: The coefficients of shape (len(nto_indices), n_basis_functions).
+        """
+
+        nto_indices = np.asarray(nto_indices, dtype=np.intp)
+
+        missing = [_ for _ in np.unique(nto_indices).tolist() if not self._is_loaded[_]]
+        if len(missing) > 0:
+            coefficients = np.array(self._loader(missing), dtype=np.float64).reshape(-1, len(missing)).T
+            self._coefficients[missing] = coefficients
+            self._is_loaded[missing] = True
+
+        return self._coefficients[nto_indices]
+
+    @property
+    def atom_elements(self):
+
+        """numpy.ndarray: The element symbol of each atom."""
+
+        return self.element_labels[self.element_codes]
+
+    @property
+    def basis_orbitals(self):
+
+        """numpy.ndarray: The orbital label of each basis function."""
+
+        return self.orbital_labels[self.orbital_codes]
+
+    def __len__(self):
+
+        return self.n_atoms
+
+    def __iter__(self):
+
+        for i in range(self.n_atoms):
+            yield self[i]
+
+    def __getitem__(self, index: int):
+
+        """Gets the NTO data of a single atom in the former dict format.
+
+        Arguments:
+            index (int): The position of the atom.
+
+        Returns:
+            dict: The NTO data of the atom.
+        """
+
+        if index < 0:
+            index += self.n_atoms
+        if index < 0 or index >= self.n_atoms:
+            raise IndexError('Atom position out of range.')
+
+        basis_functions = np.flatnonzero(self.basis_atoms == index)
+        orbitals = self.orbital_labels[self.orbital_codes[basis_functions]].tolist()
+
+        ntos = {}
+        for j, eigenvalue in enumerate(self.eigenvalues.tolist()):
+            # equal eigenvalues share one dict like in the former format
+            nto = ntos.setdefault(eigenvalue, {})
+            for orbital, coefficient in zip(orbitals, self.coefficients[j, basis_functions].tolist()):
+                nto[orbital] = coefficient
+
+        return {
+            'atom_index': int(self.atom_indices[index]),
+            'atom_element': str(self.element_labels[self.element_codes[index]]),
+            'ntos': ntos
+        }
+
+    def to_dicts(self):
+
+        """Converts the NTO data to the former list of atom dicts.
+
+        Returns:
+            list[dict]: The NTO data of each atom.
+        """
+
+        return list(self)
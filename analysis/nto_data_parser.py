@@ -1,117 +1,280 @@
-import re
+from file_utils import get_file_id, get_source_name, has_normal_termination, open_text
+from nto_data import NtoData, get_top_nto_indices
+from quarantine import MalformedOutputError
+from section_index import open_section_index
 
 
+# number of NTO columns to extract per block
+max_column_index = 5
+
+# anchor of the NTO blocks
+eigenvalue_anchor = 'Eigenvalues --'
+
 class NtoDataParser():
 
     """Parser class for NTO output files."""
 
-    def __init__(self, file_path):
+    def __init__(self, file_path, file_id: str = None, n_top: int = None):
 
-        self._id = file_path.split('/')[-1].split('.')[0]
+        self._file_path = file_path
+        self._n_top = n_top
 
-        with open(file_path, 'r') as fh:
-            self.lines = fh.read().strip().split('\n')
+        if file_id is None:
+            file_id = get_file_id(get_source_name(file_path))
+        self._id = file_id
 
     def parse(self):
 
         """Parses the given NTO output file.
+
+        Only the first occupied and the first virtual NTO block are read.
+        Unlike earlier versions, which kept the last block of each type,
+        files with several occupied or virtual blocks therefore give the NTOs
+        of the first ones. Uncompressed files are not searched any further
+        once both blocks have been found. If the parser was given n_top, only
+        the coefficients of the n_top NTOs with highest eigenvalues of each
+        block are converted right away, all other coefficients are parsed
+        when they are first accessed.
+
+        Uncompressed files given by path are memory-mapped and only the lines
+        of the NTO blocks are decoded. Compressed files and streams are read
+        line by line.
         """
 
         return_dict = {'id': self._id}
 
-        if self._has_failed():
+        # reject failed jobs before reading the whole file
+        terminated_normally = has_normal_termination(self._file_path)
+        if terminated_normally is False:
             return_dict['has_failed'] = True
             return return_dict
+
+        if terminated_normally:
+            with open_section_index(self._file_path, [eigenvalue_anchor]) as index:
+                nto_blocks = self._parse_index(index)
         else:
-            return_dict['has_failed'] = False
+            # streams have to be read to the end to check the termination status
+            with open_text(self._file_path) as fh:
+                nto_blocks, last_line = self._parse_lines(fh)
+
+        if terminated_normally is None and 'Normal termination' not in last_line:
+            return_dict['has_failed'] = True
+            return return_dict
 
-        for i, line in enumerate(self.lines):
+        return_dict['has_failed'] = False
 
-            if 'Eigenvalues --' in line:
-                nto_data, nto_type = self._extract_nto_data(i)
+        if 'O' not in nto_blocks or 'V' not in nto_blocks:
+            raise MalformedOutputError('nto_block_missing', 'Occupied or virtual NTO block not found.')
 
-                if nto_type == 'O':
-                    return_dict['occupied_nto'] = nto_data
-                elif nto_type == 'V':
-                    return_dict['virtual_nto'] = nto_data
+        return_dict['occupied_nto'] = nto_blocks['O']
+        return_dict['virtual_nto'] = nto_blocks['V']
 
         return return_dict
 
-    def _has_failed(self):
+    def _parse_lines(self, lines):
 
-        """Checks if the job has failed.
+        """Extracts the NTO blocks from the output file in a single pass.
+
+        The lines after both NTO blocks are only read to get the last line.
+
+        Arguments:
+            lines (Iterable[str]): The lines of the output file.
 
         Returns:
-            bool: The flag indicating whether the job has failed.
+            dict[str, NtoData]: The NTO data by NTO type, occupied (O) or virtual (V).
+            str: The last non-empty line that has been read.
         """
 
-        if 'Normal termination' not in self.lines[-1]:
-            return True
+        nto_blocks = {}
+        block = None
+        previous_line = ''
+        last_line = ''
+
+        for line in lines:
+
+            if not line.isspace():
+                last_line = line
+
+            if block is not None:
+                if block.add_line(line):
+                    continue
+                nto_blocks[block.nto_type] = block.build()
+                block = None
+
+            if len(nto_blocks) < 2 and eigenvalue_anchor in line:
+                block = _NtoBlockParser(previous_line, line, self._n_top)
+                if block.nto_type in nto_blocks:
+                    block = None
 
-        return False
+            previous_line = line
 
-    def _extract_nto_data(self, start_index):
+        if block is not None:
+            nto_blocks[block.nto_type] = block.build()
 
-        """Extracts the NTO data.
+        return nto_blocks, last_line
+
+    def _parse_index(self, index):
+
+        """Extracts the NTO blocks from the indexed output file.
+
+        Gives the same blocks as _parse_lines() but decodes only the lines of
+        the blocks and the lines denoting their type. The anchors are searched
+        one at a time from the end of the previous block, so that the rest of
+        the file is not searched once both blocks have been found.
 
         Arguments:
-            start_index (int): The line index to start parsing from.
+            index (SectionIndex): The section index of the output file.
 
         Returns:
-            dict: Dictionary of NTO results.
-            str: NTO type, occupied (O) or virtual (V).
+            dict[str, NtoData]: The NTO data by NTO type, occupied (O) or virtual (V).
         """
 
-        # determine number of columns
-        n_columns = len(self.lines[start_index].split()) - 2
+        nto_blocks = {}
+        offset = index.find_line(eigenvalue_anchor)
+
+        while offset is not None and len(nto_blocks) < 2:
+
+            block = _NtoBlockParser(index.get_previous_line(offset), index.get_line(offset), self._n_top)
+
+            lines = index.iter_lines(offset)
+            next(lines)
+            block_end = None
+            if block.nto_type in nto_blocks:
+                # blocks of a type that has been read are skipped
+                block_end = next(lines, (None, None))[0]
+            else:
+                # anchors within a block are part of the block
+                for line_offset, line in lines:
+                    if not block.add_line(line):
+                        block_end = line_offset
+                        break
+                nto_blocks[block.nto_type] = block.build()
+
+            # the block extends to the end of the file
+            if block_end is None:
+                break
+
+            offset = index.find_line(eigenvalue_anchor, block_end)
+
+        return nto_blocks
+
+
+class _NtoBlockParser():
+
+    """Parser for a single block of NTO coefficients."""
 
-        # set the index of the column to extract
-        max_column_index = 5
+    def __init__(self, type_line: str, eigenvalue_line: str, n_top: int = None):
+
+        # determine number of columns
+        self._n_columns = len(eigenvalue_line.split()) - 2
 
         # determine type
-        if 'O' in self.lines[start_index - 1]:
-            nto_type = 'O'
-        elif 'V' in self.lines[start_index - 1]:
-            nto_type = 'V'
+        if 'O' in type_line:
+            self.nto_type = 'O'
+        elif 'V' in type_line:
+            self.nto_type = 'V'
         else:
-            print('NTO type not recognized.')
-            exit()
+            raise MalformedOutputError('nto_type_unknown', 'NTO type not recognized: ' + type_line.strip())
 
         # determine eigenvalues
-        eigenvalues = [float(_) for _ in self.lines[start_index].split()[2:]]
+        self._eigenvalues = [float(_) for _ in eigenvalue_line.split()[2:]][:max_column_index]
 
-        # data variable
-        nto_data = []
-        # start parsing from next line
-        i = start_index + 1
-        while len(self.lines[i].split()) > n_columns:
+        # determine the columns to convert right away
+        if n_top is None:
+            self._columns = list(range(len(self._eigenvalues)))
+        else:
+            self._columns = get_top_nto_indices(self._eigenvalues, n_top).tolist()
 
+        # per atom and per basis function data
+        self._atom_indices = []
+        self._atom_elements = []
+        self._basis_atoms = []
+        self._basis_orbitals = []
+        self._coefficients = []
 
-            line_split = self.lines[i].split()
+        # raw lines kept to parse the remaining columns on demand
+        self._lines = []
 
-            if len(line_split) == 4 + n_columns:
+    def add_line(self, line: str):
 
-                atom_index = int(line_split[1])
-                atom_element = line_split[2]
+        """Parses a line of the block.
 
-                ntos = {eigenvalues[j]: {line_split[3]: float(line_split[4 + j])} for j in range(max_column_index)}
+        Arguments:
+            line (str): The line.
 
-                nto_data.append({
-                    'atom_index': atom_index,
-                    'atom_element': atom_element,
-                    'ntos': ntos
-                })
+        Returns:
+            bool: False if the line does not belong to the block anymore.
+        """
 
-            else:
+        line_split = line.rsplit(None, self._n_columns)
+        if len(line_split) <= self._n_columns:
+            return False
+
+        prefix = line_split[0].split()
+        if len(prefix) == 4:
+            self._atom_indices.append(int(prefix[1]))
+            self._atom_elements.append(prefix[2])
+            orbital_id = prefix[3]
+        else:
+            # orbital labels may contain a space (e.g. '4D 0')
+            orbital_id = line_split[0].split(None, 1)[1]
+
+        self._basis_atoms.append(len(self._atom_indices) - 1)
+        self._basis_orbitals.append(orbital_id)
+        self._coefficients.extend([line_split[1 + _] for _ in self._columns])
+
+        if len(self._columns) < len(self._eigenvalues):
+            self._lines.append(line)
+
+        return True
+
+    def build(self):
+
+        """Builds the NTO data of the block.
 
-                line_split = re.split(r'\s{5,}', self.lines[i].strip())
-                orbital_id = line_split[1]
-                line_split = line_split[2].split()
+        Returns:
+            NtoData: The NTO data.
+        """
+
+        loader = None
+        if len(self._columns) < len(self._eigenvalues):
+            loader = _CoefficientLoader(self._lines, self._n_columns)
+
+        return NtoData.from_lists(
+            self._eigenvalues,
+            self._atom_indices,
+            self._atom_elements,
+            self._basis_atoms,
+            self._basis_orbitals,
+            self._coefficients,
+            columns=self._columns,
+            loader=loader
+        )
+
+
+class _CoefficientLoader():
+
+    """Parses NTO coefficient columns from the raw lines of a block on demand."""
 
-                for j in range(max_column_index):
-                    nto_data[-1]['ntos'][eigenvalues[j]][orbital_id] = float(line_split[j])
+    def __init__(self, lines: list[str], n_columns: int):
 
+        self._lines = lines
+        self._n_columns = n_columns
+
+    def __call__(self, columns: list[int]):
+
+        """Parses the given coefficient columns.
+
+        Arguments:
+            columns (list[int]): The column indices.
+
+        Returns:
+            list[str]: The coefficients in row-major order (basis functions x columns).
+        """
 
-            i += 1
+        coefficients = []
+        for line in self._lines:
+            line_split = line.rsplit(None, self._n_columns)
+            coefficients.extend([line_split[1 + _] for _ in columns])
 
-        return nto_data, nto_type
+        return coefficients
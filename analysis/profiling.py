@@ -0,0 +1,221 @@
+import contextlib
+import csv
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+
+# histogram bin edges of the stage latencies in seconds
+latency_bin_edges = np.logspace(-6, 3, 19)
+
+class Profiler():
+
+    """Records wall time, bytes and allocations per stage and file.
+
+    The records of profilers in worker processes can be collected with
+    get_records() and added to the main profiler with add_records().
+    """
+
+    enabled = True
+
+    def __init__(self, trace_allocations: bool = False):
+
+        self.trace_allocations = trace_allocations
+        self._records = []
+        self._failures = []
+
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name: str, file_path: str = None, n_bytes: int = None):
+
+        """Measures a stage of the processing of a file.
+
+        Arguments:
+            name (str): The name of the stage.
+            file_path (str): The file the stage belongs to.
+            n_bytes (int): The size of the file on disk, see get_source_size().
+        """
+
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            allocated_before = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+
+            allocated = None
+            if self.trace_allocations:
+                allocated = tracemalloc.get_traced_memory()[1] - allocated_before
+
+            self._records.append({
+                'file': file_path,
+                'stage': name,
+                'seconds': seconds,
+                'bytes': n_bytes,
+                'allocated_bytes': allocated
+            })
+
+    def record_failure(self, file_path: str, reason: str):
+
+        """Records that a file has been excluded.
+
+        Arguments:
+            file_path (str): The file.
+            reason (str): The reason of the exclusion.
+        """
+
+        self._failures.append({'file': file_path, 'reason': reason})
+
+    def get_records(self):
+
+        """Gets all records.
+
+        Returns:
+            dict: The stage records and failures.
+        """
+
+        return {'stages': self._records, 'failures': self._failures}
+
+    def add_records(self, records: dict):
+
+        """Adds records, e.g. of a profiler in a worker process.
+
+        Arguments:
+            records (dict): The stage records and failures.
+        """
+
+        self._records.extend(records['stages'])
+        self._failures.extend(records['failures'])
+
+    def get_report(self, top_n: int = 20):
+
+        """Summarizes the records.
+
+        Arguments:
+            top_n (int): The number of slowest files to report.
+
+        Returns:
+            dict: The report with per-stage statistics and latency histograms,
+                the slowest files and the failure counts by reason.
+        """
+
+        stages = {}
+        for name in sorted(set(_['stage'] for _ in self._records)):
+
+            records = [_ for _ in self._records if _['stage'] == name]
+            seconds = np.array([_['seconds'] for _ in records])
+            n_bytes = sum(_['bytes'] for _ in records if _['bytes'] is not None)
+            allocated = [_['allocated_bytes'] for _ in records if _['allocated_bytes'] is not None]
+
+            stages[name] = {
+                'count': len(records),
+                'total_seconds': float(seconds.sum()),
+                'mean_seconds': float(seconds.mean()),
+                'p50_seconds': float(np.percentile(seconds, 50)),
+                'p90_seconds': float(np.percentile(seconds, 90)),
+                'p99_seconds': float(np.percentile(seconds, 99)),
+                'max_seconds': float(seconds.max()),
+                'total_bytes': n_bytes,
+                'mb_per_second': n_bytes / 1024 ** 2 / seconds.sum() if seconds.sum() > 0 else None,
+                'max_allocated_bytes': max(allocated) if len(allocated) > 0 else None,
+                'histogram': {
+                    'bin_edges_seconds': latency_bin_edges.tolist(),
+                    'counts': np.histogram(np.clip(seconds, latency_bin_edges[0], latency_bin_edges[-1]), latency_bin_edges)[0].tolist()
+                }
+            }
+
+        # total time per file over all stages
+        files = {}
+        for record in self._records:
+            if record['file'] is None:
+                continue
+            file_stages = files.setdefault(record['file'], {})
+            file_stages[record['stage']] = file_stages.get(record['stage'], 0) + record['seconds']
+
+        slowest_files = sorted(files.items(), key=lambda _: sum(_[1].values()), reverse=True)[:top_n]
+
+        failures = {}
+        for failure in self._failures:
+            failures[failure['reason']] = failures.get(failure['reason'], 0) + 1
+
+        return {
+            'n_files': len(files),
+            'stages': stages,
+            'slowest_files': [{'file': _, 'seconds': sum(stage_seconds.values()), 'stages': stage_seconds} for _, stage_seconds in slowest_files],
+            'failures': failures
+        }
+
+    def write_report(self, file_path: str, top_n: int = 20):
+
+        """Writes the report as JSON or all records as CSV, based on the file extension.
+
+        Arguments:
+            file_path (str): The output file (.json or .csv).
+            top_n (int): The number of slowest files to report.
+        """
+
+        if os.path.splitext(file_path)[1] == '.csv':
+            with open(file_path, 'w', newline='') as fh:
+                writer = csv.DictWriter(fh, fieldnames=['file', 'stage', 'seconds', 'bytes', 'allocated_bytes', 'reason'])
+                writer.writeheader()
+                writer.writerows(self._records)
+                writer.writerows([{'file': _['file'], 'stage': 'failure', 'reason': _['reason']} for _ in self._failures])
+        else:
+            with open(file_path, 'w') as fh:
+                json.dump(self.get_report(top_n), fh, indent=4)
+
+
+class NullProfiler():
+
+    """Profiler that records nothing, used when profiling is off."""
+
+    enabled = False
+    trace_allocations = False
+
+    _null_context = contextlib.nullcontext()
+
+    def stage(self, name: str, file_path: str = None, n_bytes: int = None):
+
+        return self._null_context
+
+    def record_failure(self, file_path: str, reason: str):
+
+        pass
+
+    def get_records(self):
+
+        return None
+
+    def add_records(self, records: dict):
+
+        pass
+
+
+null_profiler = NullProfiler()
+
+def get_source_size(source):
+
+    """Gets the size of a file given by path.
+
+    This is the size on disk, for compressed files the compressed size and not
+    the number of bytes parsed.
+
+    Arguments:
+        source (str|file): The file path or file-like object.
+
+    Returns:
+        int: The size in bytes or None for file-like objects and missing files.
+    """
+
+    if isinstance(source, (str, os.PathLike)) and os.path.isfile(source):
+        return os.path.getsize(source)
+
+    return None
@@ -0,0 +1,107 @@
+import contextlib
+import csv
+import lzma
+import zlib
+
+
+class MalformedOutputError(ValueError):
+
+    """Raised by the parsers when an output file does not have the expected content."""
+
+    def __init__(self, reason: str, message: str):
+
+        super().__init__(reason, message)
+
+        self.reason = reason
+        self.message = message
+
+    def __str__(self):
+
+        return self.message
+
+
+class QuarantineError(Exception):
+
+    """Raised when a stage fails for a single output file, which is then quarantined."""
+
+    def __init__(self, file_path: str, stage: str, reason: str, message: str):
+
+        super().__init__(file_path, stage, reason, message)
+
+        self.file_path = file_path
+        self.stage = stage
+        self.reason = reason
+        self.message = message
+
+    def __str__(self):
+
+        return str(self.file_path) + ' (' + self.stage + ', ' + self.reason + '): ' + self.message
+
+    def get_entry(self):
+
+        """Gets the entry of the quarantine report.
+
+        Returns:
+            tuple: The path, stage, reason and message.
+        """
+
+        return (str(self.file_path), self.stage, self.reason, self.message)
+
+
+def get_failure_reason(exception: Exception):
+
+    """Classifies the exception raised while processing an output file.
+
+    Arguments:
+        exception (Exception): The exception.
+
+    Returns:
+        str: The reason, e.g. 'unreadable' for I/O and decompression errors
+            or 'malformed' for values that cannot be parsed.
+    """
+
+    if isinstance(exception, MalformedOutputError):
+        return exception.reason
+    if isinstance(exception, UnicodeDecodeError):
+        return 'undecodable'
+    if isinstance(exception, (OSError, EOFError, lzma.LZMAError, zlib.error)):
+        return 'unreadable'
+    if isinstance(exception, (ValueError, IndexError, KeyError, TypeError)):
+        return 'malformed'
+
+    return 'unexpected_error'
+
+@contextlib.contextmanager
+def isolate_stage(stage: str, file_path):
+
+    """Turns any exception raised in a stage into a QuarantineError of the file.
+
+    Arguments:
+        stage (str): The name of the stage, e.g. 'tddft_parse'.
+        file_path (str): The file the stage belongs to.
+    """
+
+    try:
+        yield
+    except QuarantineError:
+        raise
+    except Exception as e:
+        raise QuarantineError(file_path, stage, get_failure_reason(e), type(e).__name__ + ': ' + str(e)) from e
+
+def write_quarantine_report(entries: list[tuple], file_path: str, append: bool = False):
+
+    """Writes the quarantined files to a CSV file.
+
+    Arguments:
+        entries (list[tuple]): The paths, stages, reasons and messages, see
+            QuarantineError.get_entry().
+        file_path (str): The path to the CSV file.
+        append (bool): Flag to denote whether the entries are appended to an
+            existing report.
+    """
+
+    with open(file_path, 'a' if append else 'w', newline='') as fh:
+        writer = csv.writer(fh)
+        if fh.tell() == 0:
+            writer.writerow(['path', 'stage', 'reason', 'message'])
+        writer.writerows(entries if append else sorted(entries))
@@ -0,0 +1,343 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataset import _map_npy, _matches_column, _parse_filter, _read_cache_meta, filter_operators, get_filter_mask, load_dataset, read_cache, write_cache
+
+
+# numeric columns with range index, possibly suffixed by the solvent (pair)
+range_index_columns = ['lambda_max', 'f_max', 'lambda_delta', 'f_delta']
+
+range_operators = ['==', '<', '<=', '>', '>=']
+bitmap_operators = ['==', '!=', 'in', 'not in']
+
+def _get_index_path(store_path: str):
+
+    return os.path.join(store_path, 'index.json')
+
+def build_store(file_path: str, store_path: str, float_dtype: str = 'float32'):
+
+    """Builds an indexed store from a result or merged (tmQMg*) table.
+
+    The columns are stored as memory-mapped NumPy files as in
+    dataset.write_cache(). In addition the store holds:
+        - an index on id: the sorted IDs and their row positions.
+        - range indexes on the band columns (lambda_max_*, f_max_*,
+          lambda_delta, f_delta): the sorted values and their row positions,
+          missing values last.
+        - bitmap indexes on the categorical and boolean columns: one packed
+          bitmap of the matching rows per value.
+
+    Arguments:
+        file_path (str): The path to the table (.csv, .parquet, .arrow or .feather).
+        store_path (str): The path to the store directory.
+        float_dtype (str): The dtype of the numeric columns.
+
+    Returns:
+        int: The number of rows.
+    """
+
+    df = load_dataset(file_path, float_dtype=float_dtype)
+    n_rows = len(df)
+
+    temp_path = store_path + '.tmp-' + str(os.getpid())
+    write_cache(df, temp_path)
+
+    index = {'n_rows': n_rows, 'range': {}, 'bitmap': {}}
+
+    ids = df['id'].astype(str).to_numpy(dtype=str)
+    order = np.argsort(ids, kind='stable')
+    np.save(os.path.join(temp_path, 'id_values.npy'), ids[order])
+    np.save(os.path.join(temp_path, 'id_rows.npy'), order)
+
+    for i, column in enumerate(df.columns):
+
+        values = df[column]
+        if column == 'id':
+            continue
+
+        if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == 'boolean':
+            index_values = values.cat.categories.tolist() if isinstance(values.dtype, pd.CategoricalDtype) else [False, True]
+            bitmaps = np.empty((len(index_values), (n_rows + 7) // 8), dtype=np.uint8)
+            for j, value in enumerate(index_values):
+                bitmaps[j] = np.packbits((values == value).to_numpy(dtype=bool, na_value=False))
+            np.save(os.path.join(temp_path, 'bitmap_%d.npy' % i), bitmaps)
+            index['bitmap'][column] = {'file': i, 'values': index_values}
+
+        elif _matches_column(column, range_index_columns):
+            column_values = values.to_numpy()
+            order = np.argsort(column_values, kind='stable')
+            np.save(os.path.join(temp_path, 'range_%d_values.npy' % i), column_values[order])
+            np.save(os.path.join(temp_path, 'range_%d_rows.npy' % i), order)
+            index['range'][column] = i
+
+    with open(_get_index_path(temp_path), 'w') as fh:
+        json.dump(index, fh)
+
+    if os.path.isdir(store_path):
+        shutil.rmtree(store_path)
+    os.replace(temp_path, store_path)
+
+    return n_rows
+
+
+class QueryStore():
+
+    """Read access to an indexed store built by build_store().
+
+    The index files are memory-mapped when first used and kept open, so that
+    repeated queries only touch the pages of the index entries and rows they
+    need. Queries accept the filters of dataset.get_filter_mask() with the
+    same semantics; filters that no index can answer are evaluated on the
+    rows selected by the indexed filters only.
+    """
+
+    def __init__(self, store_path: str):
+
+        self._store_path = store_path
+        self._meta = _read_cache_meta(store_path)
+        with open(_get_index_path(store_path), 'r') as fh:
+            self._index = json.load(fh)
+
+        self._n_rows = self._index['n_rows']
+        # mapped files and categorical dtypes shared by all reads
+        self._cache = {}
+
+        self.columns = [_['name'] for _ in self._meta['columns']]
+
+    def __len__(self):
+
+        return self._n_rows
+
+    def _load(self, file_name: str):
+
+        """Memory-maps an index file once.
+
+        Arguments:
+            file_name (str): The name of the file in the store.
+
+        Returns:
+            numpy.ndarray: The array.
+        """
+
+        return _map_npy(os.path.join(self._store_path, file_name), self._cache.setdefault('arrays', {}))
+
+    def get_rows(self, rows: np.ndarray, columns: list[str] = None):
+
+        """Reads rows by position.
+
+        Arguments:
+            rows (numpy.ndarray): The row positions.
+            columns (list[str]): The columns to read, all columns if None.
+
+        Returns:
+            pandas.DataFrame: The rows.
+        """
+
+        return read_cache(self._store_path, columns, self._meta, rows, self._cache)
+
+    def lookup(self, ids: list[str], columns: list[str] = None):
+
+        """Looks up TMCs by ID.
+
+        Arguments:
+            ids (list[str]): The IDs.
+            columns (list[str]): The columns to read, all columns if None.
+
+        Returns:
+            pandas.DataFrame: The rows of the IDs found, in the order of the IDs.
+        """
+
+        ids = np.asarray(ids, dtype=str)
+        id_values = self._load('id_values.npy')
+
+        if len(id_values) == 0:
+            return self.get_rows(np.zeros(0, dtype=np.int64), columns)
+
+        positions = np.minimum(np.searchsorted(id_values, ids), len(id_values) - 1)
+        is_found = id_values[positions] == ids
+
+        return self.get_rows(self._load('id_rows.npy')[positions[is_found]], columns)
+
+    def _get_range_rows(self, column: str, operator_name: str, value: float):
+
+        """Gets the rows matching a comparison from a range index.
+
+        Arguments:
+            column (str): The column with range index.
+            operator_name (str): The operator (==, <, <=, > or >=).
+            value (float): The value compared to.
+
+        Returns:
+            numpy.ndarray: The row positions in index order.
+        """
+
+        i = self._index['range'][column]
+        values = self._load('range_%d_values.npy' % i)
+        rows = self._load('range_%d_rows.npy' % i)
+
+        # compare in the dtype of the column as dataset.get_filter_mask() does
+        value = values.dtype.type(value)
+        if np.isnan(value):
+            return rows[:0]
+
+        # missing values are sorted last and never match
+        n_values = np.searchsorted(values, values.dtype.type(np.nan), side='left')
+        lower = np.searchsorted(values, value, side='left')
+        upper = np.searchsorted(values, value, side='right')
+
+        bounds = {
+            '==': (lower, upper),
+            '<': (0, lower),
+            '<=': (0, upper),
+            '>': (upper, n_values),
+            '>=': (lower, n_values)
+        }
+        start, end = bounds[operator_name]
+
+        return rows[start:end]
+
+    def _get_bitmap_mask(self, column: str, operator_name: str, value):
+
+        """Gets the rows matching a comparison from a bitmap index.
+
+        Arguments:
+            column (str): The column with bitmap index.
+            operator_name (str): The operator (==, !=, in or not in).
+            value: The value or, for in and not in, the values compared to.
+
+        Returns:
+            numpy.ndarray: The mask of the matching rows.
+        """
+
+        bitmap_index = self._index['bitmap'][column]
+        bitmaps = self._load('bitmap_%d.npy' % bitmap_index['file'])
+
+        # evaluate the filter on the indexed values in the dtype of the column
+        index_values = bitmap_index['values']
+        if all(isinstance(_, bool) for _ in index_values):
+            index_values = pd.Series(index_values, dtype='boolean')
+        else:
+            index_values = pd.Series(pd.Categorical(index_values, categories=index_values))
+        indices = np.flatnonzero(filter_operators[operator_name](index_values, value).to_numpy(dtype=bool, na_value=False))
+
+        if len(indices) == 0:
+            return np.zeros(self._n_rows, dtype=bool)
+
+        bitmap = np.bitwise_or.reduce(bitmaps[indices], axis=0)
+
+        return np.unpackbits(bitmap, count=self._n_rows).astype(bool)
+
+    def get_query_rows(self, filters: list[tuple]):
+
+        """Gets the positions of the rows passing all filters.
+
+        Arguments:
+            filters (list[tuple]): The filters (column, operator, value), see
+                dataset.get_filter_mask().
+
+        Returns:
+            numpy.ndarray: The row positions in ascending order.
+        """
+
+        mask = None
+        unindexed_filters = []
+
+        for column, operator_name, value in filters:
+
+            if operator_name not in filter_operators:
+                raise ValueError('Unknown filter operator: ' + operator_name)
+
+            if column in self._index['range'] and operator_name in range_operators:
+                column_mask = np.zeros(self._n_rows, dtype=bool)
+                column_mask[self._get_range_rows(column, operator_name, value)] = True
+            elif column in self._index['bitmap'] and operator_name in bitmap_operators:
+                column_mask = self._get_bitmap_mask(column, operator_name, value)
+            else:
+                unindexed_filters.append((column, operator_name, value))
+                continue
+
+            mask = column_mask if mask is None else mask & column_mask
+
+        rows = np.arange(self._n_rows) if mask is None else np.flatnonzero(mask)
+
+        if len(unindexed_filters) > 0 and len(rows) > 0:
+            filter_columns = list(dict.fromkeys(_[0] for _ in unindexed_filters))
+            rows = rows[get_filter_mask(self.get_rows(rows, filter_columns), unindexed_filters)]
+
+        return rows
+
+    def query(self, filters: list[tuple], columns: list[str] = None, limit: int = None):
+
+        """Gets the rows passing all filters.
+
+        Arguments:
+            filters (list[tuple]): The filters (column, operator, value), e.g.
+                [('lambda_max_vis_acetone', '>=', 450), ('lambda_max_vis_acetone', '<=', 500),
+                ('transition_nature_vis_acetone', '==', 'MLCT')].
+            columns (list[str]): The columns to read, all columns if None.
+            limit (int): The maximum number of rows, all rows if None.
+
+        Returns:
+            pandas.DataFrame: The rows in table order.
+        """
+
+        rows = self.get_query_rows(filters)
+        if limit is not None:
+            rows = rows[:limit]
+
+        return self.get_rows(rows, columns)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Builds and queries an indexed store of a result or merged table.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Builds the store from a result or merged table.')
+    build_parser.add_argument('dataset', help='Result or merged table (.csv, .parquet, .arrow or .feather).')
+    build_parser.add_argument('store', help='Store directory.')
+    build_parser.add_argument('--float-dtype', default='float32', choices=['float32', 'float64'], help='Dtype of the numeric columns.')
+
+    query_parser = subparsers.add_parser('query', help='Queries the store.')
+    query_parser.add_argument('store', help='Store directory.')
+    query_parser.add_argument('--filter', action='append', default=[], type=_parse_filter, help="Row filter such as 'lambda_max_vis_acetone >= 450', can be given several times.")
+    query_parser.add_argument('--ids', nargs='+', default=None, help='IDs to look up instead of filtering.')
+    query_parser.add_argument('--ids-file', default=None, help='File with one ID per line to look up instead of filtering.')
+    query_parser.add_argument('--columns', nargs='+', default=None, help='Columns to read, all columns if not given.')
+    query_parser.add_argument('--limit', type=int, default=None, help='Maximum number of rows.')
+    query_parser.add_argument('-o', '--output', default=None, help='Output CSV file for the rows, printed if not given.')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        n_rows = build_store(args.dataset, args.store, args.float_dtype)
+        print(str(n_rows) + ' rows indexed in ' + args.store + '.')
+        return
+
+    store = QueryStore(args.store)
+
+    start_time = time.perf_counter()
+    if args.ids is not None or args.ids_file is not None:
+        ids = [] if args.ids is None else list(args.ids)
+        if args.ids_file is not None:
+            with open(args.ids_file, 'r') as fh:
+                ids.extend(_.strip() for _ in fh if _.strip() != '')
+        df = store.lookup(ids, args.columns)
+    else:
+        df = store.query(args.filter, args.columns, args.limit)
+    duration = time.perf_counter() - start_time
+
+    if args.output is None:
+        print(df.to_string(index=False))
+    else:
+        df.to_csv(args.output, index=False)
+    print(str(len(df)) + ' rows in ' + '%.1f ms' % (duration * 1000))
+
+if __name__ == '__main__':
+    main()
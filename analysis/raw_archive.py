@@ -0,0 +1,725 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from band_analysis import get_region_band_metrics
+from discovery import iter_file_pairs
+from file_utils import get_file_id
+from nto_analysis import get_nto_decompositions, shell_types
+from nto_data import NtoData
+from nto_data_parser import NtoDataParser, max_column_index
+from quarantine import QuarantineError, isolate_stage, write_quarantine_report
+from tddft_data_parser import TddftDataParser
+
+
+archive_format_version = 1
+
+# groups of ragged arrays with their fields, dtypes and trailing shapes,
+# all fields of a group share the offsets of the group
+archive_groups = {
+    'excited_states': {
+        'energy': ('float64', ()),
+        'wavelength': ('float64', ()),
+        'oscillator_strength': ('float64', ())
+    },
+    'occupied_eigenvalues': {'value': ('float64', ())},
+    'virtual_eigenvalues': {'value': ('float64', ())},
+    'mulliken_charges': {
+        'atom_index': ('int32', ()),
+        'element': ('S2', ()),
+        'charge': ('float64', ())
+    }
+}
+for _prefix in ['occupied_nto', 'virtual_nto']:
+    archive_groups[_prefix + '_eigenvalues'] = {'value': ('float64', ())}
+    archive_groups[_prefix + '_atoms'] = {
+        'atom_index': ('int32', ()),
+        'element': ('S2', ())
+    }
+    # coefficients of all NTOs of the block per basis function, NaN padded
+    archive_groups[_prefix + '_basis'] = {
+        'atom': ('int32', ()),
+        'orbital': ('S8', ()),
+        'coefficients': ('float64', (max_column_index,))
+    }
+
+def _get_meta_path(archive_path: str):
+
+    return os.path.join(archive_path, 'archive.json')
+
+def _get_offsets_file_name(group: str):
+
+    return group + '.offsets.bin'
+
+def _get_values_file_name(group: str, field: str):
+
+    return group + '.' + field + '.bin'
+
+def get_raw_arrays(tddft_raw_dict: dict, nto_result_dict: dict = None):
+
+    """Arranges the raw quantities of a TMC into the fields of the archive groups.
+
+    Arguments:
+        tddft_raw_dict (dict): The result of TddftDataParser.parse_raw().
+        nto_result_dict (dict): The result of NtoDataParser.parse() with all
+            coefficients, the NTO groups are left empty if None or failed.
+
+    Returns:
+        dict[str, dict[str, numpy.ndarray]]: The arrays by group and field.
+    """
+
+    raw_arrays = {
+        'excited_states': {
+            'energy': tddft_raw_dict['excitation_energies'],
+            'wavelength': tddft_raw_dict['wavelengths'],
+            'oscillator_strength': tddft_raw_dict['oscillator_strengths']
+        },
+        'occupied_eigenvalues': {'value': tddft_raw_dict['occupied_eigenvalues']},
+        'virtual_eigenvalues': {'value': tddft_raw_dict['virtual_eigenvalues']},
+        'mulliken_charges': {
+            'atom_index': tddft_raw_dict['mulliken_atom_indices'],
+            'element': tddft_raw_dict['mulliken_elements'],
+            'charge': tddft_raw_dict['mulliken_charges']
+        }
+    }
+
+    has_nto_data = nto_result_dict is not None and not nto_result_dict['has_failed']
+
+    for prefix in ['occupied_nto', 'virtual_nto']:
+
+        if not has_nto_data:
+            continue
+
+        nto_data = nto_result_dict[prefix]
+        coefficients = np.full((len(nto_data.basis_atoms), max_column_index), np.nan)
+        coefficients[:, :len(nto_data.eigenvalues)] = nto_data.coefficients.T
+
+        raw_arrays[prefix + '_eigenvalues'] = {'value': nto_data.eigenvalues}
+        raw_arrays[prefix + '_atoms'] = {
+            'atom_index': nto_data.atom_indices,
+            'element': nto_data.atom_elements
+        }
+        raw_arrays[prefix + '_basis'] = {
+            'atom': nto_data.basis_atoms,
+            'orbital': nto_data.basis_orbitals,
+            'coefficients': coefficients
+        }
+
+    return raw_arrays
+
+def extract_raw_arrays(tddft_file_path: str, nto_file_path: str):
+
+    """Parses the raw quantities of a TMC.
+
+    Arguments:
+        tddft_file_path (str): The path to the TD-DFT output file.
+        nto_file_path (str): The path to the NTO output file or None.
+
+    Returns:
+        dict[str, dict[str, numpy.ndarray]]: The arrays by group and field,
+            None if the TD-DFT job failed.
+
+    Raises:
+        QuarantineError: If a file cannot be parsed.
+    """
+
+    with isolate_stage('tddft_parse', tddft_file_path):
+        tddft_raw_dict = TddftDataParser(tddft_file_path).parse_raw()
+
+    if tddft_raw_dict['has_failed']:
+        return None
+
+    nto_result_dict = None
+    if nto_file_path is not None:
+        with isolate_stage('nto_parse', nto_file_path):
+            nto_result_dict = NtoDataParser(nto_file_path).parse()
+
+    return get_raw_arrays(tddft_raw_dict, nto_result_dict)
+
+def _extract_raw_arrays_task(file_pair: tuple):
+
+    """Extracts the raw quantities of a TMC in a worker process.
+
+    Arguments:
+        file_pair (tuple): The TD-DFT and NTO file paths.
+
+    Returns:
+        str: The ID of the TMC.
+        dict: The arrays by group and field or None if failed or quarantined.
+        tuple: The quarantine entry or None.
+    """
+
+    tddft_file_path, nto_file_path = file_pair
+    complex_id = get_file_id(tddft_file_path)
+
+    try:
+        return complex_id, extract_raw_arrays(tddft_file_path, nto_file_path), None
+    except QuarantineError as e:
+        return complex_id, None, e.get_entry()
+
+
+class RawArchiveWriter():
+
+    """Writes the raw quantities of many TMCs as ragged arrays.
+
+    Each field of a group is one flat binary file holding the values of all
+    TMCs back to back, the group offsets file holds the start of each TMC
+    and the total length, so that the values of TMC i are
+    values[offsets[i]:offsets[i + 1]]. The arrays are buffered and appended
+    in bulk every batch_size TMCs. The archive is written to a temporary
+    directory that replaces the target on close, the metadata is written
+    last.
+    """
+
+    def __init__(self, archive_path: str, batch_size: int = 1000):
+
+        self._archive_path = archive_path
+        self._temp_path = archive_path + '.tmp-' + str(os.getpid())
+        self._batch_size = batch_size
+
+        os.makedirs(self._temp_path)
+
+        self._ids = []
+        self._n_rows = {_: 0 for _ in archive_groups}
+        self._buffers = {group: {field: [] for field in fields} for group, fields in archive_groups.items()}
+        self._offsets = {_: [] for _ in archive_groups}
+        self._n_buffered = 0
+
+        self._files = {}
+        for group, fields in archive_groups.items():
+            self._files[(group, None)] = open(os.path.join(self._temp_path, _get_offsets_file_name(group)), 'wb')
+            self._offsets[group].append(0)
+            for field in fields:
+                self._files[(group, field)] = open(os.path.join(self._temp_path, _get_values_file_name(group, field)), 'wb')
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def add(self, complex_id: str, raw_arrays: dict):
+
+        """Adds the raw quantities of a TMC.
+
+        Arguments:
+            complex_id (str): The ID of the TMC.
+            raw_arrays (dict[str, dict[str, numpy.ndarray]]): The arrays by
+                group and field, see get_raw_arrays(). Missing groups are
+                stored as empty.
+        """
+
+        for group, fields in archive_groups.items():
+
+            group_arrays = raw_arrays.get(group)
+            n_rows = 0
+
+            if group_arrays is not None:
+                lengths = {len(group_arrays[_]) for _ in fields}
+                if len(lengths) != 1:
+                    raise ValueError('Fields of group ' + group + ' of TMC ' + complex_id + ' differ in length.')
+                n_rows = lengths.pop()
+
+                for field, (dtype, _) in fields.items():
+                    values = np.asarray(group_arrays[field])
+                    if values.dtype.kind in 'SU' and np.dtype(dtype).kind == 'S':
+                        if values.size > 0 and np.char.str_len(values).max() > np.dtype(dtype).itemsize:
+                            raise ValueError('Labels of ' + group + '.' + field + ' of TMC ' + complex_id + ' are too long.')
+                        values = np.char.encode(values, 'ascii')
+                    self._buffers[group][field].append(values.astype(dtype, copy=False))
+
+            self._n_rows[group] += n_rows
+            self._offsets[group].append(self._n_rows[group])
+
+        self._ids.append(complex_id)
+        self._n_buffered += 1
+
+        if self._n_buffered >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+
+        """Appends the buffered arrays to the archive files."""
+
+        for group, fields in archive_groups.items():
+
+            np.array(self._offsets[group], dtype=np.int64).tofile(self._files[(group, None)])
+            self._offsets[group] = []
+
+            for field, (dtype, shape) in fields.items():
+                if len(self._buffers[group][field]) > 0:
+                    np.concatenate(self._buffers[group][field]).astype(dtype, copy=False).tofile(self._files[(group, field)])
+                self._buffers[group][field] = []
+
+        self._n_buffered = 0
+
+    def _close_files(self):
+
+        for fh in self._files.values():
+            fh.close()
+        self._files = {}
+
+    def close(self):
+
+        """Writes the remaining arrays and the metadata and moves the archive in place."""
+
+        self.flush()
+        self._close_files()
+
+        np.save(os.path.join(self._temp_path, 'ids.npy'), np.array(self._ids, dtype=str))
+
+        meta = {
+            'version': archive_format_version,
+            'n_complexes': len(self._ids),
+            'groups': {
+                group: {
+                    'n_rows': self._n_rows[group],
+                    'fields': {field: {'dtype': dtype, 'shape': list(shape)} for field, (dtype, shape) in fields.items()}
+                }
+                for group, fields in archive_groups.items()
+            }
+        }
+        with open(_get_meta_path(self._temp_path), 'w') as fh:
+            json.dump(meta, fh)
+
+        if os.path.isdir(self._archive_path):
+            shutil.rmtree(self._archive_path)
+        os.replace(self._temp_path, self._archive_path)
+
+    def discard(self):
+
+        """Removes the unfinished archive."""
+
+        self._close_files()
+        shutil.rmtree(self._temp_path, ignore_errors=True)
+
+
+def build_archive(file_pairs, archive_path: str, n_workers: int = 1, quarantine: list = None, batch_size: int = 1000):
+
+    """Extracts the raw quantities of all TMCs into an archive.
+
+    TMCs with failed TD-DFT jobs are skipped, TMCs without (successful) NTO
+    job have empty NTO groups.
+
+    Arguments:
+        file_pairs (Iterable[tuple]): The TD-DFT and NTO file path pairs.
+        archive_path (str): The path to the archive directory.
+        n_workers (int): The number of worker processes.
+        quarantine (list): List to which the entries of files that could not
+            be parsed are appended, see QuarantineError.get_entry().
+        batch_size (int): The number of TMCs written at once.
+
+    Returns:
+        int: The number of TMCs in the archive.
+    """
+
+    with RawArchiveWriter(archive_path, batch_size) as writer:
+
+        if n_workers > 1:
+            pool = multiprocessing.Pool(n_workers)
+            results = pool.imap(_extract_raw_arrays_task, file_pairs, chunksize=8)
+        else:
+            pool = None
+            results = map(_extract_raw_arrays_task, file_pairs)
+
+        try:
+            n_complexes = 0
+            for complex_id, raw_arrays, quarantine_entry in results:
+                if quarantine_entry is not None:
+                    if quarantine is not None:
+                        quarantine.append(quarantine_entry)
+                    continue
+                if raw_arrays is None:
+                    continue
+                writer.add(complex_id, raw_arrays)
+                n_complexes += 1
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+    return n_complexes
+
+
+class RawArchive():
+
+    """Read access to an archive written by RawArchiveWriter.
+
+    All files are memory-mapped when first used. The per-TMC arrays returned
+    by get() are views into the mapped files, nothing is copied or read
+    before it is used. For computations over the whole dataset the flat
+    values and offsets of a group can be used directly, see
+    get_segment_ids() and get_padded().
+    """
+
+    def __init__(self, archive_path: str):
+
+        self._archive_path = archive_path
+        with open(_get_meta_path(archive_path), 'r') as fh:
+            self._meta = json.load(fh)
+
+        if self._meta['version'] != archive_format_version:
+            raise ValueError('Unsupported archive version: ' + str(self._meta['version']))
+
+        self.ids = np.load(os.path.join(archive_path, 'ids.npy'), mmap_mode='r')
+        self.groups = list(self._meta['groups'])
+
+        self._positions = None
+        self._arrays = {}
+
+    def __len__(self):
+
+        return self._meta['n_complexes']
+
+    def _map(self, file_name: str, dtype: str, shape: tuple):
+
+        """Memory-maps a file of the archive once.
+
+        Arguments:
+            file_name (str): The name of the file in the archive.
+            dtype (str): The dtype of the values.
+            shape (tuple): The shape of the array.
+
+        Returns:
+            numpy.ndarray: The array.
+        """
+
+        if file_name not in self._arrays:
+            if shape[0] == 0:
+                # empty files cannot be mapped
+                array = np.zeros(shape, dtype=dtype)
+            else:
+                array = np.memmap(os.path.join(self._archive_path, file_name), dtype=dtype, mode='r', shape=shape)
+            self._arrays[file_name] = array
+
+        return self._arrays[file_name]
+
+    def get_offsets(self, group: str):
+
+        """Gets the offsets of a group.
+
+        Arguments:
+            group (str): The group, e.g. 'excited_states'.
+
+        Returns:
+            numpy.ndarray: The start of the values of each TMC followed by the
+                total number of values (n_complexes + 1).
+        """
+
+        return self._map(_get_offsets_file_name(group), 'int64', (len(self) + 1,))
+
+    def get_values(self, group: str, field: str):
+
+        """Gets the values of a field of all TMCs.
+
+        Arguments:
+            group (str): The group, e.g. 'excited_states'.
+            field (str): The field, e.g. 'wavelength'.
+
+        Returns:
+            numpy.ndarray: The values of all TMCs back to back.
+        """
+
+        group_meta = self._meta['groups'][group]
+        field_meta = group_meta['fields'][field]
+
+        return self._map(_get_values_file_name(group, field), field_meta['dtype'], (group_meta['n_rows'], *field_meta['shape']))
+
+    def get_index(self, complex_id: str):
+
+        """Gets the position of a TMC.
+
+        Arguments:
+            complex_id (str): The ID of the TMC.
+
+        Returns:
+            int: The position.
+
+        Raises:
+            KeyError: If the TMC is not in the archive.
+        """
+
+        if self._positions is None:
+            self._positions = {complex_id: i for i, complex_id in enumerate(self.ids.tolist())}
+
+        return self._positions[complex_id]
+
+    def get(self, group: str, field: str, index: int):
+
+        """Gets the values of a field of one TMC.
+
+        Arguments:
+            group (str): The group, e.g. 'excited_states'.
+            field (str): The field, e.g. 'wavelength'.
+            index (int): The position of the TMC, see get_index().
+
+        Returns:
+            numpy.ndarray: The values, a view into the archive.
+        """
+
+        offsets = self.get_offsets(group)
+
+        return self.get_values(group, field)[offsets[index]:offsets[index + 1]]
+
+    def get_complex(self, complex_id: str):
+
+        """Gets all raw quantities of a TMC.
+
+        Arguments:
+            complex_id (str): The ID of the TMC.
+
+        Returns:
+            dict[str, dict[str, numpy.ndarray]]: The arrays by group and field,
+                views into the archive.
+        """
+
+        index = self.get_index(complex_id)
+
+        return {
+            group: {field: self.get(group, field, index) for field in self._meta['groups'][group]['fields']}
+            for group in self.groups
+        }
+
+
+def get_segment_ids(offsets: np.ndarray):
+
+    """Gets the position of the TMC of each value of a group.
+
+    The result serves as group index of segmented reductions over all TMCs,
+    e.g. np.bincount(get_segment_ids(offsets), weights=values).
+
+    Arguments:
+        offsets (numpy.ndarray): The offsets of the group.
+
+    Returns:
+        numpy.ndarray: The TMC positions.
+    """
+
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+def get_padded(values: np.ndarray, offsets: np.ndarray, width: int = None, fill_value=np.nan):
+
+    """Arranges the ragged values of a group as a padded matrix.
+
+    Arguments:
+        values (numpy.ndarray): The values of all TMCs back to back.
+        offsets (numpy.ndarray): The offsets of the group.
+        width (int): The number of columns, the longest segment if None.
+            Longer segments are truncated.
+        fill_value: The value of missing entries.
+
+    Returns:
+        numpy.ndarray: The values (n_complexes x width).
+    """
+
+    offsets = np.asarray(offsets)
+    lengths = np.diff(offsets)
+    if width is None:
+        width = int(lengths.max()) if len(lengths) > 0 else 0
+
+    segment_ids = get_segment_ids(offsets)
+    positions = np.arange(len(segment_ids)) - offsets[segment_ids]
+    is_kept = positions < width
+
+    padded = np.full((len(lengths), width), fill_value, dtype=np.result_type(values.dtype, np.min_scalar_type(fill_value)))
+    padded[segment_ids[is_kept], positions[is_kept]] = values[is_kept]
+
+    return padded
+
+def get_archive_band_data(archive: RawArchive):
+
+    """Recomputes the UV, Vis and nIR band metrics of all TMCs from an archive.
+
+    Arguments:
+        archive (RawArchive): The archive.
+
+    Returns:
+        pandas.DataFrame: The columns id, lambda_max_<region>, f_max_<region>
+            and sigma_<region>.
+    """
+
+    offsets = archive.get_offsets('excited_states')
+    lambdas = get_padded(archive.get_values('excited_states', 'wavelength'), offsets)
+    fs = get_padded(archive.get_values('excited_states', 'oscillator_strength'), offsets)
+
+    band_data = {'id': np.asarray(archive.ids)}
+    band_data.update(get_region_band_metrics(lambdas, fs))
+
+    return pd.DataFrame(band_data)
+
+def get_archive_nto_data(archive: RawArchive, prefix: str, index: int):
+
+    """Builds the NTO data of a block of a TMC from an archive.
+
+    The eigenvalues, coefficients and atom and basis function arrays are views
+    into the archive.
+
+    Arguments:
+        archive (RawArchive): The archive.
+        prefix (str): The block, 'occupied_nto' or 'virtual_nto'.
+        index (int): The position of the TMC.
+
+    Returns:
+        NtoData: The NTO data or None if the TMC has no NTO data.
+    """
+
+    eigenvalues = archive.get(prefix + '_eigenvalues', 'value', index)
+    if len(eigenvalues) == 0:
+        return None
+
+    element_labels, element_codes = np.unique(archive.get(prefix + '_atoms', 'element', index).astype(str), return_inverse=True)
+    orbital_labels, orbital_codes = np.unique(archive.get(prefix + '_basis', 'orbital', index).astype(str), return_inverse=True)
+
+    return NtoData(
+        eigenvalues=eigenvalues,
+        coefficients=archive.get(prefix + '_basis', 'coefficients', index)[:, :len(eigenvalues)].T,
+        atom_indices=archive.get(prefix + '_atoms', 'atom_index', index),
+        element_labels=element_labels,
+        element_codes=element_codes.astype(np.int16),
+        basis_atoms=archive.get(prefix + '_basis', 'atom', index),
+        orbital_labels=orbital_labels,
+        orbital_codes=orbital_codes.astype(np.int16)
+    )
+
+def get_archive_decompositions(archive: RawArchive, n: int = 1, chunk_size: int = 10000):
+
+    """Decomposes the NTO character of all TMCs of an archive.
+
+    The NTO blocks are decomposed in chunks of TMCs with
+    nto_analysis.get_nto_decompositions().
+
+    Arguments:
+        archive (RawArchive): The archive.
+        n (int): The number of NTOs with highest eigenvalues to consider.
+        chunk_size (int): The number of TMCs decomposed at once.
+
+    Returns:
+        pandas.DataFrame: The columns id and, for the occupied and virtual
+            NTOs, M_contribution_<block>, L_contribution_<block>, the shell
+            contributions M_<shell>_contribution_<block> and
+            L_<shell>_contribution_<block>, L_atom_max_contribution_<block>
+            and the element contributions <element>_contribution_<block>.
+            TMCs without NTO data have missing values.
+    """
+
+    blocks = ['occupied', 'virtual']
+    chunks = []
+    element_columns = {_: set() for _ in blocks}
+
+    for start in range(0, len(archive), chunk_size):
+
+        stop = min(start + chunk_size, len(archive))
+        chunk = {'id': np.asarray(archive.ids[start:stop])}
+
+        for block in blocks:
+
+            nto_datas = []
+            positions = []
+            for i in range(start, stop):
+                nto_data = get_archive_nto_data(archive, block + '_nto', i)
+                if nto_data is not None:
+                    nto_datas.append(nto_data)
+                    positions.append(i - start)
+
+            decompositions = get_nto_decompositions(nto_datas, n)
+
+            def get_column(values):
+                column = np.full(stop - start, np.nan)
+                column[positions] = values
+                return column
+
+            atom_offsets = decompositions['atom_offsets']
+            ligand_atom_ratios = np.where(decompositions['is_metal_atom'], 0, decompositions['atom_ratios'])
+            atom_max_ratios = np.maximum.reduceat(ligand_atom_ratios, atom_offsets[:-1]) if len(nto_datas) > 0 else np.zeros(0)
+
+            chunk['M_contribution_' + block] = get_column(decompositions['metal_ratios'])
+            chunk['L_contribution_' + block] = get_column(decompositions['ligand_ratios'])
+            for j, shell_type in enumerate(shell_types):
+                chunk['M_' + shell_type + '_contribution_' + block] = get_column(decompositions['metal_shell_ratios'][:, j])
+            for j, shell_type in enumerate(shell_types):
+                chunk['L_' + shell_type + '_contribution_' + block] = get_column(decompositions['ligand_shell_ratios'][:, j])
+            chunk['L_atom_max_contribution_' + block] = get_column(atom_max_ratios)
+            for j, element in enumerate(decompositions['element_labels']):
+                chunk[element + '_contribution_' + block] = get_column(decompositions['element_ratios'][:, j])
+                element_columns[block].add(element + '_contribution_' + block)
+
+        chunks.append(pd.DataFrame(chunk))
+
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 0 else pd.DataFrame({'id': []})
+
+    # elements missing in a chunk do not contribute to its TMCs
+    for block in blocks:
+        if len(element_columns[block]) > 0:
+            columns = sorted(element_columns[block])
+            has_nto_data = df['M_contribution_' + block].notna()
+            df.loc[has_nto_data, columns] = df.loc[has_nto_data, columns].fillna(0.0)
+
+    return df
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Extracts the raw parsed quantities of all TMCs into a memory-mapped archive.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Builds the archive from a directory of Gaussian output files.')
+    build_parser.add_argument('data_dir', help='Directory containing the Gaussian output files.')
+    build_parser.add_argument('archive', help='Archive directory.')
+    build_parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes.')
+    build_parser.add_argument('--quarantine', default=None, help='Output CSV file listing the files that could not be parsed.')
+
+    info_parser = subparsers.add_parser('info', help='Prints the groups of the archive.')
+    info_parser.add_argument('archive', help='Archive directory.')
+
+    bands_parser = subparsers.add_parser('bands', help='Recomputes the band metrics of all TMCs from the archive.')
+    bands_parser.add_argument('archive', help='Archive directory.')
+    bands_parser.add_argument('-o', '--output', default='bands.csv', help='Output CSV file.')
+
+    decompose_parser = subparsers.add_parser('decompose', help='Decomposes the NTO character of all TMCs from the archive.')
+    decompose_parser.add_argument('archive', help='Archive directory.')
+    decompose_parser.add_argument('-n', '--n-ntos', type=int, default=1, help='Number of NTOs with highest eigenvalues to consider.')
+    decompose_parser.add_argument('-o', '--output', default='decompositions.csv', help='Output CSV file.')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start_time = time.perf_counter()
+        quarantine = []
+        n_complexes = build_archive(iter_file_pairs(args.data_dir), args.archive, args.workers, quarantine)
+        print(str(n_complexes) + ' TMCs archived in ' + '%.1f s' % (time.perf_counter() - start_time) + '.')
+        if len(quarantine) > 0:
+            print(str(len(quarantine)) + ' files quarantined.')
+        if args.quarantine is not None:
+            write_quarantine_report(quarantine, args.quarantine)
+        return
+
+    archive = RawArchive(args.archive)
+
+    if args.command == 'info':
+        print(str(len(archive)) + ' TMCs')
+        for group in archive.groups:
+            offsets = archive.get_offsets(group)
+            print(group + ': ' + str(offsets[-1]) + ' values, ' + str((np.diff(offsets) > 0).sum()) + ' TMCs with values')
+        return
+
+    start_time = time.perf_counter()
+    if args.command == 'decompose':
+        df = get_archive_decompositions(archive, args.n_ntos)
+    else:
+        df = get_archive_band_data(archive)
+    duration = time.perf_counter() - start_time
+
+    df.to_csv(args.output, index=False)
+    print(str(len(df)) + ' TMCs in ' + '%.1f ms' % (duration * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+from result_writer import result_columns
+
+
+# hash of the result columns, part of every fingerprint
+_result_columns_hash = hashlib.sha1(','.join(result_columns).encode('utf-8')).hexdigest()[:16]
+
+
+class ResultCache():
+
+    """Persistent on-disk cache of per-complex analysis results.
+
+    Results are keyed by the path of the TD-DFT output file and validated with
+    a fingerprint of the TD-DFT and NTO output files (size, modification time
+    and optionally a content hash) and of the result columns, so that results
+    cached before columns were added are recomputed. Results are committed in
+    regular intervals so that an interrupted run can be resumed.
+    """
+
+    def __init__(self, cache_path: str, use_hash: bool = False, commit_interval: int = 100):
+
+        self._use_hash = use_hash
+        self._commit_interval = commit_interval
+        self._n_uncommitted = 0
+
+        self._connection = sqlite3.connect(cache_path)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS results (path TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, result TEXT)'
+        )
+
+        # load all fingerprints once to avoid a query per file
+        self._fingerprints = dict(self._connection.execute('SELECT path, fingerprint FROM results'))
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+    def fingerprint(self, tddft_file_path: str, nto_file_path: str):
+
+        """Builds the fingerprint of a pair of output files.
+
+        Arguments:
+            tddft_file_path (str): The path to the TD-DFT output file.
+            nto_file_path (str): The path to the corresponding NTO output file or None.
+
+        Returns:
+            str: The fingerprint.
+        """
+
+        return json.dumps([
+            self._get_file_fingerprint(tddft_file_path), self._get_file_fingerprint(nto_file_path), _result_columns_hash
+        ])
+
+    def contains(self, tddft_file_path: str, fingerprint: str):
+
+        """Checks if an up-to-date result is cached for a TD-DFT output file.
+
+        Arguments:
+            tddft_file_path (str): The path to the TD-DFT output file.
+            fingerprint (str): The current fingerprint of the file pair.
+
+        Returns:
+            bool: The flag indicating whether a valid result is cached.
+        """
+
+        return self._fingerprints.get(os.path.abspath(tddft_file_path)) == fingerprint
+
+    def load(self, tddft_file_path: str):
+
+        """Loads the cached result of a TD-DFT output file.
+
+        Arguments:
+            tddft_file_path (str): The path to the TD-DFT output file.
+
+        Returns:
+            dict: The result dict or None if the TMC was excluded.
+        """
+
+        row = self._connection.execute(
+            'SELECT result FROM results WHERE path = ?', (os.path.abspath(tddft_file_path),)
+        ).fetchone()
+
+        return json.loads(row[0])
+
+    def store(self, tddft_file_path: str, fingerprint: str, result_dict: dict):
+
+        """Stores the result of a TD-DFT output file.
+
+        Arguments:
+            tddft_file_path (str): The path to the TD-DFT output file.
+            fingerprint (str): The fingerprint of the file pair.
+            result_dict (dict): The result dict or None if the TMC is excluded.
+        """
+
+        path = os.path.abspath(tddft_file_path)
+        self._connection.execute(
+            'INSERT OR REPLACE INTO results (path, fingerprint, result) VALUES (?, ?, ?)',
+            (path, fingerprint, json.dumps(result_dict))
+        )
+        self._fingerprints[path] = fingerprint
+
+        self._n_uncommitted += 1
+        if self._n_uncommitted >= self._commit_interval:
+            self.commit()
+
+    def commit(self):
+
+        """Commits all stored results to disk."""
+
+        self._connection.commit()
+        self._n_uncommitted = 0
+
+    def close(self):
+
+        """Commits all stored results and closes the cache."""
+
+        self.commit()
+        self._connection.close()
+
+    def _get_file_fingerprint(self, file_path: str):
+
+        """Gets the fingerprint of a single file.
+
+        Arguments:
+            file_path (str): The path to the file or None.
+
+        Returns:
+            list: The size, modification time and content hash of the file or
+                None if the file does not exist.
+        """
+
+        if file_path is None:
+            return None
+
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+
+        content_hash = None
+        if self._use_hash:
+            sha256 = hashlib.sha256()
+            with open(file_path, 'rb') as fh:
+                for chunk in iter(lambda: fh.read(1 << 20), b''):
+                    sha256.update(chunk)
+            content_hash = sha256.hexdigest()
+
+        return [stat.st_size, stat.st_mtime_ns, content_hash]
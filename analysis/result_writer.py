@@ -0,0 +1,307 @@
+import abc
+import contextlib
+import os
+
+import pandas as pd
+
+
+n_excited_states = 30
+
+# fixed, typed schema of the analysis results in output order
+result_schema = [
+    ('id', 'string'),
+    ('has_failed', 'bool'),
+    ('homo_lumo_gap', 'float64'),
+    ('dipole_moment', 'float64'),
+    ('metal_charge', 'float64')
+]
+for i in range(1, n_excited_states + 1):
+    result_schema.append(('lambda_' + str(i), 'float64'))
+    result_schema.append(('f_' + str(i), 'float64'))
+for region in ['uv', 'vis', 'nir']:
+    result_schema.append(('lambda_max_' + region, 'float64'))
+    result_schema.append(('f_max_' + region, 'float64'))
+    result_schema.append(('sigma_' + region, 'float64'))
+result_schema.extend([
+    ('transition_nature_vis', 'string'),
+    ('M_contribution_occupied', 'float64'),
+    ('L_contribution_occupied', 'float64'),
+    ('M_contribution_virtual', 'float64'),
+    ('L_contribution_virtual', 'float64')
+])
+for block in ['occupied', 'virtual']:
+    result_schema.append(('M_d_contribution_' + block, 'float64'))
+    result_schema.append(('M_sp_contribution_' + block, 'float64'))
+    result_schema.append(('L_atom_max_contribution_' + block, 'float64'))
+
+result_columns = [name for name, _ in result_schema]
+
+def _import_pyarrow():
+
+    """Imports pyarrow which is only needed for the Parquet and Arrow formats.
+
+    Returns:
+        module: The pyarrow module.
+    """
+
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError('Writing Parquet or Arrow files requires the pyarrow package.') from e
+
+    return pyarrow
+
+def get_arrow_schema():
+
+    """Gets the result schema as pyarrow schema.
+
+    Returns:
+        pyarrow.Schema: The schema.
+    """
+
+    pa = _import_pyarrow()
+
+    arrow_types = {
+        'string': pa.string(),
+        'bool': pa.bool_(),
+        'float64': pa.float64()
+    }
+
+    return pa.schema([(name, arrow_types[dtype]) for name, dtype in result_schema])
+
+
+class ResultWriter(abc.ABC):
+
+    """Base class for writers that stream result dicts to disk in batches."""
+
+    def __init__(self, file_path: str, batch_size: int = 1000):
+
+        self._file_path = file_path
+        self._batch_size = batch_size
+        self._batch = []
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+    def write(self, result_dict: dict):
+
+        """Adds a result dict and flushes the batch once it is full.
+
+        Arguments:
+            result_dict (dict): The result dict.
+        """
+
+        self._batch.append(result_dict)
+
+        if len(self._batch) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+
+        """Writes all buffered result dicts to disk."""
+
+        if len(self._batch) > 0:
+            self._write_batch(self._batch)
+            self._batch = []
+
+    def close(self):
+
+        """Flushes all buffered result dicts and closes the file."""
+
+        self.flush()
+
+    @abc.abstractmethod
+    def _write_batch(self, batch: list[dict]):
+
+        """Writes a batch of result dicts.
+
+        Arguments:
+            batch (list[dict]): The result dicts.
+        """
+
+
+class CsvResultWriter(ResultWriter):
+
+    """Writer for CSV files, which can also append to existing results."""
+
+    def __init__(self, file_path: str, batch_size: int = 1000, append: bool = False):
+
+        super().__init__(file_path, batch_size)
+
+        if append and os.path.isfile(file_path) and os.path.getsize(file_path) > 0:
+            # rows are written in schema order and would not match other columns
+            if pd.read_csv(file_path, nrows=0).columns.tolist() != result_columns:
+                raise ValueError('Cannot append to results with different columns: ' + file_path)
+            return
+
+        # write the header right away so that empty results give a valid file
+        pd.DataFrame(columns=result_columns).to_csv(self._file_path, index=False)
+
+    def _write_batch(self, batch: list[dict]):
+
+        pd.DataFrame(batch, columns=result_columns).to_csv(self._file_path, mode='a', header=False, index=False)
+
+
+class ArrowResultWriter(ResultWriter):
+
+    """Writer for Parquet and Arrow IPC files."""
+
+    def __init__(self, file_path: str, batch_size: int = 1000):
+
+        super().__init__(file_path, batch_size)
+
+        pa = _import_pyarrow()
+        self._schema = get_arrow_schema()
+
+        if file_path.endswith('.parquet'):
+            self._writer = pa.parquet.ParquetWriter(file_path, self._schema)
+        else:
+            self._writer = pa.ipc.new_file(file_path, self._schema)
+
+    def close(self):
+
+        super().close()
+        self._writer.close()
+
+    def _write_batch(self, batch: list[dict]):
+
+        pa = _import_pyarrow()
+
+        arrays = [pa.array([_.get(field.name) for _ in batch], type=field.type) for field in self._schema]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self._schema))
+
+
+def get_result_writer(file_path: str, batch_size: int = 1000, append: bool = False):
+
+    """Gets the writer for the format given by the file extension.
+
+    Arguments:
+        file_path (str): The output file path (.csv, .parquet, .arrow or .feather).
+        batch_size (int): The number of results to buffer before writing.
+        append (bool): Flag to denote whether the results are appended to an
+            existing file, only supported for CSV files.
+
+    Returns:
+        ResultWriter: The result writer.
+    """
+
+    extension = os.path.splitext(file_path)[1]
+
+    if extension == '.csv':
+        return CsvResultWriter(file_path, batch_size, append)
+    if append:
+        raise ValueError('Appending is only supported for CSV files.')
+    if extension in ['.parquet', '.arrow', '.feather']:
+        return ArrowResultWriter(file_path, batch_size)
+
+    raise ValueError('Unsupported output format: ' + extension)
+
+def read_results(file_path: str, columns: list[str] = None, round_trip: bool = False):
+
+    """Reads analysis results in any of the supported formats.
+
+    Arguments:
+        file_path (str): The path to the results (.csv, .parquet, .arrow or .feather).
+        columns (list[str]): The columns to read, all columns if None.
+        round_trip (bool): Flag to denote whether floats in CSV files are
+            parsed exactly so that they are written back unchanged (slower).
+
+    Returns:
+        pandas.DataFrame: The results.
+    """
+
+    extension = os.path.splitext(file_path)[1]
+
+    if extension == '.csv':
+        return pd.read_csv(file_path, usecols=columns, float_precision='round_trip' if round_trip else None)
+
+    pa = _import_pyarrow()
+    if extension == '.parquet':
+        return pa.parquet.read_table(file_path, columns=columns).to_pandas()
+    if extension in ['.arrow', '.feather']:
+        with pa.memory_map(file_path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        return table.to_pandas()
+
+    raise ValueError('Unsupported input format: ' + extension)
+
+def iter_result_chunks(file_path: str, columns: list[str] = None, chunk_size: int = 100000, round_trip: bool = False):
+
+    """Reads analysis results in any of the supported formats chunk by chunk.
+
+    Arguments:
+        file_path (str): The path to the results (.csv, .parquet, .arrow or .feather).
+        columns (list[str]): The columns to read, all columns if None.
+        chunk_size (int): The number of rows per chunk (approximate for Arrow
+            IPC files, whose record batches are not split).
+        round_trip (bool): Flag to denote whether floats in CSV files are
+            parsed exactly so that they are written back unchanged (slower).
+
+    Yields:
+        pandas.DataFrame: The chunks of the results.
+    """
+
+    extension = os.path.splitext(file_path)[1]
+
+    if extension == '.csv':
+        with pd.read_csv(file_path, usecols=columns, chunksize=chunk_size, float_precision='round_trip' if round_trip else None) as reader:
+            yield from reader
+        return
+
+    pa = _import_pyarrow()
+    if extension == '.parquet':
+        for batch in pa.parquet.ParquetFile(file_path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    if extension not in ['.arrow', '.feather']:
+        raise ValueError('Unsupported input format: ' + extension)
+
+    with pa.memory_map(file_path, 'r') as source:
+        reader = pa.ipc.open_file(source)
+        batches = []
+        n_rows = 0
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(columns)
+            batches.append(batch)
+            n_rows += batch.num_rows
+            if n_rows >= chunk_size or i == reader.num_record_batches - 1:
+                yield pa.Table.from_batches(batches).to_pandas()
+                batches = []
+                n_rows = 0
+
+def export_csv(file_path: str, csv_path: str, batch_size: int = 10000):
+
+    """Exports Parquet or Arrow results to CSV batch by batch.
+
+    Arguments:
+        file_path (str): The path to the results (.parquet, .arrow or .feather).
+        csv_path (str): The path to the CSV file.
+        batch_size (int): The number of rows to convert at a time.
+    """
+
+    pa = _import_pyarrow()
+
+    pd.DataFrame(columns=result_columns).to_csv(csv_path, index=False)
+
+    with contextlib.ExitStack() as stack:
+
+        if file_path.endswith('.parquet'):
+            batches = stack.enter_context(pa.parquet.ParquetFile(file_path)).iter_batches(batch_size=batch_size)
+        else:
+            reader = pa.ipc.open_file(stack.enter_context(pa.memory_map(file_path, 'r')))
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+        for batch in batches:
+            batch.to_pandas().to_csv(csv_path, mode='a', header=False, index=False)
@@ -0,0 +1,195 @@
+import contextlib
+import mmap
+import os
+
+
+class SectionIndex():
+
+    """Offsets of the lines containing section anchors in an output file.
+
+    The anchors are located with a substring search over the raw bytes of the
+    file, which runs in C and does not split the file into lines. The search
+    for an anchor runs when its offsets are first requested, find_line() only
+    searches up to the next match. Only the lines that are requested are
+    decoded, the remaining bytes of the file are never copied into Python
+    objects.
+
+    Offsets refer to the first byte of a line. Lines are returned including
+    their line break like lines read from a text file.
+    """
+
+    def __init__(self, buffer, anchors: list[str]):
+
+        self._buffer = buffer
+        self._size = len(buffer)
+        self._anchors = anchors
+        self._offsets = {}
+
+    def _find_lines(self, anchor: str):
+
+        """Finds the lines that contain a given anchor.
+
+        Arguments:
+            anchor (str): The anchor.
+
+        Returns:
+            list[int]: The offsets of the lines in ascending order, each line
+                is listed once.
+        """
+
+        offsets = []
+
+        line_start = self.find_line(anchor)
+        while line_start is not None:
+            offsets.append(line_start)
+            # continue behind the line so that it is not listed twice
+            line_start = self.find_line(anchor, self._get_line_end(line_start))
+
+        return offsets
+
+    def find_line(self, anchor: str, start: int = 0):
+
+        """Finds the first line at or after a given offset that contains an anchor.
+
+        Arguments:
+            anchor (str): The anchor, must have been given on construction.
+            start (int): The offset of the line to start searching from.
+
+        Returns:
+            int: The offset of the line or None if the anchor is not found.
+        """
+
+        if anchor not in self._anchors:
+            raise KeyError(anchor)
+
+        position = self._buffer.find(anchor.encode(), start)
+        if position == -1:
+            return None
+
+        return self._buffer.rfind(b'\n', 0, position) + 1
+
+    def _get_line_end(self, offset: int):
+
+        """Gets the offset of the first byte after the line at a given offset.
+
+        Arguments:
+            offset (int): The offset of a byte in the line.
+
+        Returns:
+            int: The offset of the next line or the file size.
+        """
+
+        line_end = self._buffer.find(b'\n', offset)
+        if line_end == -1:
+            return self._size
+
+        return line_end + 1
+
+    def _decode(self, start: int, end: int):
+
+        return self._buffer[start:end].decode('utf-8', errors='replace')
+
+    def get_offsets(self, anchor: str):
+
+        """Gets the offsets of the lines that contain a given anchor.
+
+        Arguments:
+            anchor (str): The anchor, must have been given on construction.
+
+        Returns:
+            list[int]: The offsets of the lines in ascending order.
+        """
+
+        if anchor not in self._offsets:
+            if anchor not in self._anchors:
+                raise KeyError(anchor)
+            self._offsets[anchor] = self._find_lines(anchor)
+
+        return self._offsets[anchor]
+
+    def get_line(self, offset: int):
+
+        """Gets the line starting at a given offset.
+
+        Arguments:
+            offset (int): The offset of the line.
+
+        Returns:
+            str: The line or an empty string at the end of the file.
+        """
+
+        return self._decode(offset, self._get_line_end(offset))
+
+    def get_previous_line(self, offset: int):
+
+        """Gets the line before the line starting at a given offset.
+
+        Arguments:
+            offset (int): The offset of the line.
+
+        Returns:
+            str: The previous line or an empty string for the first line.
+        """
+
+        if offset == 0:
+            return ''
+
+        line_start = self._buffer.rfind(b'\n', 0, offset - 1) + 1
+
+        return self._decode(line_start, offset)
+
+    def iter_lines(self, offset: int):
+
+        """Iterates over the lines starting at a given offset.
+
+        Arguments:
+            offset (int): The offset of the first line.
+
+        Yields:
+            int: The offset of the line.
+            str: The line.
+        """
+
+        while offset < self._size:
+            line_end = self._get_line_end(offset)
+            yield offset, self._decode(offset, line_end)
+            offset = line_end
+
+    def get_last_line(self):
+
+        """Gets the last line of the file that is not blank.
+
+        Returns:
+            str: The line or an empty string if the file is blank.
+        """
+
+        end = self._size
+        while end > 0 and self._buffer[end - 1:end].isspace():
+            end -= 1
+
+        line_start = self._buffer.rfind(b'\n', 0, end) + 1
+
+        return self._decode(line_start, self._get_line_end(line_start))
+
+@contextlib.contextmanager
+def open_section_index(file_path: str, anchors: list[str]):
+
+    """Memory-maps an uncompressed output file and indexes its section anchors.
+
+    Arguments:
+        file_path (str): The path to the file.
+        anchors (list[str]): The anchors to index.
+
+    Yields:
+        SectionIndex: The index, only valid within the context.
+    """
+
+    with open(file_path, 'rb') as fh:
+
+        # empty files cannot be mapped
+        if os.fstat(fh.fileno()).st_size == 0:
+            yield SectionIndex(b'', anchors)
+            return
+
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield SectionIndex(buffer, anchors)
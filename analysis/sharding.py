@@ -0,0 +1,333 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import zlib
+
+from discovery import iter_file_pairs
+from file_utils import get_file_id
+from result_writer import get_result_writer, iter_result_chunks, read_results
+
+
+def get_shard_index(complex_id: str, n_shards: int):
+
+    """Assigns a TMC to a shard by a stable hash of its ID.
+
+    Arguments:
+        complex_id (str): The ID of the TMC.
+        n_shards (int): The number of shards.
+
+    Returns:
+        int: The shard index.
+    """
+
+    return zlib.crc32(complex_id.encode('utf-8')) % n_shards
+
+def create_manifest(file_pairs: list[tuple], n_shards: int):
+
+    """Assigns TMCs to shards so that all shards have about the same amount of data.
+
+    The file pairs are assigned largest first to the shard with the smallest
+    total size so far. Ties are broken by ID so that the assignment is
+    deterministic.
+
+    Arguments:
+        file_pairs (list[tuple]): The TD-DFT and NTO file path pairs.
+        n_shards (int): The number of shards.
+
+    Returns:
+        dict[str, int]: The shard index by ID.
+    """
+
+    sizes = []
+    for tddft_file_path, nto_file_path in file_pairs:
+        size = os.path.getsize(tddft_file_path)
+        if nto_file_path is not None:
+            size += os.path.getsize(nto_file_path)
+        sizes.append((-size, get_file_id(tddft_file_path)))
+
+    shard_sizes = [0] * n_shards
+    manifest = {}
+    for negative_size, complex_id in sorted(sizes):
+        shard_index = min(range(n_shards), key=lambda _: (shard_sizes[_], _))
+        shard_sizes[shard_index] -= negative_size
+        manifest[complex_id] = shard_index
+
+    return manifest
+
+def write_manifest(manifest: dict, file_path: str):
+
+    """Writes a shard manifest to a CSV file with the columns id and shard.
+
+    Arguments:
+        manifest (dict[str, int]): The shard index by ID.
+        file_path (str): The path to the CSV file.
+    """
+
+    with open(file_path, 'w', newline='') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(['id', 'shard'])
+        writer.writerows(sorted(manifest.items()))
+
+def read_manifest(file_path: str):
+
+    """Reads a shard manifest written by write_manifest().
+
+    Arguments:
+        file_path (str): The path to the CSV file.
+
+    Returns:
+        dict[str, int]: The shard index by ID.
+    """
+
+    with open(file_path, 'r', newline='') as fh:
+        return {row['id']: int(row['shard']) for row in csv.DictReader(fh)}
+
+def get_manifest_hash(manifest: dict):
+
+    """Gets a hash of the shard assignment of a manifest.
+
+    Arguments:
+        manifest (dict[str, int]): The shard index by ID.
+
+    Returns:
+        str: The hash, independent of the order of the entries.
+    """
+
+    content = '\n'.join(complex_id + ',' + str(shard_index) for complex_id, shard_index in sorted(manifest.items()))
+
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def is_in_shard(complex_id: str, shard_index: int, n_shards: int, manifest: dict = None):
+
+    """Checks if a TMC belongs to a shard.
+
+    Arguments:
+        complex_id (str): The ID of the TMC.
+        shard_index (int): The shard index.
+        n_shards (int): The number of shards.
+        manifest (dict[str, int]): The shard index by ID, the stable hash is
+            used if None. TMCs missing in the manifest belong to no shard.
+
+    Returns:
+        bool: The flag indicating whether the TMC belongs to the shard.
+    """
+
+    if manifest is not None:
+        return manifest.get(complex_id) == shard_index
+
+    return get_shard_index(complex_id, n_shards) == shard_index
+
+def select_shard(file_pairs, shard_index: int, n_shards: int, manifest: dict = None, ids: list = None):
+
+    """Filters file pairs to those of one shard.
+
+    Arguments:
+        file_pairs (Iterable[tuple]): The TD-DFT and NTO file path pairs.
+        shard_index (int): The shard index.
+        n_shards (int): The number of shards.
+        manifest (dict[str, int]): The shard index by ID, see is_in_shard().
+        ids (list): List to which the IDs of the selected TMCs are appended.
+
+    Yields:
+        tuple: The file pairs of the shard.
+    """
+
+    for file_pair in file_pairs:
+        complex_id = get_file_id(file_pair[0])
+        if is_in_shard(complex_id, shard_index, n_shards, manifest):
+            if ids is not None:
+                ids.append(complex_id)
+            yield file_pair
+
+def get_shard_output_path(output_path: str, shard_index: int, n_shards: int):
+
+    """Gets the path of the partial result of a shard.
+
+    Arguments:
+        output_path (str): The path of the complete result (e.g. df_x.csv).
+        shard_index (int): The shard index.
+        n_shards (int): The number of shards.
+
+    Returns:
+        str: The path of the partial result (e.g. df_x.shard-001-of-016.csv).
+    """
+
+    root, extension = os.path.splitext(output_path)
+
+    return root + '.shard-%03d-of-%03d' % (shard_index, n_shards) + extension
+
+def get_shard_info_path(partial_path: str):
+
+    """Gets the path of the file recording the completion of a shard.
+
+    Arguments:
+        partial_path (str): The path of the partial result.
+
+    Returns:
+        str: The path of the shard info file.
+    """
+
+    return partial_path + '.json'
+
+def write_shard_info(partial_path: str, shard_index: int, n_shards: int, ids: list[str], manifest_path: str = None):
+
+    """Records that a shard is complete.
+
+    The info is written once the partial result has been closed, a partial
+    result without info is therefore incomplete.
+
+    Arguments:
+        partial_path (str): The path of the partial result.
+        shard_index (int): The shard index.
+        n_shards (int): The number of shards.
+        ids (list[str]): The IDs of all analyzed TMCs of the shard, including
+            excluded ones.
+        manifest_path (str): The path of the manifest or None if the shards
+            are assigned by hash. The hash of the manifest is recorded so that
+            only shards of the same assignment are merged.
+    """
+
+    shard_info = {
+        'shard_index': shard_index,
+        'n_shards': n_shards,
+        'manifest': manifest_path,
+        'manifest_hash': get_manifest_hash(read_manifest(manifest_path)) if manifest_path is not None else None,
+        'ids': sorted(ids)
+    }
+
+    with open(get_shard_info_path(partial_path), 'w') as fh:
+        json.dump(shard_info, fh)
+
+def reduce_shards(partial_paths: list[str], output_path: str, expected_ids: set = None, manifest: dict = None,
+                  chunk_size: int = 100000):
+
+    """Merges the partial results of all shards into the complete result.
+
+    The shards are checked before anything is written: every shard of the
+    run has to be present exactly once and complete, the TMCs must have been
+    assigned by the same hash or manifest and no TMC may appear in more than
+    one shard or more than once in the results. Only the IDs of the results
+    are read for the checks, the results are then copied chunk by chunk,
+    shard by shard in the order of the partial results.
+
+    Arguments:
+        partial_paths (list[str]): The paths of the partial results.
+        output_path (str): The path of the complete result.
+        expected_ids (set[str]): The IDs of all TMCs of the dataset, checked
+            against the analyzed TMCs if given.
+        manifest (dict[str, int]): The manifest the shards were assigned by,
+            checked against the shards if given.
+        chunk_size (int): The number of rows copied at a time.
+
+    Returns:
+        int: The number of rows written.
+    """
+
+    shard_infos = []
+    for partial_path in partial_paths:
+        if not os.path.isfile(get_shard_info_path(partial_path)):
+            raise ValueError('Shard is incomplete: ' + partial_path)
+        with open(get_shard_info_path(partial_path), 'r') as fh:
+            shard_infos.append(json.load(fh))
+
+    n_shards = {_['n_shards'] for _ in shard_infos}
+    if len(n_shards) != 1:
+        raise ValueError('Shards of different runs: ' + str(sorted(n_shards)) + ' shards.')
+    n_shards = n_shards.pop()
+
+    shard_indices = [_['shard_index'] for _ in shard_infos]
+    missing_shards = sorted(set(range(n_shards)) - set(shard_indices))
+    if len(missing_shards) > 0:
+        raise ValueError('Missing shards: ' + ', '.join(str(_) for _ in missing_shards))
+    if len(shard_indices) != n_shards:
+        raise ValueError('Shards given more than once.')
+
+    # shards assigned by hash have no manifest hash
+    manifest_hashes = {_.get('manifest_hash') for _ in shard_infos}
+    if len(manifest_hashes) != 1:
+        if None in manifest_hashes:
+            raise ValueError('Shards assigned by hash and by manifest.')
+        raise ValueError('Shards assigned by different manifests.')
+    manifest_hash = manifest_hashes.pop()
+    if manifest is not None and manifest_hash != get_manifest_hash(manifest):
+        raise ValueError('Shards not assigned by the given manifest.')
+
+    shard_ids = {}
+    for shard_info in shard_infos:
+        shard_index = shard_info['shard_index']
+        for complex_id in shard_info['ids']:
+            if complex_id in shard_ids:
+                raise ValueError('TMC ' + complex_id + ' in more than one shard.')
+            if manifest_hash is None and get_shard_index(complex_id, n_shards) != shard_index:
+                raise ValueError('TMC ' + complex_id + ' in wrong shard ' + str(shard_index) + '.')
+            if manifest is not None and manifest.get(complex_id) != shard_index:
+                raise ValueError('TMC ' + complex_id + ' in wrong shard ' + str(shard_index) + '.')
+            shard_ids[complex_id] = shard_index
+
+    if expected_ids is not None:
+        missing_ids = sorted(set(expected_ids) - set(shard_ids))
+        if len(missing_ids) > 0:
+            raise ValueError(str(len(missing_ids)) + ' TMCs not analyzed, e.g. ' + ', '.join(missing_ids[:5]))
+
+    result_ids = set()
+    for partial_path in partial_paths:
+        for complex_id in read_results(partial_path, columns=['id'])['id'].astype(str):
+            if complex_id in result_ids:
+                raise ValueError('Duplicate results for TMC ' + complex_id + '.')
+            if complex_id not in shard_ids:
+                raise ValueError('Results of TMC ' + complex_id + ' not recorded in its shard.')
+            result_ids.add(complex_id)
+
+    with get_result_writer(output_path) as writer:
+        for partial_path in partial_paths:
+            for chunk in iter_result_chunks(partial_path, chunk_size=chunk_size, round_trip=True):
+                # missing values as None so that all writers accept them
+                chunk = chunk.astype(object).where(chunk.notna(), None)
+                for result_dict in chunk.to_dict('records'):
+                    writer.write(result_dict)
+
+    return len(result_ids)
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Creates shard manifests and merges the partial results of sharded analyze.py runs.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    manifest_parser = subparsers.add_parser('manifest', help='Assigns the TMCs of a directory to shards of about equal size.')
+    manifest_parser.add_argument('data_dir', help='Directory containing the Gaussian output files.')
+    manifest_parser.add_argument('-k', '--n-shards', type=int, required=True, help='Number of shards.')
+    manifest_parser.add_argument('-o', '--output', default='manifest.csv', help='Output CSV file.')
+
+    reduce_parser = subparsers.add_parser('reduce', help='Merges the partial results of all shards.')
+    reduce_parser.add_argument('partials', nargs='+', help='Partial results of the shards.')
+    reduce_parser.add_argument('-o', '--output', required=True, help='Output file (.csv, .parquet, .arrow or .feather).')
+    reduce_parser.add_argument('--data-dir', default=None, help='Directory of the Gaussian output files to check that all TMCs were analyzed.')
+    reduce_parser.add_argument('--manifest', default=None, help='Manifest to check that the shards were assigned by it and all TMCs were analyzed.')
+
+    args = parser.parse_args()
+
+    if args.command == 'manifest':
+        manifest = create_manifest(list(iter_file_pairs(args.data_dir)), args.n_shards)
+        write_manifest(manifest, args.output)
+        return
+
+    manifest = read_manifest(args.manifest) if args.manifest is not None else None
+
+    expected_ids = None
+    if args.data_dir is not None:
+        expected_ids = {get_file_id(tddft_file_path) for tddft_file_path, _ in iter_file_pairs(args.data_dir)}
+    elif manifest is not None:
+        expected_ids = set(manifest.keys())
+
+    try:
+        n_rows = reduce_shards(args.partials, args.output, expected_ids, manifest)
+    except ValueError as e:
+        sys.exit('Reduce failed: ' + str(e))
+
+    print(str(n_rows) + ' results written to ' + args.output + '.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from result_writer import n_excited_states, read_results
+from tddft_data_parser import uv_vis_boundary, vis_nir_boundary
+
+
+# conversion between wavelength in nm and energy in eV
+hc = 1239.84198
+
+line_shapes = ['gaussian', 'lorentzian']
+
+# lower bound of Gaussian exponents, the line shape is negligible below
+min_exponent = -80
+
+# wavelength region boundaries in nm and whether they belong to the region,
+# Vis includes both boundaries as in TddftDataParser._split_spectrum_into_uv_vis_nir()
+region_boundaries = {'uv': (None, uv_vis_boundary), 'vis': (uv_vis_boundary, vis_nir_boundary), 'nir': (vis_nir_boundary, None)}
+region_inclusions = {'uv': (True, False), 'vis': (True, True), 'nir': (False, True)}
+
+def get_stick_spectra(df: pd.DataFrame, n_states: int = n_excited_states):
+
+    """Gets the stick spectra of a result table as padded matrices.
+
+    Arguments:
+        df (pandas.DataFrame): The result table with lambda_i and f_i columns.
+        n_states (int): The number of excited states.
+
+    Returns:
+        numpy.ndarray: The wavelengths in nm (n_complexes x n_states), NaN if missing.
+        numpy.ndarray: The oscillator strengths (n_complexes x n_states), NaN if missing.
+    """
+
+    lambdas = np.column_stack([
+        df['lambda_' + str(i+1)].to_numpy(dtype=float, na_value=np.nan) for i in range(n_states)
+    ])
+    fs = np.column_stack([
+        df['f_' + str(i+1)].to_numpy(dtype=float, na_value=np.nan) for i in range(n_states)
+    ])
+
+    return lambdas, fs
+
+def _apply_line_shape(distances: np.ndarray, fwhm: float, line_shape: str):
+
+    """Evaluates a line shape of unit height in place.
+
+    Arguments:
+        distances (numpy.ndarray): The energy distances to the line centers in
+            eV, overwritten by the line shape values.
+        fwhm (float): The full width at half maximum in eV.
+        line_shape (str): The line shape, 'gaussian' or 'lorentzian'.
+
+    Returns:
+        numpy.ndarray: The line shape values.
+    """
+
+    np.square(distances, out=distances)
+
+    if line_shape == 'gaussian':
+        sigma = fwhm / (2 * np.sqrt(2 * np.log(2)))
+        distances *= distances.dtype.type(-0.5 / sigma**2)
+        # exponents below the normal range hit a slow path of exp
+        np.maximum(distances, min_exponent, out=distances)
+        return np.exp(distances, out=distances)
+
+    if line_shape == 'lorentzian':
+        gamma_squared = distances.dtype.type((fwhm / 2)**2)
+        distances += gamma_squared
+        return np.divide(gamma_squared, distances, out=distances)
+
+    raise ValueError('Unknown line shape: ' + line_shape)
+
+def broaden_spectra(lambdas: np.ndarray, fs: np.ndarray, grid: np.ndarray, fwhm: float = 0.3,
+                    line_shape: str = 'gaussian', unit: str = 'nm', chunk_size: int = 32, out: np.ndarray = None,
+                    dtype=np.float32):
+
+    """Broadens stick spectra into continuous spectra on a common grid.
+
+    Every transition contributes a line of the given shape, centered at its
+    excitation energy and scaled to its oscillator strength. Lines are
+    broadened in energy also for wavelength grids. Complexes are processed in
+    chunks of chunk_size so that the intermediate (chunk x states x grid)
+    array stays small, missing transitions (NaN) do not contribute. The line
+    shapes are evaluated in dtype, single precision is about three times
+    faster than double precision.
+
+    Arguments:
+        lambdas (numpy.ndarray): The wavelengths in nm (n_complexes x n_states).
+        fs (numpy.ndarray): The oscillator strengths (n_complexes x n_states).
+        grid (numpy.ndarray): The grid in nm or eV.
+        fwhm (float): The full width at half maximum of the lines in eV.
+        line_shape (str): The line shape, 'gaussian' or 'lorentzian'.
+        unit (str): The unit of the grid, 'nm' or 'eV'.
+        chunk_size (int): The number of complexes processed at once.
+        out (numpy.ndarray): The (n_complexes x n_grid) array to write the
+            spectra to, e.g. a memory-mapped array (see create_spectrum_array()).
+        dtype (numpy.dtype): The floating point type of the computation.
+
+    Returns:
+        numpy.ndarray: The spectra (n_complexes x n_grid).
+    """
+
+    if line_shape not in line_shapes:
+        raise ValueError('Unknown line shape: ' + line_shape)
+
+    if unit == 'nm':
+        grid_energies = hc / np.asarray(grid, dtype=float)
+    elif unit == 'eV':
+        grid_energies = np.asarray(grid, dtype=float)
+    else:
+        raise ValueError('Unknown grid unit: ' + unit)
+    grid_energies = grid_energies.astype(dtype)
+
+    if out is None:
+        out = np.empty((len(lambdas), len(grid_energies)), dtype=dtype)
+
+    for start in range(0, len(lambdas), chunk_size):
+
+        chunk_lambdas = lambdas[start:start + chunk_size]
+        chunk_fs = fs[start:start + chunk_size]
+
+        # missing transitions are moved out of the way and get no weight
+        is_valid = np.isfinite(chunk_lambdas) & (chunk_lambdas > 0) & np.isfinite(chunk_fs)
+        energies = (hc / np.where(is_valid, chunk_lambdas, hc)).astype(dtype)
+        weights = np.where(is_valid, chunk_fs, 0).astype(dtype)
+
+        line_values = _apply_line_shape(grid_energies - energies[:, :, np.newaxis], fwhm, line_shape)
+        # weighted sum over the transitions of each complex
+        out[start:start + chunk_size] = np.matmul(weights[:, np.newaxis, :], line_values)[:, 0, :]
+
+    return out
+
+def create_spectrum_array(file_path: str, n_spectra: int, n_grid: int, dtype=np.float32):
+
+    """Creates a memory-mapped .npy file for broadened spectra.
+
+    Arguments:
+        file_path (str): The path to the .npy file.
+        n_spectra (int): The number of spectra.
+        n_grid (int): The number of grid points.
+        dtype (numpy.dtype): The data type.
+
+    Returns:
+        numpy.memmap: The (n_spectra x n_grid) array.
+    """
+
+    return np.lib.format.open_memmap(file_path, mode='w+', dtype=dtype, shape=(n_spectra, n_grid))
+
+def get_band_maxima(spectra: np.ndarray, grid: np.ndarray, lower: float = None, upper: float = None,
+                    include_lower: bool = True, include_upper: bool = True, chunk_size: int = 4096):
+
+    """Determines position, height and width of the band maximum in a region.
+
+    The width is the full width at half maximum of the band, with the half
+    maximum crossings interpolated linearly between grid points. Bands that
+    do not fall below half their maximum within the region are cut at the
+    region boundaries.
+
+    Arguments:
+        spectra (numpy.ndarray): The spectra (n_complexes x n_grid).
+        grid (numpy.ndarray): The ascending grid.
+        lower (float): The lower region boundary, open if None.
+        upper (float): The upper region boundary, open if None.
+        include_lower (bool): Flag to denote whether the lower boundary belongs to the region.
+        include_upper (bool): Flag to denote whether the upper boundary belongs to the region.
+        chunk_size (int): The number of spectra processed at once.
+
+    Returns:
+        numpy.ndarray: The positions of the maxima, NaN if there is no band.
+        numpy.ndarray: The heights of the maxima, NaN if there is no band.
+        numpy.ndarray: The widths of the bands, NaN if there is no band.
+    """
+
+    grid = np.asarray(grid, dtype=float)
+
+    is_in_region = np.ones(len(grid), dtype=bool)
+    if lower is not None:
+        is_in_region &= (grid >= lower) if include_lower else (grid > lower)
+    if upper is not None:
+        is_in_region &= (grid <= upper) if include_upper else (grid < upper)
+    region = np.flatnonzero(is_in_region)
+
+    positions = np.full(len(spectra), np.nan)
+    heights = np.full(len(spectra), np.nan)
+    widths = np.full(len(spectra), np.nan)
+
+    if len(region) == 0:
+        return positions, heights, widths
+
+    region_grid = grid[region[0]:region[-1] + 1]
+    indices = np.arange(len(region_grid))
+
+    for start in range(0, len(spectra), chunk_size):
+
+        values = np.asarray(spectra[start:start + chunk_size, region[0]:region[-1] + 1], dtype=float)
+        rows = np.arange(len(values))
+
+        maximum_indices = np.argmax(values, axis=1)
+        maxima = values[rows, maximum_indices]
+        half_maxima = maxima / 2
+
+        # last grid point below half maximum left of the maximum and first one to the right
+        is_below = values < half_maxima[:, np.newaxis]
+        left = np.where(is_below & (indices < maximum_indices[:, np.newaxis]), indices, -1).max(axis=1)
+        right = np.where(is_below & (indices > maximum_indices[:, np.newaxis]), indices, len(indices)).min(axis=1)
+
+        left_edges = _interpolate_crossing(values, region_grid, half_maxima, left, left + 1)
+        right_edges = _interpolate_crossing(values, region_grid, half_maxima, right, right - 1)
+
+        has_band = maxima > 0
+        positions[start:start + chunk_size] = np.where(has_band, region_grid[maximum_indices], np.nan)
+        heights[start:start + chunk_size] = np.where(has_band, maxima, np.nan)
+        widths[start:start + chunk_size] = np.where(has_band, right_edges - left_edges, np.nan)
+
+    return positions, heights, widths
+
+def _interpolate_crossing(values: np.ndarray, grid: np.ndarray, levels: np.ndarray,
+                          outer: np.ndarray, inner: np.ndarray):
+
+    """Interpolates where spectra cross a level between two grid points.
+
+    Arguments:
+        values (numpy.ndarray): The spectra (n x n_grid).
+        grid (numpy.ndarray): The grid.
+        levels (numpy.ndarray): The level of each spectrum.
+        outer (numpy.ndarray): The index of the point below the level, out of
+            range if there is none.
+        inner (numpy.ndarray): The index of the neighbouring point above the level.
+
+    Returns:
+        numpy.ndarray: The grid positions of the crossings, the outermost grid
+            point above the level if there is no crossing.
+    """
+
+    rows = np.arange(len(values))
+    has_crossing = (outer >= 0) & (outer < len(grid))
+    outer = np.clip(outer, 0, len(grid) - 1)
+
+    outer_values = values[rows, outer]
+    inner_values = values[rows, inner]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fractions = (levels - outer_values) / (inner_values - outer_values)
+        crossings = grid[outer] + fractions * (grid[inner] - grid[outer])
+
+    return np.where(has_crossing, crossings, grid[inner])
+
+def get_region_bounds(region: str, unit: str = 'nm'):
+
+    """Gets the boundaries of a spectral region in the unit of a grid.
+
+    Arguments:
+        region (str): The region, 'uv', 'vis' or 'nir'.
+        unit (str): The unit of the grid, 'nm' or 'eV'.
+
+    Returns:
+        float: The lower boundary or None.
+        float: The upper boundary or None.
+        bool: The flag indicating whether the lower boundary belongs to the region.
+        bool: The flag indicating whether the upper boundary belongs to the region.
+    """
+
+    lower, upper = region_boundaries[region]
+    include_lower, include_upper = region_inclusions[region]
+    if unit == 'nm':
+        return lower, upper, include_lower, include_upper
+
+    # wavelength boundaries swap in energy
+    return (hc / upper if upper is not None else None), (hc / lower if lower is not None else None), include_upper, include_lower
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Computes broadened spectra from the stick spectra of a result file.')
+    parser.add_argument('results', type=str, help='Result file of analyze.py.')
+    parser.add_argument('-o', '--output', type=str, default='spectra.npy', help='Output .npy file of the spectra, the grid is written to <output>_grid.npy.')
+    parser.add_argument('--bands', type=str, default=None, help='Output CSV file of the band maxima of the broadened spectra.')
+    parser.add_argument('--unit', type=str, default='nm', choices=['nm', 'eV'], help='Unit of the grid.')
+    parser.add_argument('--start', type=float, default=200, help='First grid point.')
+    parser.add_argument('--stop', type=float, default=1200, help='Last grid point.')
+    parser.add_argument('--n-points', type=int, default=1001, help='Number of grid points.')
+    parser.add_argument('--fwhm', type=float, default=0.3, help='Full width at half maximum of the lines in eV.')
+    parser.add_argument('--line-shape', type=str, default='gaussian', choices=line_shapes, help='Line shape.')
+    parser.add_argument('--chunk-size', type=int, default=32, help='Number of complexes broadened at once.')
+    args = parser.parse_args()
+
+    columns = ['id']
+    for i in range(n_excited_states):
+        columns.extend(['lambda_' + str(i+1), 'f_' + str(i+1)])
+    df = read_results(args.results, columns=columns)
+
+    lambdas, fs = get_stick_spectra(df)
+    grid = np.linspace(args.start, args.stop, args.n_points)
+
+    np.save(os.path.splitext(args.output)[0] + '_grid.npy', grid)
+    spectra = create_spectrum_array(args.output, len(df), len(grid))
+    broaden_spectra(lambdas, fs, grid, args.fwhm, args.line_shape, args.unit, args.chunk_size, out=spectra)
+    spectra.flush()
+
+    if args.bands is not None:
+        band_df = pd.DataFrame({'id': df['id']})
+        for region in region_boundaries.keys():
+            positions, heights, widths = get_band_maxima(spectra, grid, *get_region_bounds(region, args.unit))
+            band_df['band_max_' + region] = positions
+            band_df['band_height_' + region] = heights
+            band_df['band_width_' + region] = widths
+        band_df.to_csv(args.bands, index=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+import argparse
+import gzip
+import os
+import random
+
+from tddft_data_parser import transition_metal_identifiers
+
+
+ligand_elements = ['H', 'C', 'N', 'O', 'P', 'S', 'Cl']
+
+# orbital labels of the basis functions per element type of the basis set sizes
+basis_sets = {
+    'minimal': {
+        'ligand': ['1S', '2S', '2PX', '2PY', '2PZ'],
+        'metal': [
+            '1S', '2S', '3S', '4S', '2PX', '2PY', '2PZ', '3PX', '3PY', '3PZ',
+            '3D 0', '3D+1', '3D-1', '3D+2', '3D-2'
+        ]
+    },
+    'svp': {
+        'ligand': ['1S', '2S', '3S', '2PX', '2PY', '2PZ', '3PX', '3PY', '3PZ', '3D 0', '3D+1', '3D-1', '3D+2', '3D-2'],
+        'metal': [
+            '1S', '2S', '3S', '4S', '5S', '2PX', '2PY', '2PZ', '3PX', '3PY', '3PZ', '4PX', '4PY', '4PZ',
+            '3D 0', '3D+1', '3D-1', '3D+2', '3D-2', '4D 0', '4D+1', '4D-1', '4D+2', '4D-2',
+            '4F 0', '4F+1', '4F-1', '4F+2', '4F-2', '4F+3', '4F-3'
+        ]
+    },
+    'tzvp': {
+        'ligand': [
+            '1S', '2S', '3S', '4S', '5S', '2PX', '2PY', '2PZ', '3PX', '3PY', '3PZ', '4PX', '4PY', '4PZ',
+            '3D 0', '3D+1', '3D-1', '3D+2', '3D-2', '4D 0', '4D+1', '4D-1', '4D+2', '4D-2',
+            '4F 0', '4F+1', '4F-1', '4F+2', '4F-2', '4F+3', '4F-3'
+        ],
+        'metal': [
+            '1S', '2S', '3S', '4S', '5S', '6S', '2PX', '2PY', '2PZ', '3PX', '3PY', '3PZ',
+            '4PX', '4PY', '4PZ', '5PX', '5PY', '5PZ',
+            '3D 0', '3D+1', '3D-1', '3D+2', '3D-2', '4D 0', '4D+1', '4D-1', '4D+2', '4D-2',
+            '5D 0', '5D+1', '5D-1', '5D+2', '5D-2',
+            '4F 0', '4F+1', '4F-1', '4F+2', '4F-2', '4F+3', '4F-3',
+            '5G 0', '5G+1', '5G-1', '5G+2', '5G-2', '5G+3', '5G-3', '5G+4', '5G-4'
+        ]
+    }
+}
+
+def _get_termination_line(has_failed: bool):
+
+    """Gets the last line of a Gaussian output file.
+
+    Arguments:
+        has_failed (bool): Flag to denote whether the job has failed.
+
+    Returns:
+        str: The termination line.
+    """
+
+    if has_failed:
+        return ' Error termination via Lnk1e in /opt/g16/l914.exe at Mon Jan  1 00:00:00 2024.'
+
+    return ' Normal termination of Gaussian 16 at Mon Jan  1 00:00:00 2024.'
+
+def _get_elements(rng: random.Random, n_atoms: int, metal: str):
+
+    """Gets the element symbols of a complex with the metal as first atom.
+
+    Arguments:
+        rng (random.Random): The random number generator.
+        n_atoms (int): The number of atoms.
+        metal (str): The element symbol of the metal.
+
+    Returns:
+        list[str]: The element symbols.
+    """
+
+    return [metal] + [rng.choice(ligand_elements) for _ in range(n_atoms - 1)]
+
+def _get_filler_lines(rng: random.Random, n_lines: int):
+
+    """Gets lines that do not belong to any parsed section.
+
+    Arguments:
+        rng (random.Random): The random number generator.
+        n_lines (int): The number of lines.
+
+    Returns:
+        list[str]: The lines.
+    """
+
+    return [' SCF Done:  E(RPBE1PBE) =  %.9f     A.U. after   %2d cycles' % (rng.uniform(-3000, -500), rng.randint(10, 40)) for _ in range(n_lines)]
+
+def generate_tddft_log(rng: random.Random, n_atoms: int = 50, n_states: int = 30, n_occupied: int = 120,
+                       n_virtual: int = 400, n_filler_lines: int = 1000, has_failed: bool = False, metal: str = None):
+
+    """Generates the content of a synthetic Gaussian TD-DFT output file.
+
+    The file contains all sections read by TddftDataParser: the alpha orbital
+    eigenvalues, the Mulliken charges, the dipole moment and the excited
+    states, surrounded by filler lines and followed by the termination line.
+
+    Arguments:
+        rng (random.Random): The random number generator.
+        n_atoms (int): The number of atoms.
+        n_states (int): The number of excited states.
+        n_occupied (int): The number of occupied orbitals.
+        n_virtual (int): The number of virtual orbitals.
+        n_filler_lines (int): The number of filler lines per filler section.
+        has_failed (bool): Flag to denote whether the job has failed.
+        metal (str): The element symbol of the metal, random if None.
+
+    Returns:
+        str: The file content.
+    """
+
+    if metal is None:
+        metal = rng.choice(transition_metal_identifiers)
+    elements = _get_elements(rng, n_atoms, metal)
+
+    lines = [' Entering Gaussian System, Link 0=g16']
+    lines.extend(_get_filler_lines(rng, n_filler_lines))
+
+    # a failed job stops at a random point
+    if has_failed and rng.random() < 0.5:
+        lines.append(_get_termination_line(True))
+        return '\n'.join(lines) + '\n'
+
+    # orbital eigenvalues
+    occupied = sorted(rng.uniform(-300, -0.2) for _ in range(n_occupied))
+    virtual = sorted(rng.uniform(-0.1, 20) for _ in range(n_virtual))
+    for i in range(0, n_occupied, 5):
+        lines.append(' Alpha  occ. eigenvalues --' + ''.join('%10.5f' % _ for _ in occupied[i:i + 5]))
+    for i in range(0, n_virtual, 5):
+        lines.append(' Alpha virt. eigenvalues --' + ''.join('%10.5f' % _ for _ in virtual[i:i + 5]))
+
+    # Mulliken charges
+    lines.append(' Mulliken charges:')
+    lines.append('               1')
+    for i, element in enumerate(elements):
+        lines.append('%6d  %-2s  %10.6f' % (i + 1, element, rng.uniform(-1, 1)))
+    lines.append(' Sum of Mulliken charges =   0.00000')
+
+    # dipole moment
+    components = [rng.uniform(-10, 10) for _ in range(3)]
+    lines.append(' Dipole moment (field-independent basis, Debye):')
+    lines.append('    X=%20.4f    Y=%20.4f    Z=%20.4f  Tot=%20.4f' % (*components, sum(_ ** 2 for _ in components) ** 0.5))
+
+    lines.extend(_get_filler_lines(rng, n_filler_lines))
+
+    # excited states
+    for i in range(n_states):
+        wavelength = rng.uniform(150, 1200)
+        lines.append(' Excited State %3d:      Singlet-A     %7.4f eV  %7.2f nm  f=%.4f  <S**2>=0.000' % (i + 1, 1239.84193 / wavelength, wavelength, rng.expovariate(20)))
+        for _ in range(rng.randint(1, 4)):
+            lines.append('     %3d ->%3d        %8.5f' % (rng.randint(1, n_occupied), n_occupied + rng.randint(1, n_virtual), rng.uniform(-0.7, 0.7)))
+
+    lines.extend(_get_filler_lines(rng, n_filler_lines))
+    lines.append(_get_termination_line(has_failed))
+
+    return '\n'.join(lines) + '\n'
+
+def generate_nto_log(rng: random.Random, n_atoms: int = 50, n_columns: int = 5, n_filler_lines: int = 1000,
+                     has_failed: bool = False, metal: str = None, basis: str = 'svp'):
+
+    """Generates the content of a synthetic Gaussian NTO output file.
+
+    The file contains one block of occupied and one block of virtual NTOs in
+    the layout of the regular population analysis, each headed by an
+    'Eigenvalues --' line, followed by the termination line.
+
+    Arguments:
+        rng (random.Random): The random number generator.
+        n_atoms (int): The number of atoms.
+        n_columns (int): The number of NTOs per block.
+        n_filler_lines (int): The number of filler lines per filler section.
+        has_failed (bool): Flag to denote whether the job has failed.
+        metal (str): The element symbol of the metal, random if None.
+        basis (str): The basis set size, a key of basis_sets.
+
+    Returns:
+        str: The file content.
+    """
+
+    if metal is None:
+        metal = rng.choice(transition_metal_identifiers)
+    elements = _get_elements(rng, n_atoms, metal)
+    orbital_labels = basis_sets[basis]
+
+    lines = [' Entering Gaussian System, Link 0=g16']
+    lines.extend(_get_filler_lines(rng, n_filler_lines))
+    lines.append('     Molecular Orbital Coefficients:')
+
+    for nto_type in ['O', 'V']:
+
+        lines.append('                     ' + ''.join('%10d' % (_ + 1) for _ in range(n_columns)))
+        lines.append('                     ' + ''.join('%10s' % nto_type for _ in range(n_columns)))
+        eigenvalues = sorted((rng.random() for _ in range(n_columns)), reverse=True)
+        lines.append('     Eigenvalues --  ' + ''.join('%10.5f' % _ for _ in eigenvalues))
+
+        basis_function = 1
+        for i, element in enumerate(elements):
+            labels = orbital_labels['metal'] if element in transition_metal_identifiers else orbital_labels['ligand']
+            for j, label in enumerate(labels):
+                values = ''.join('%10.5f' % rng.uniform(-1, 1) for _ in range(n_columns))
+                if j == 0:
+                    lines.append('%4d %-3d %-2s %-7s' % (basis_function, i + 1, element, label) + values)
+                else:
+                    lines.append('%4d        %-7s' % (basis_function, label) + values)
+                basis_function += 1
+
+    lines.append('     Density Matrix:')
+    lines.extend(_get_filler_lines(rng, n_filler_lines))
+    lines.append(_get_termination_line(has_failed))
+
+    return '\n'.join(lines) + '\n'
+
+def generate_dataset(data_dir: str, n_complexes: int, n_atoms: int = 50, n_filler_lines: int = 1000,
+                     failure_rate: float = 0.05, compress: bool = False, seed: int = 0, basis: str = 'svp',
+                     n_states: int = 30):
+
+    """Writes a directory of synthetic TD-DFT (X.out) and NTO (X-vis.out) output files.
+
+    Arguments:
+        data_dir (str): The output directory.
+        n_complexes (int): The number of complexes.
+        n_atoms (int): The mean number of atoms per complex.
+        n_filler_lines (int): The number of filler lines per filler section.
+        failure_rate (float): The fraction of failed jobs.
+        compress (bool): Flag to denote whether to gzip the files.
+        seed (int): The random seed.
+        basis (str): The basis set size, a key of basis_sets.
+        n_states (int): The number of excited states.
+
+    Returns:
+        list[str]: The paths of the TD-DFT output files.
+    """
+
+    if basis not in basis_sets:
+        raise ValueError('Unknown basis set size: ' + basis)
+
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+
+    tddft_file_paths = []
+    for i in range(n_complexes):
+
+        file_id = 'SYN%06d' % i
+        metal = rng.choice(transition_metal_identifiers)
+        n = max(2, int(rng.gauss(n_atoms, n_atoms / 5)))
+
+        contents = {
+            file_id + '.out': generate_tddft_log(rng, n, n_states=n_states, n_filler_lines=n_filler_lines,
+                                                 has_failed=rng.random() < failure_rate, metal=metal),
+            file_id + '-vis.out': generate_nto_log(rng, n, n_filler_lines=n_filler_lines, has_failed=rng.random() < failure_rate,
+                                                   metal=metal, basis=basis)
+        }
+
+        for file_name, content in contents.items():
+            file_path = os.path.join(data_dir, file_name)
+            if compress:
+                with gzip.open(file_path + '.gz', 'wt') as fh:
+                    fh.write(content)
+            else:
+                with open(file_path, 'w') as fh:
+                    fh.write(content)
+
+        tddft_file_paths.append(os.path.join(data_dir, file_id + '.out' + ('.gz' if compress else '')))
+
+    return tddft_file_paths
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Generates synthetic Gaussian TD-DFT and NTO output files.')
+    parser.add_argument('data_dir', help='Output directory.')
+    parser.add_argument('-n', '--n-complexes', type=int, default=100, help='Number of complexes.')
+    parser.add_argument('--n-atoms', type=int, default=50, help='Mean number of atoms per complex.')
+    parser.add_argument('--n-filler-lines', type=int, default=1000, help='Number of filler lines per filler section.')
+    parser.add_argument('--failure-rate', type=float, default=0.05, help='Fraction of failed jobs.')
+    parser.add_argument('--compress', action='store_true', help='Gzip the output files.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--basis', default='svp', choices=list(basis_sets.keys()), help='Basis set size, i.e. the number of basis functions per atom.')
+    parser.add_argument('--n-states', type=int, default=30, help='Number of excited states.')
+    args = parser.parse_args()
+
+    generate_dataset(args.data_dir, args.n_complexes, args.n_atoms, args.n_filler_lines, args.failure_rate, args.compress, args.seed,
+                     args.basis, args.n_states)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,11 @@
 import re
 
+import numpy as np
+
+from file_utils import get_file_id, get_source_name, has_normal_termination, open_text
+from quarantine import MalformedOutputError
+from section_index import open_section_index
+
 
 transition_metal_identifiers = [
     'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe', 'Co', 'Ni', 'Cu', 'Zn',
@@ -7,35 +13,88 @@ transition_metal_identifiers = [
     'La', 'Hf', 'Ta', 'W', 'Re', 'Os', 'Ir', 'Pt', 'Au', 'Hg'
 ]
 
+eigenvalue_pattern = re.compile('-{0,1}[0-9]{1,}.[0-9]{1,}')
+
+# wavelength boundaries of the UV, Vis and nIR regions in nm, Vis includes both
+uv_vis_boundary = 350
+vis_nir_boundary = 825
+
+# minimum oscillator strength of a band maximum
+f_max_threshold = 0.01
+
+# anchors of the sections that are extracted
+excited_state_anchor = 'Excited State'
+occupied_eigenvalue_anchor = 'Alpha  occ. eigenvalues'
+virtual_eigenvalue_anchor = 'Alpha virt. eigenvalues'
+mulliken_anchor = 'Mulliken charges:'
+dipole_anchor = 'Dipole moment (field-independent basis, Debye)'
+section_anchors = [
+    excited_state_anchor, occupied_eigenvalue_anchor, virtual_eigenvalue_anchor, mulliken_anchor, dipole_anchor
+]
+
+# parser states for multi-line sections
+_NONE = 0
+_HEADER = 1
+_BODY = 2
+
 class TddftDataParser():
 
     """Parser class for TD-DFT output files."""
 
-    def __init__(self, file_path):
+    def __init__(self, file_path, file_id: str = None):
 
-        self._id = file_path.split('/')[-1].split('.')[0]
+        self._file_path = file_path
 
-        with open(file_path, 'r') as fh:
-            self.lines = fh.read().strip().split('\n')
+        if file_id is None:
+            file_id = get_file_id(get_source_name(file_path))
+        self._id = file_id
 
     def parse(self):
 
         """Parses the given TD-DFT output file.
+
+        Uncompressed files given by path are memory-mapped and only the lines
+        around the section anchors are decoded. Compressed files and streams
+        are read line by line.
         """
 
         return_dict = {'id': self._id}
 
-        if self._has_failed():
+        # reject failed jobs before reading the whole file
+        terminated_normally = has_normal_termination(self._file_path)
+        if terminated_normally is False:
+            return_dict['has_failed'] = True
+            return return_dict
+
+        if terminated_normally:
+            with open_section_index(self._file_path, section_anchors) as index:
+                data = self._parse_index(index)
+        else:
+            with open_text(self._file_path) as fh:
+                data = self._parse_lines(fh)
+
+        if data['has_failed']:
             return_dict['has_failed'] = True
             return return_dict
         else:
             return_dict['has_failed'] = False
 
-        return_dict['homo_lumo_gap'] = self._parse_homo_lumo_gap()
-        return_dict['dipole_moment'] = self._parse_dipole_moment()
-        return_dict['metal_charge'] = self._parse_metal_charge()
+        # every TMC has a metal, a missing charge means a missing or truncated Mulliken block
+        if data['metal_charge'] is None:
+            raise MalformedOutputError('metal_missing', 'No metal found in the Mulliken charges.')
+
+        # a missing occupied or virtual eigenvalue listing leaves the gap undefined
+        if data['homo_lumo_gap'] is None:
+            raise MalformedOutputError('eigenvalues_missing', 'No occupied or virtual eigenvalues found.')
+
+        spec = data['spectrum']
+        if len(spec[0]) == 0:
+            raise MalformedOutputError('excited_states_missing', 'No excited states found.')
+
+        return_dict['homo_lumo_gap'] = data['homo_lumo_gap']
+        return_dict['dipole_moment'] = data['dipole_moment']
+        return_dict['metal_charge'] = data['metal_charge']
 
-        spec = self._parse_spectrum()
         for i in range(len(spec[0])):
             return_dict['lambda_' + str(i+1)] = spec[0][i]
             return_dict['f_' + str(i+1)] = spec[1][i]
@@ -59,95 +118,287 @@ class TddftDataParser():
 
         return return_dict
 
-    def _has_failed(self):
+    def parse_raw(self):
 
-        """Checks if the job has failed.
+        """Parses all raw quantities of the given TD-DFT output file.
+
+        Unlike parse(), nothing is reduced: all excited states, the complete
+        first listing of alpha eigenvalues and the complete first Mulliken
+        charge block are returned. The file is read line by line in a single
+        pass.
 
         Returns:
-            bool: The flag indicating whether the job has failed.
+            dict: The id, has_failed and, for jobs that terminated normally,
+                the arrays excitation_energies (eV), wavelengths (nm),
+                oscillator_strengths, occupied_eigenvalues,
+                virtual_eigenvalues (Hartree), mulliken_atom_indices,
+                mulliken_elements and mulliken_charges.
         """
 
-        if 'Normal termination' not in self.lines[-1]:
-            return True
+        return_dict = {'id': self._id}
 
-        return False
+        # reject failed jobs before reading the whole file
+        if has_normal_termination(self._file_path) is False:
+            return_dict['has_failed'] = True
+            return return_dict
 
-    def _parse_spectrum(self):
+        with open_text(self._file_path) as fh:
+            data = self._parse_raw_lines(fh)
 
-        """Parses the spectrum from the output file.
+        return_dict['has_failed'] = data.pop('has_failed')
+        if return_dict['has_failed']:
+            return return_dict
 
-        Returns:
-            list[list[float]]: The parsed spectrum.
-        """
+        if len(data['mulliken_charges']) == 0:
+            raise MalformedOutputError('mulliken_missing', 'No Mulliken charges found.')
+        if len(data['wavelengths']) == 0:
+            raise MalformedOutputError('excited_states_missing', 'No excited states found.')
 
-        nms = []
-        os = []
-        for line in self.lines:
-            if 'Excited State' in line:
-                nms.append(float(line.split()[6]))
-                os.append(float(line.split()[8].replace('f=', '')))
+        return_dict['excitation_energies'] = np.array(data['excitation_energies'], dtype=np.float64)
+        return_dict['wavelengths'] = np.array(data['wavelengths'], dtype=np.float64)
+        return_dict['oscillator_strengths'] = np.array(data['oscillator_strengths'], dtype=np.float64)
+        return_dict['occupied_eigenvalues'] = np.array(data['occupied_eigenvalues'], dtype=np.float64)
+        return_dict['virtual_eigenvalues'] = np.array(data['virtual_eigenvalues'], dtype=np.float64)
+        return_dict['mulliken_atom_indices'] = np.array(data['mulliken_atom_indices'], dtype=np.int32)
+        return_dict['mulliken_elements'] = np.array(data['mulliken_elements'], dtype=str)
+        return_dict['mulliken_charges'] = np.array(data['mulliken_charges'], dtype=np.float64)
 
-        spec = [nms, os]
+        return return_dict
 
-        return spec
+    def _parse_raw_lines(self, lines):
 
-    def _parse_metal_charge(self):
+        """Extracts all raw quantities from the output file in a single pass.
 
-        """ Parses the metal charge the output file.
+        Arguments:
+            lines (Iterable[str]): The lines of the output file.
 
         Returns:
-            float: The metal charge.
+            dict: The lists of excited state, eigenvalue and Mulliken charge
+                values and the termination status.
         """
 
-        for i, line in enumerate(self.lines):
+        data = {
+            'excitation_energies': [],
+            'wavelengths': [],
+            'oscillator_strengths': [],
+            'occupied_eigenvalues': [],
+            'virtual_eigenvalues': [],
+            'mulliken_atom_indices': [],
+            'mulliken_elements': [],
+            'mulliken_charges': []
+        }
+
+        # states of multi-line sections, only the first of each is read
+        mulliken_state = _NONE
+        eigenvalue_state = _NONE
+
+        last_line = ''
+        for line in lines:
+
+            if not line.isspace():
+                last_line = line
+
+            if mulliken_state == _HEADER:
+                mulliken_state = _BODY
+                continue
+
+            if mulliken_state == _BODY:
+                line_split = line.split()
+                if len(line_split) == 3:
+                    data['mulliken_atom_indices'].append(int(line_split[0]))
+                    data['mulliken_elements'].append(line_split[1])
+                    data['mulliken_charges'].append(float(line_split[2]))
+                    continue
+                mulliken_state = _NONE
+
+            if excited_state_anchor in line:
+                line_split = line.split()
+                data['excitation_energies'].append(float(line_split[4]))
+                data['wavelengths'].append(float(line_split[6]))
+                data['oscillator_strengths'].append(float(line_split[8].replace('f=', '')))
+
+            elif occupied_eigenvalue_anchor in line or virtual_eigenvalue_anchor in line:
+                if eigenvalue_state != _BODY and len(data['occupied_eigenvalues']) == 0:
+                    eigenvalue_state = _BODY
+                if eigenvalue_state == _BODY:
+                    values = [float(_) for _ in eigenvalue_pattern.findall(line)]
+                    if occupied_eigenvalue_anchor in line:
+                        data['occupied_eigenvalues'].extend(values)
+                    else:
+                        data['virtual_eigenvalues'].extend(values)
+                continue
+
+            elif len(data['mulliken_charges']) == 0 and mulliken_anchor in line:
+                mulliken_state = _HEADER
+
+            # the first eigenvalue listing ends with the first other line
+            if eigenvalue_state == _BODY:
+                eigenvalue_state = _NONE
+
+        data['has_failed'] = 'Normal termination' not in last_line
+
+        return data
+
+    def _parse_lines(self, lines):
+
+        """Extracts all quantities from the output file in a single pass.
+
+        The lines are consumed one at a time so that the file never has to be
+        held in memory as a whole. Sections that span multiple lines (Mulliken
+        charges, dipole moment) are tracked with a small state machine.
+
+        Arguments:
+            lines (Iterable[str]): The lines of the output file.
+
+        Returns:
+            dict: The spectrum, HOMO-LUMO gap, dipole moment, metal charge and
+                termination status.
+        """
 
-            if 'Mulliken charges:' in line:
+        nms = []
+        os = []
+        last_occ = None
+        first_vir = None
+        metal_charge = None
+        dipole_moment = None
 
-                j = i + 1
-                while len(self.lines[j+1].split()) == 3:
+        # states of multi-line sections
+        mulliken_state = _NONE
+        dipole_state = _NONE
 
-                    j += 1
-                    line_split = self.lines[j].split()
+        last_line = ''
+        for line in lines:
+
+            if not line.isspace():
+                last_line = line
+
+            if mulliken_state == _HEADER:
+                mulliken_state = _BODY
+                continue
+
+            if mulliken_state == _BODY:
+                line_split = line.split()
+                if len(line_split) == 3:
                     if line_split[1] in transition_metal_identifiers:
-                        return float(line_split[2])
+                        metal_charge = float(line_split[2])
+                        mulliken_state = _NONE
+                    continue
+                mulliken_state = _NONE
 
-        print('No metal found.')
+            if dipole_state == _BODY:
+                dipole_moment = float(line.split()[7])
+                dipole_state = _NONE
 
-    def _parse_homo_lumo_gap(self):
+            if excited_state_anchor in line:
+                line_split = line.split()
+                nms.append(float(line_split[6]))
+                os.append(float(line_split[8].replace('f=', '')))
 
-        """ Parses the HOMO-LUMO gap from the output file.
+            elif occupied_eigenvalue_anchor in line:
+                values = eigenvalue_pattern.findall(line)
+                if len(values) > 0:
+                    last_occ = values[-1]
 
-        Returns:
-            float: The HOMO-LUMO gap.
-        """
+            elif virtual_eigenvalue_anchor in line:
+                if first_vir is None:
+                    values = eigenvalue_pattern.findall(line)
+                    if len(values) > 0:
+                        first_vir = values[0]
+
+            elif metal_charge is None and mulliken_anchor in line:
+                mulliken_state = _HEADER
 
-        occ = []
-        vir = []
-        for i, line in enumerate(self.lines):
+            elif dipole_moment is None and dipole_anchor in line:
+                dipole_state = _BODY
 
-            if 'Alpha  occ. eigenvalues' in line:
-                line_split = re.findall('-{0,1}[0-9]{1,}.[0-9]{1,}', line)
-                occ.extend([float(entry) for entry in line_split])
+        homo_lumo_gap = None
+        if first_vir is not None and last_occ is not None:
+            homo_lumo_gap = float(first_vir) - float(last_occ)
 
-            if 'Alpha virt. eigenvalues' in line:
-                line_split = re.findall('-{0,1}[0-9]{1,}.[0-9]{1,}', line)
-                vir.extend([float(entry) for entry in line_split])
+        return {
+            'has_failed': 'Normal termination' not in last_line,
+            'homo_lumo_gap': homo_lumo_gap,
+            'dipole_moment': dipole_moment,
+            'metal_charge': metal_charge,
+            'spectrum': [nms, os]
+        }
 
-        return vir[0] - occ[-1]
+    def _parse_index(self, index):
 
-    def _parse_dipole_moment(self):
+        """Extracts all quantities from the indexed sections of the output file.
 
-        """ Parses the dipole moment from the output file.
+        Gives the same results as _parse_lines() but decodes only the lines of
+        the sections that are needed.
+
+        Arguments:
+            index (SectionIndex): The section index of the output file.
 
         Returns:
-            float: The dipole moment.
+            dict: The spectrum, HOMO-LUMO gap, dipole moment, metal charge and
+                termination status.
         """
 
-        for i, line in enumerate(self.lines):
-
-            if 'Dipole moment (field-independent basis, Debye)' in line:
-                line_split = self.lines[i + 1].split()
-                return float(line_split[7])
+        nms = []
+        os = []
+        for offset in index.get_offsets(excited_state_anchor):
+            line_split = index.get_line(offset).split()
+            nms.append(float(line_split[6]))
+            os.append(float(line_split[8].replace('f=', '')))
+
+        # last occupied eigenvalue
+        last_occ = None
+        for offset in reversed(index.get_offsets(occupied_eigenvalue_anchor)):
+            values = eigenvalue_pattern.findall(index.get_line(offset))
+            if len(values) > 0:
+                last_occ = values[-1]
+                break
+
+        # first virtual eigenvalue
+        first_vir = None
+        for offset in index.get_offsets(virtual_eigenvalue_anchor):
+            values = eigenvalue_pattern.findall(index.get_line(offset))
+            if len(values) > 0:
+                first_vir = values[0]
+                break
+
+        # first metal charge, blocks without metal are skipped
+        metal_charge = None
+        for offset in index.get_offsets(mulliken_anchor):
+            lines = index.iter_lines(offset)
+            # skip anchor and column header
+            next(lines, None)
+            next(lines, None)
+            for _, line in lines:
+                line_split = line.split()
+                if len(line_split) != 3:
+                    break
+                if line_split[1] in transition_metal_identifiers:
+                    metal_charge = float(line_split[2])
+                    break
+            if metal_charge is not None:
+                break
+
+        # first dipole moment, given in the line after the anchor
+        dipole_moment = None
+        dipole_offsets = index.get_offsets(dipole_anchor)
+        if len(dipole_offsets) > 0:
+            lines = index.iter_lines(dipole_offsets[0])
+            next(lines, None)
+            line = next(lines, None)
+            if line is not None:
+                dipole_moment = float(line[1].split()[7])
+
+        homo_lumo_gap = None
+        if first_vir is not None and last_occ is not None:
+            homo_lumo_gap = float(first_vir) - float(last_occ)
+
+        return {
+            'has_failed': 'Normal termination' not in index.get_last_line(),
+            'homo_lumo_gap': homo_lumo_gap,
+            'dipole_moment': dipole_moment,
+            'metal_charge': metal_charge,
+            'spectrum': [nms, os]
+        }
 
     def _split_spectrum_into_uv_vis_nir(self, spec: list):
 
@@ -168,13 +419,13 @@ class TddftDataParser():
 
         for nm, o in zip(spec[0], spec[1]):
 
-            if nm < 350:
+            if nm < uv_vis_boundary:
                 spec_uv[0].append(nm)
                 spec_uv[1].append(o)
-            elif nm >= 350 and nm <= 825:
+            elif nm >= uv_vis_boundary and nm <= vis_nir_boundary:
                 spec_vis[0].append(nm)
                 spec_vis[1].append(o)
-            elif nm > 825:
+            elif nm > vis_nir_boundary:
                 spec_nir[0].append(nm)
                 spec_nir[1].append(o)
 
@@ -202,8 +453,8 @@ class TddftDataParser():
         # peak broadness
         sigma_max = (max(spec[0]) - min(spec[0])) * len(spec[0])
 
-        # return None if maximum excitation is less than 0.01
-        if f_max < 0.01:
+        # return None if maximum excitation is less than the threshold
+        if f_max < f_max_threshold:
             return None, None, None
 
         return lambda_max, f_max, sigma_max
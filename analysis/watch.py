@@ -0,0 +1,416 @@
+import argparse
+import contextlib
+import os
+import time
+
+import pandas as pd
+
+from analyze import is_excluded, iter_results
+from discovery import get_output_file_key, iter_output_files
+from file_utils import get_file_id, has_normal_termination, read_tail
+from merge import merge_results
+from quarantine import write_quarantine_report
+from result_cache import ResultCache
+from result_writer import get_result_writer, read_results, result_columns
+from profiling import null_profiler
+from tddft_data_parser import TddftDataParser
+
+
+def get_job_status(file_path: str):
+
+    """Gets the termination status of a Gaussian output file from its tail.
+
+    Arguments:
+        file_path (str): The path to the file.
+
+    Returns:
+        str: 'normal' or 'error' if the job has terminated, 'unknown' for
+            compressed files, whose tail cannot be read cheaply, or None if
+            the job has not terminated yet.
+    """
+
+    is_normal = has_normal_termination(file_path)
+
+    if is_normal is None:
+        return 'unknown'
+    if is_normal:
+        return 'normal'
+    if 'Error termination' in read_tail(file_path):
+        return 'error'
+
+    return None
+
+
+def needs_nto_file(tddft_file_path: str):
+
+    """Checks if a TMC can only be analyzed with its NTO output file.
+
+    NTO jobs are only run for TMCs with a band in the Vis region, excluded
+    TMCs and TMCs without Vis band are analyzed from their TD-DFT output
+    file alone.
+
+    Arguments:
+        tddft_file_path (str): The path to the TD-DFT output file.
+
+    Returns:
+        bool: The flag indicating whether the NTO output file is needed,
+            False if the TD-DFT output file cannot be parsed, which is then
+            quarantined by the analysis.
+    """
+
+    try:
+        tddft_result_dict = TddftDataParser(tddft_file_path).parse()
+    except Exception:
+        return False
+
+    return not is_excluded(tddft_result_dict) and tddft_result_dict['lambda_max_vis'] is not None
+
+def _get_complex_id(file_name: str):
+
+    return get_file_id(get_output_file_key(file_name)[0])
+
+
+class _WatchedFile():
+
+    """Size, modification time and status of an output file at the last poll."""
+
+    def __init__(self, size: int, mtime: float):
+
+        self.size = size
+        self.mtime = mtime
+        self.status = None
+        self.is_checked = False
+        self.complete_time = None
+        self.needs_nto = None
+
+
+class DirectoryWatcher():
+
+    """Polls a directory tree for TD-DFT and NTO output files of finished jobs.
+
+    An output file is complete once its job has terminated and its size has
+    not changed since the previous poll, or, when it is seen for the first
+    time, since its modification time is older than the settle time. Files
+    of jobs that were killed never terminate and are considered complete
+    once they have not changed for stale_after seconds.
+
+    A TMC is ready once its TD-DFT and NTO output files are complete. TD-DFT
+    jobs that terminated with an error are ready without NTO output file, as
+    are TMCs that need no NTO job, see needs_nto_file(), and TD-DFT output
+    files whose NTO output file has not appeared within nto_timeout seconds
+    after their completion.
+    """
+
+    def __init__(self, data_dir: str, settle_time: float = 10, nto_timeout: float = 3600, stale_after: float = None,
+                 done_ids: set = None):
+
+        self._data_dir = data_dir
+        self._settle_time = settle_time
+        self._nto_timeout = nto_timeout
+        self._stale_after = stale_after
+
+        self._files = {}
+        self._done_ids = set() if done_ids is None else set(done_ids)
+
+    def mark_done(self, complex_ids: list[str]):
+
+        """Excludes TMCs from all further polls.
+
+        Arguments:
+            complex_ids (list[str]): The IDs of the TMCs.
+        """
+
+        for complex_id in complex_ids:
+            self._done_ids.add(complex_id)
+
+        self._files = {path: _ for path, _ in self._files.items() if _get_complex_id(os.path.basename(path)) not in self._done_ids}
+
+    def _is_complete(self, path: str, now: float):
+
+        """Updates the state of an output file and checks if it is complete.
+
+        Arguments:
+            path (str): The path to the file.
+            now (float): The time of the poll.
+
+        Returns:
+            bool: The flag indicating whether the file is complete.
+        """
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+
+        watched_file = self._files.get(path)
+        is_new = watched_file is None
+
+        if is_new or watched_file.size != stat.st_size or watched_file.mtime != stat.st_mtime:
+            watched_file = _WatchedFile(stat.st_size, stat.st_mtime)
+            self._files[path] = watched_file
+            if not is_new or now - stat.st_mtime < self._settle_time:
+                return False
+
+        # the status of an unchanged file is read once
+        if not watched_file.is_checked:
+            watched_file.status = get_job_status(path)
+            watched_file.is_checked = True
+
+        is_stale = self._stale_after is not None and now - watched_file.mtime >= self._stale_after
+        if watched_file.status is None and not is_stale:
+            return False
+
+        if watched_file.complete_time is None:
+            watched_file.complete_time = now
+
+        return True
+
+    def poll(self, now: float = None):
+
+        """Walks the directory tree once and gets the TMCs that are ready.
+
+        Arguments:
+            now (float): The time of the poll, the current time if None.
+
+        Returns:
+            list[tuple]: The TD-DFT and NTO file path pairs of the ready TMCs,
+                the NTO file path is None if there is none.
+        """
+
+        if now is None:
+            now = time.time()
+
+        file_paths = {}
+        for path, name in iter_output_files(self._data_dir):
+            key, is_nto = get_output_file_key(name)
+            if _get_complex_id(name) in self._done_ids:
+                continue
+            # the first file found for a key is used
+            file_paths.setdefault((key, is_nto), path)
+
+        # forget files that have disappeared
+        seen_paths = set(file_paths.values())
+        self._files = {path: _ for path, _ in self._files.items() if path in seen_paths}
+
+        ready_pairs = []
+        for (key, is_nto), tddft_file_path in file_paths.items():
+
+            if is_nto or not self._is_complete(tddft_file_path, now):
+                continue
+
+            nto_file_path = file_paths.get((key, True))
+            tddft_file = self._files[tddft_file_path]
+
+            if nto_file_path is not None and self._is_complete(nto_file_path, now):
+                ready_pairs.append((tddft_file_path, nto_file_path))
+            elif tddft_file.status == 'error':
+                ready_pairs.append((tddft_file_path, None))
+            elif nto_file_path is None:
+                # the TD-DFT output file is parsed once to check if an NTO job is expected
+                if tddft_file.needs_nto is None:
+                    tddft_file.needs_nto = needs_nto_file(tddft_file_path)
+                if not tddft_file.needs_nto or now - tddft_file.complete_time >= self._nto_timeout:
+                    ready_pairs.append((tddft_file_path, None))
+
+        return sorted(ready_pairs)
+
+
+class SolvatochromismAppender():
+
+    """Appends rows to the merged gas phase and acetone table as results arrive.
+
+    Results are kept until the result of the other phase arrives. On
+    construction the results of both phases that are not merged yet are
+    read from the existing result files.
+
+    Raises:
+        ValueError: If the existing merged table has other columns.
+    """
+
+    def __init__(self, merged_path: str, gasphase_path: str, acetone_path: str):
+
+        self._merged_path = merged_path
+
+        # columns of the merged table, in the order of an existing file
+        empty_df = pd.DataFrame(columns=result_columns)
+        self._merged_columns = merge_results(empty_df, empty_df).columns.tolist()
+
+        self._merged_ids = set()
+        if os.path.isfile(merged_path) and os.path.getsize(merged_path) > 0:
+            columns = pd.read_csv(merged_path, nrows=0).columns.tolist()
+            if sorted(columns) != sorted(self._merged_columns):
+                raise ValueError('Cannot append to a merged table with different columns: ' + merged_path)
+            self._merged_columns = columns
+            self._merged_ids = set(pd.read_csv(merged_path, usecols=['id'])['id'].astype(str))
+
+        self._pending = {'gasphase': {}, 'acetone': {}}
+        for phase, file_path in [('gasphase', gasphase_path), ('acetone', acetone_path)]:
+            if os.path.isfile(file_path) and os.path.getsize(file_path) > 0:
+                df = read_results(file_path, round_trip=True)
+                df = df[~df['id'].astype(str).isin(self._merged_ids)]
+                for result_dict in df.to_dict('records'):
+                    self._pending[phase][str(result_dict['id'])] = result_dict
+
+    def add(self, phase: str, result_dicts: list[dict]):
+
+        """Adds the results of one phase.
+
+        Arguments:
+            phase (str): The phase ('gasphase' or 'acetone').
+            result_dicts (list[dict]): The result dicts, None for excluded TMCs.
+        """
+
+        for result_dict in result_dicts:
+            if result_dict is not None and result_dict['id'] not in self._merged_ids:
+                self._pending[phase][result_dict['id']] = result_dict
+
+    def flush(self):
+
+        """Appends the TMCs whose results of both phases have arrived.
+
+        Returns:
+            int: The number of rows appended.
+        """
+
+        complex_ids = sorted(set(self._pending['gasphase']) & set(self._pending['acetone']))
+        if len(complex_ids) == 0:
+            return 0
+
+        base_df = pd.DataFrame([self._pending['gasphase'].pop(_) for _ in complex_ids], columns=result_columns)
+        acetone_df = pd.DataFrame([self._pending['acetone'].pop(_) for _ in complex_ids], columns=result_columns)
+        df = merge_results(base_df, acetone_df)
+
+        is_new = not os.path.isfile(self._merged_path) or os.path.getsize(self._merged_path) == 0
+        df[self._merged_columns].to_csv(self._merged_path, mode='a', header=is_new, index=False)
+
+        self._merged_ids.update(complex_ids)
+
+        return len(df)
+
+def read_done_ids(output_path: str):
+
+    """Gets the IDs of the TMCs already in a result file.
+
+    Arguments:
+        output_path (str): The path to the result CSV file.
+
+    Returns:
+        set[str]: The IDs.
+    """
+
+    if not os.path.isfile(output_path) or os.path.getsize(output_path) == 0:
+        return set()
+
+    return set(pd.read_csv(output_path, usecols=['id'])['id'].astype(str))
+
+def ingest(file_pairs: list[tuple], output_path: str, n_workers: int = 1, cache: ResultCache = None, quarantine: list = None):
+
+    """Analyzes file pairs and appends their results to a result file.
+
+    Arguments:
+        file_pairs (list[tuple]): The TD-DFT and NTO file path pairs.
+        output_path (str): The path to the result CSV file.
+        n_workers (int): The number of worker processes.
+        cache (ResultCache): The result cache.
+        quarantine (list): List to which the entries of files that could not
+            be processed are appended, see QuarantineError.get_entry().
+
+    Returns:
+        list[dict]: The result dicts, None for excluded TMCs.
+    """
+
+    result_dicts = list(iter_results(file_pairs, n_workers, cache, null_profiler, quarantine))
+    if cache is not None:
+        cache.commit()
+
+    with get_result_writer(output_path, append=True) as writer:
+        for result_dict in result_dicts:
+            if result_dict is not None:
+                writer.write(result_dict)
+
+    return result_dicts
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Polls directories of running Gaussian jobs and appends the results of finished TMCs.')
+    parser.add_argument('data_dir', help='Directory containing the gas phase Gaussian output files.')
+    parser.add_argument('-o', '--output', default=None, help='Result CSV file to append to, by default named after the directory.')
+    parser.add_argument('--acetone-dir', default=None, help='Directory containing the acetone Gaussian output files.')
+    parser.add_argument('--acetone-output', default=None, help='Acetone result CSV file to append to, by default named after the directory.')
+    parser.add_argument('--merged', default=None, help='Merged solvatochromism CSV file to append to, requires --acetone-dir.')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Number of worker processes (0 uses all cores).')
+    parser.add_argument('--cache', default=None, help='Path to a result cache, avoids analyzing excluded TMCs again after a restart.')
+    parser.add_argument('--interval', type=float, default=10, help='Seconds between polls.')
+    parser.add_argument('--settle-time', type=float, default=None, help='Seconds since the last modification after which a file seen for the first time counts as stable, by default the interval.')
+    parser.add_argument('--nto-timeout', type=float, default=3600, help='Seconds to wait for the NTO output file of a finished TD-DFT job.')
+    parser.add_argument('--stale-after', type=float, default=None, help='Seconds without change after which an output file without termination message counts as finished.')
+    parser.add_argument('--quarantine', default=None, help='CSV file to append the output files that could not be processed to.')
+    parser.add_argument('--once', action='store_true', help='Poll once and exit.')
+    args = parser.parse_args()
+
+    if args.merged is not None and args.acetone_dir is None:
+        parser.error('--merged requires --acetone-dir.')
+
+    n_workers = args.workers if args.workers > 0 else os.cpu_count()
+    settle_time = args.interval if args.settle_time is None else args.settle_time
+
+    phases = [('gasphase', args.data_dir.strip(), args.output)]
+    if args.acetone_dir is not None:
+        phases.append(('acetone', args.acetone_dir.strip(), args.acetone_output))
+
+    watchers = []
+    for phase, data_dir, output_path in phases:
+        if output_path is None:
+            output_path = 'df_' + data_dir.replace('/', '') + '.csv'
+        if os.path.splitext(output_path)[1] != '.csv':
+            parser.error('Results can only be appended to CSV files.')
+        watcher = DirectoryWatcher(data_dir, settle_time, args.nto_timeout, args.stale_after, read_done_ids(output_path))
+        watchers.append((phase, watcher, output_path))
+
+    appender = None
+    if args.merged is not None:
+        try:
+            appender = SolvatochromismAppender(args.merged, watchers[0][2], watchers[1][2])
+        except ValueError as e:
+            parser.error(str(e))
+
+    with contextlib.ExitStack() as stack:
+
+        cache = None
+        if args.cache is not None:
+            cache = stack.enter_context(ResultCache(args.cache))
+
+        try:
+            while True:
+
+                for phase, watcher, output_path in watchers:
+                    file_pairs = watcher.poll()
+                    if len(file_pairs) == 0:
+                        continue
+                    quarantine = []
+                    result_dicts = ingest(file_pairs, output_path, n_workers, cache, quarantine)
+                    watcher.mark_done([get_file_id(tddft_file_path) for tddft_file_path, _ in file_pairs])
+                    if appender is not None:
+                        appender.add(phase, result_dicts)
+                    n_results = sum(_ is not None for _ in result_dicts)
+                    print(time.strftime('%H:%M:%S') + ' ' + phase + ': ' + str(n_results) + ' of ' + str(len(file_pairs)) + ' finished TMCs appended to ' + output_path + '.')
+                    if len(quarantine) > 0:
+                        print(time.strftime('%H:%M:%S') + ' ' + phase + ': ' + str(len(quarantine)) + ' output files quarantined.')
+                        if args.quarantine is not None:
+                            write_quarantine_report(quarantine, args.quarantine, append=True)
+
+                if appender is not None:
+                    n_rows = appender.flush()
+                    if n_rows > 0:
+                        print(time.strftime('%H:%M:%S') + ' ' + str(n_rows) + ' rows appended to ' + args.merged + '.')
+
+                if args.once:
+                    break
+                time.sleep(args.interval)
+
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
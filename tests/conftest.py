@@ -0,0 +1,6 @@
+import os
+import sys
+
+
+# the analysis scripts import their siblings directly
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'analysis'))
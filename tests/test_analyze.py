@@ -0,0 +1,63 @@
+import os
+import tarfile
+
+import pytest
+
+from analyze import analyze_complex, iter_archive_results, iter_results
+from synthetic_logs import generate_dataset
+
+
+def _corrupt_nto_type_line(file_path: str):
+
+    with open(file_path, 'r') as fh:
+        lines = fh.readlines()
+
+    # the first type line holds only the O labels of the occupied block
+    for i, line in enumerate(lines):
+        if line.split() != [] and set(line.split()) == {'O'}:
+            lines[i] = line.replace('O', 'X')
+            break
+
+    with open(file_path, 'w') as fh:
+        fh.writelines(lines)
+
+@pytest.fixture
+def data_dir(tmp_path):
+
+    data_dir = str(tmp_path / 'data')
+    generate_dataset(data_dir, 2, n_atoms=6, n_filler_lines=5, failure_rate=0, seed=3)
+    _corrupt_nto_type_line(os.path.join(data_dir, 'SYN000001-vis.out'))
+
+    return data_dir
+
+@pytest.mark.parametrize('member_names', [
+    ['SYN000001-vis.out', 'SYN000000.out', 'SYN000000-vis.out', 'SYN000001.out'],
+    ['SYN000000-vis.out', 'SYN000000.out', 'SYN000001-vis.out', 'SYN000001.out']
+])
+def test_archive_quarantined_nto_excludes_complex(data_dir, tmp_path, member_names):
+
+    archive_path = str(tmp_path / 'data.tar')
+    with tarfile.open(archive_path, 'w') as tar:
+        for member_name in member_names:
+            tar.add(os.path.join(data_dir, member_name), member_name)
+
+    quarantine = []
+    results = dict(iter_archive_results(archive_path, quarantine=quarantine))
+
+    expected = analyze_complex(os.path.join(data_dir, 'SYN000000.out'), os.path.join(data_dir, 'SYN000000-vis.out'))
+    assert expected is not None and expected['transition_nature_vis'] is not None
+    assert results['SYN000000.out'] == expected
+    assert results['SYN000001.out'] is None
+    assert [_[1:3] for _ in quarantine] == [('nto_parse', 'nto_type_unknown')]
+
+@pytest.mark.parametrize('max_pending', [1, 3, None])
+def test_parallel_results_keep_input_order(tmp_path, max_pending):
+
+    data_dir = str(tmp_path / 'data')
+    generate_dataset(data_dir, 12, n_atoms=6, n_filler_lines=5, failure_rate=0.2, seed=5)
+    file_pairs = [
+        (os.path.join(data_dir, 'SYN%06d.out' % i), os.path.join(data_dir, 'SYN%06d-vis.out' % i)) for i in range(12)
+    ]
+
+    expected = list(iter_results(file_pairs))
+    assert list(iter_results(file_pairs, n_workers=3, max_pending=max_pending)) == expected
@@ -0,0 +1,26 @@
+import os
+
+import numpy as np
+
+from nto_analysis import get_metal_ligand_ratios, get_nto_decompositions
+from nto_data_parser import NtoDataParser
+from synthetic_logs import generate_dataset
+
+
+def test_unknown_orbital_labels_keep_metal_ligand_ratios(tmp_path):
+
+    data_dir = str(tmp_path / 'data')
+    generate_dataset(data_dir, 1, n_atoms=6, n_filler_lines=5, failure_rate=0, seed=3)
+    nto_datas = [NtoDataParser(os.path.join(data_dir, 'SYN000000-vis.out')).parse()['occupied_nto']]
+    metal_ratios, ligand_ratios = get_metal_ligand_ratios(nto_datas)
+    shell_ratios = get_nto_decompositions(nto_datas)['metal_shell_ratios']
+
+    # relabel the basis functions of the first orbital label
+    unknown = nto_datas[0].orbital_labels.astype(object)
+    unknown[0] = '1Q'
+    nto_datas[0].orbital_labels = unknown.astype(str)
+
+    decompositions = get_nto_decompositions(nto_datas)
+    assert np.array_equal(decompositions['metal_ratios'], metal_ratios)
+    assert np.array_equal(decompositions['ligand_ratios'], ligand_ratios)
+    assert np.all(decompositions['metal_shell_ratios'] <= shell_ratios)
@@ -0,0 +1,33 @@
+import gzip
+import os
+import shutil
+
+import numpy as np
+
+from nto_data_parser import NtoDataParser
+from synthetic_logs import generate_dataset
+
+
+def test_first_blocks_are_read_from_plain_and_compressed_files(tmp_path):
+
+    data_dir = str(tmp_path / 'data')
+    generate_dataset(data_dir, 1, n_atoms=6, n_filler_lines=5, failure_rate=0, seed=3)
+    file_path = os.path.join(data_dir, 'SYN000000-vis.out')
+    expected = NtoDataParser(file_path).parse()
+
+    # repeat the NTO blocks with other eigenvalues before the termination message
+    with open(file_path, 'r') as fh:
+        lines = fh.readlines()
+    anchors = [i for i, line in enumerate(lines) if 'Eigenvalues --' in line]
+    end = max(i for i, line in enumerate(lines) if 'Normal termination' in line)
+    repeated = [_.replace('Eigenvalues --', 'Eigenvalues -- 0.12345') for _ in lines[anchors[0] - 1:end]]
+    with open(file_path, 'w') as fh:
+        fh.writelines(lines[:end] + repeated + lines[end:])
+
+    with open(file_path, 'rb') as fh_in, gzip.open(file_path + '.gz', 'wb') as fh_out:
+        shutil.copyfileobj(fh_in, fh_out)
+
+    for result_dict in [NtoDataParser(file_path).parse(), NtoDataParser(file_path + '.gz').parse()]:
+        for block in ['occupied_nto', 'virtual_nto']:
+            assert np.array_equal(result_dict[block].eigenvalues, expected[block].eigenvalues)
+            assert np.array_equal(result_dict[block].coefficients, expected[block].coefficients)
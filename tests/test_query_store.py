@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset import get_filter_mask, load_dataset
+from query_store import QueryStore, build_store
+
+
+@pytest.fixture
+def store_path(tmp_path):
+
+    lambdas = np.float32([670.01, 500.0, 450.25, 812.7, 333.3])
+    # neighbours of the float32 values, including their float64 rounding
+    values = np.concatenate([
+        lambdas, np.nextafter(lambdas, np.float32(np.inf)), np.nextafter(lambdas, np.float32(-np.inf))
+    ]).astype(np.float64)
+
+    n_rows = len(values) + 2
+    df = pd.DataFrame({
+        'id': ['C%04d' % _ for _ in range(n_rows)],
+        'lambda_max_vis_acetone': np.concatenate([values, [np.nan, 670.01]]),
+        'transition_nature_vis_acetone': (['MLCT', 'LMCT', 'LC', None] * n_rows)[:n_rows],
+        'bathochromic': ([True, False, None] * n_rows)[:n_rows]
+    })
+
+    file_path = str(tmp_path / 'merged.csv')
+    df.to_csv(file_path, index=False, float_format='%.17g')
+
+    store_path = str(tmp_path / 'store')
+    build_store(file_path, store_path)
+
+    return file_path, store_path
+
+def test_store_matches_filter_mask(store_path):
+
+    file_path, store_path = store_path
+    store = QueryStore(store_path)
+    df = load_dataset(file_path)
+
+    float32_values = np.float32([670.01, 500.0, 450.25, 812.7, 333.3])
+    query_values = [670.01, 450.25, 812.7, 333.3, 500.0]
+    query_values += np.nextafter(float32_values, np.float32(np.inf)).astype(np.float64).tolist()
+    query_values += np.nextafter(float32_values, np.float32(-np.inf)).astype(np.float64).tolist()
+
+    filters = []
+    for value in query_values:
+        for operator_name in ['==', '!=', '<', '<=', '>', '>=']:
+            filters.append([('lambda_max_vis_acetone', operator_name, value)])
+    for operator_name, value in [('==', 'MLCT'), ('!=', 'LC'), ('in', ['LC', 'LMCT']), ('not in', ['MLCT']), ('==', 'unknown')]:
+        filters.append([('transition_nature_vis_acetone', operator_name, value)])
+    for operator_name, value in [('==', True), ('!=', True), ('==', False), ('in', [False]), ('not in', [True])]:
+        filters.append([('bathochromic', operator_name, value)])
+    filters.append([('lambda_max_vis_acetone', '<=', 670.01), ('transition_nature_vis_acetone', '==', 'MLCT')])
+
+    for query_filters in filters:
+        expected = np.flatnonzero(get_filter_mask(df, query_filters))
+        assert np.array_equal(store.get_query_rows(query_filters), expected), query_filters
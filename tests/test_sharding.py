@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from result_writer import get_result_writer
+from sharding import get_shard_output_path, reduce_shards, write_manifest, write_shard_info
+
+
+def _write_partials(tmp_path, manifests: list[dict]):
+
+    partial_paths = []
+    for shard_index, manifest in enumerate(manifests):
+        manifest_path = str(tmp_path / ('manifest-%d.csv' % shard_index))
+        write_manifest(manifest, manifest_path)
+        partial_path = get_shard_output_path(str(tmp_path / 'results.csv'), shard_index, len(manifests))
+        ids = sorted(_ for _, index in manifest.items() if index == shard_index)
+        with get_result_writer(partial_path) as writer:
+            for complex_id in ids:
+                writer.write({'id': complex_id, 'has_failed': False, 'homo_lumo_gap': 0.1})
+        write_shard_info(partial_path, shard_index, len(manifests), ids, manifest_path)
+        partial_paths.append(partial_path)
+
+    return partial_paths
+
+def test_reduce_copies_all_partials(tmp_path):
+
+    manifest = {'A': 1, 'B': 0, 'C': 1}
+    partial_paths = _write_partials(tmp_path, [manifest, manifest])
+
+    output_path = str(tmp_path / 'results.csv')
+    assert reduce_shards(partial_paths, output_path, set(manifest), manifest, chunk_size=1) == 3
+    assert pd.read_csv(output_path)['id'].tolist() == ['B', 'A', 'C']
+
+def test_reduce_rejects_shards_of_different_manifests(tmp_path):
+
+    partial_paths = _write_partials(tmp_path, [{'A': 0, 'B': 1}, {'A': 1, 'B': 0}])
+
+    with pytest.raises(ValueError, match='different manifests'):
+        reduce_shards(partial_paths, str(tmp_path / 'results.csv'))
@@ -0,0 +1,40 @@
+import gzip
+import os
+import shutil
+
+import pytest
+
+from analyze import analyze_complex
+from quarantine import QuarantineError
+from synthetic_logs import generate_dataset
+
+
+def _remove_lines(file_path: str, anchor: str):
+
+    with open(file_path, 'r') as fh:
+        lines = [_ for _ in fh.readlines() if anchor not in _]
+
+    with open(file_path, 'w') as fh:
+        fh.writelines(lines)
+
+@pytest.mark.parametrize('compressed', [False, True])
+@pytest.mark.parametrize('anchor', ['Alpha  occ. eigenvalues', 'Alpha virt. eigenvalues'])
+def test_missing_eigenvalues_are_quarantined(tmp_path, anchor, compressed):
+
+    data_dir = str(tmp_path / 'data')
+    generate_dataset(data_dir, 1, n_atoms=6, n_filler_lines=5, failure_rate=0, seed=3)
+
+    tddft_file_path = os.path.join(data_dir, 'SYN000000.out')
+    _remove_lines(tddft_file_path, anchor)
+
+    # compressed files are parsed line by line, plain files through the section index
+    if compressed:
+        with open(tddft_file_path, 'rb') as fh_in, gzip.open(tddft_file_path + '.gz', 'wb') as fh_out:
+            shutil.copyfileobj(fh_in, fh_out)
+        os.remove(tddft_file_path)
+        tddft_file_path += '.gz'
+
+    with pytest.raises(QuarantineError) as e:
+        analyze_complex(tddft_file_path, os.path.join(data_dir, 'SYN000000-vis.out'))
+
+    assert (e.value.stage, e.value.reason) == ('tddft_parse', 'eigenvalues_missing')
@@ -0,0 +1,36 @@
+import os
+import re
+import time
+
+import pandas as pd
+import pytest
+
+from synthetic_logs import generate_dataset
+from watch import DirectoryWatcher, SolvatochromismAppender
+
+
+def test_tmc_without_vis_band_is_ready_without_nto_file(tmp_path):
+
+    data_dir = str(tmp_path / 'data')
+    generate_dataset(data_dir, 2, n_atoms=6, n_filler_lines=5, failure_rate=0, seed=3)
+    for i in range(2):
+        os.remove(os.path.join(data_dir, 'SYN%06d-vis.out' % i))
+
+    # move all transitions of the first TMC to the UV region
+    file_path = os.path.join(data_dir, 'SYN000000.out')
+    with open(file_path, 'r') as fh:
+        content = re.sub('[0-9.]+ nm', '300.00 nm', fh.read())
+    with open(file_path, 'w') as fh:
+        fh.write(content)
+
+    watcher = DirectoryWatcher(data_dir, settle_time=0, nto_timeout=3600)
+
+    assert watcher.poll(time.time() + 1) == [(file_path, None)]
+
+def test_appending_to_merged_table_with_other_columns_fails(tmp_path):
+
+    merged_path = str(tmp_path / 'merged.csv')
+    pd.DataFrame(columns=['id', 'lambda_max_vis']).to_csv(merged_path, index=False)
+
+    with pytest.raises(ValueError, match='different columns'):
+        SolvatochromismAppender(merged_path, str(tmp_path / 'gasphase.csv'), str(tmp_path / 'acetone.csv'))